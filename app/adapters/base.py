@@ -1,10 +1,15 @@
+import re
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 
 class BaseAdapter(ABC):
     """交换机适配器基类，定义了所有交换机需要实现的接口"""
     
+    # 读取配置变化指示值的命令，以及从输出中提取指示值的正则表达式（第一个分组），未设置时不支持预检查
+    CONFIG_CHANGE_COMMAND: Optional[str] = None
+    CONFIG_CHANGE_PATTERN: Optional[str] = None
+    
     def __init__(self, device_info: Dict[str, Any]):
         """
         初始化适配器
@@ -55,6 +60,43 @@ class BaseAdapter(ABC):
         """执行任意命令"""
         pass
 
+    def get_health(self) -> Dict[str, float]:
+        """获取设备CPU和内存使用率（%）
+
+        默认从 get_device_info() 的结果中提取，适配器可以重写为只执行必要的命令
+
+        Returns:
+            包含 cpu_usage 和/或 memory_usage 的字典，设备不支持的指标不包含在内
+        """
+        return self.health_from_device_info(self.get_device_info())
+
+    def get_config_change_indicator(self) -> Optional[str]:
+        """执行 CONFIG_CHANGE_COMMAND 读取运行配置的变化指示值（如最近修改时间）
+
+        命令只输出一行，代价远小于 get_config()
+
+        Returns:
+            指示值，适配器不支持或输出中没有指示值时返回None
+        """
+        if not self.CONFIG_CHANGE_COMMAND:
+            return None
+        match = re.search(self.CONFIG_CHANGE_PATTERN, self.execute_command(self.CONFIG_CHANGE_COMMAND))
+        return match.group(1).strip() if match else None
+
+    @staticmethod
+    def health_from_device_info(info: Dict[str, Any]) -> Dict[str, float]:
+        """从设备信息中提取CPU（优先取1分钟平均值）和内存使用率"""
+        health = {}
+        cpu_usage = info.get('cpu_usage') or {}
+        for key in ('1min', '5min', '15min'):
+            if key in cpu_usage:
+                health['cpu_usage'] = float(cpu_usage[key])
+                break
+        memory_usage = info.get('memory_usage') or {}
+        if 'percent' in memory_usage:
+            health['memory_usage'] = float(memory_usage['percent'])
+        return health
+
     def _check_connection(self) -> bool:
         """检查连接状态"""
         if not self.connection:
@@ -9,6 +9,10 @@ from app.adapters.base import BaseAdapter
 class HuaweiAdapter(BaseAdapter):
     """华为交换机适配器"""
     
+    # 运行配置开头记录了最近一次修改的时间，如 "!Last configuration was updated at 2024-01-01 10:00:00+08:00"
+    CONFIG_CHANGE_COMMAND = 'display current-configuration | include Last configuration was updated'
+    CONFIG_CHANGE_PATTERN = r'Last configuration was updated at\s+(.+)'
+    
     def __init__(self, device_info: Dict[str, Any]):
         """初始化华为交换机适配器"""
         super().__init__(device_info)
@@ -236,33 +240,13 @@ class HuaweiAdapter(BaseAdapter):
             
             # 获取运行内存信息
             try:
-                memory_output = self.execute_command('display memory-usage')
-                memory_total_match = re.search(r'Total\s+memory:\s+(\d+)\s+kbytes', memory_output, re.I)
-                memory_used_match = re.search(r'Used\s+memory:\s+(\d+)\s+kbytes', memory_output, re.I)
-                memory_percent_match = re.search(r'Memory\s+using:\s+(\d+)%', memory_output, re.I)
-                
-                if memory_total_match and memory_used_match and memory_percent_match:
-                    info['memory_usage'] = {
-                        'total': int(memory_total_match.group(1)),
-                        'used': int(memory_used_match.group(1)),
-                        'percent': int(memory_percent_match.group(1))
-                    }
+                info['memory_usage'] = self._parse_memory_usage(self.execute_command('display memory-usage'))
             except Exception as mem_e:
                 print(f"获取内存信息失败: {str(mem_e)}")
             
             # 获取CPU使用率信息
             try:
-                cpu_output = self.execute_command('display cpu-usage')
-                cpu_1min_match = re.search(r'CPU\s+Usage\s+1\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
-                cpu_5min_match = re.search(r'CPU\s+Usage\s+5\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
-                cpu_15min_match = re.search(r'CPU\s+Usage\s+15\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
-                
-                if cpu_1min_match and cpu_5min_match and cpu_15min_match:
-                    info['cpu_usage'] = {
-                        '1min': int(cpu_1min_match.group(1)),
-                        '5min': int(cpu_5min_match.group(1)),
-                        '15min': int(cpu_15min_match.group(1))
-                    }
+                info['cpu_usage'] = self._parse_cpu_usage(self.execute_command('display cpu-usage'))
             except Exception as cpu_e:
                 print(f"获取CPU信息失败: {str(cpu_e)}")
             
@@ -273,6 +257,45 @@ class HuaweiAdapter(BaseAdapter):
             print(error_msg)
             raise Exception(error_msg)
     
+    def get_health(self) -> Dict[str, float]:
+        """只执行 display cpu-usage 和 display memory-usage 获取CPU和内存使用率"""
+        if not self._check_connection():
+            raise ConnectionError("设备连接失败")
+        
+        self._enter_privileged_mode()
+        return self.health_from_device_info({
+            'cpu_usage': self._parse_cpu_usage(self.execute_command('display cpu-usage')),
+            'memory_usage': self._parse_memory_usage(self.execute_command('display memory-usage'))
+        })
+    
+    def _parse_memory_usage(self, memory_output: str) -> Dict[str, int]:
+        """解析 display memory-usage 的输出"""
+        memory_total_match = re.search(r'Total\s+memory:\s+(\d+)\s+kbytes', memory_output, re.I)
+        memory_used_match = re.search(r'Used\s+memory:\s+(\d+)\s+kbytes', memory_output, re.I)
+        memory_percent_match = re.search(r'Memory\s+using:\s+(\d+)%', memory_output, re.I)
+        
+        if memory_total_match and memory_used_match and memory_percent_match:
+            return {
+                'total': int(memory_total_match.group(1)),
+                'used': int(memory_used_match.group(1)),
+                'percent': int(memory_percent_match.group(1))
+            }
+        return {}
+    
+    def _parse_cpu_usage(self, cpu_output: str) -> Dict[str, int]:
+        """解析 display cpu-usage 的输出"""
+        cpu_1min_match = re.search(r'CPU\s+Usage\s+1\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
+        cpu_5min_match = re.search(r'CPU\s+Usage\s+5\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
+        cpu_15min_match = re.search(r'CPU\s+Usage\s+15\s+Min\s+Average:\s+(\d+)%', cpu_output, re.I)
+        
+        if cpu_1min_match and cpu_5min_match and cpu_15min_match:
+            return {
+                '1min': int(cpu_1min_match.group(1)),
+                '5min': int(cpu_5min_match.group(1)),
+                '15min': int(cpu_15min_match.group(1))
+            }
+        return {}
+    
     def get_interfaces(self) -> List[Dict[str, Any]]:
         """获取所有接口信息 - 增强版"""
         if not self._check_connection():
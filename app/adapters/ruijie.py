@@ -10,6 +10,10 @@ from app.adapters.base import BaseAdapter
 class RuijieAdapter(BaseAdapter):
     """锐捷交换机适配器"""
     
+    # 不同型号的CPU和内存查看命令不同，依次尝试
+    MEMORY_COMMANDS = ['show memory', 'display memory', 'show memory usage', 'display memory usage']
+    CPU_COMMANDS = ['show cpu', 'display cpu', 'show cpu-usage', 'display cpu-usage']
+    
     def __init__(self, device_info: Dict[str, Any]):
         """初始化锐捷交换机适配器"""
         super().__init__(device_info)
@@ -538,63 +542,13 @@ class RuijieAdapter(BaseAdapter):
             
             # 获取内存信息
             try:
-                memory_commands = ['show memory', 'display memory', 'show memory usage', 'display memory usage']
-                memory_output = ""
-                
-                for mem_cmd in memory_commands:
-                    try:
-                        memory_output = self.execute_command(mem_cmd)
-                        if memory_output and len(memory_output) > 10:
-                            break
-                    except Exception:
-                        continue
-                
-                if memory_output:
-                    memory_total_match = re.search(r'Total\s+memory:\s+(\d+)\s+KBytes', memory_output, re.I)
-                    memory_used_match = re.search(r'Used\s+memory:\s+(\d+)\s+KBytes', memory_output, re.I)
-                    memory_percent_match = re.search(r'Memory\s+usage:\s+(\d+)%', memory_output, re.I)
-                    
-                    if memory_total_match and memory_used_match:
-                        total = int(memory_total_match.group(1))
-                        used = int(memory_used_match.group(1))
-                        percent = int(memory_percent_match.group(1)) if memory_percent_match else int((used / total) * 100) if total > 0 else 0
-                        
-                        info['memory_usage'] = {
-                            'total': total,
-                            'used': used,
-                            'percent': percent
-                        }
+                info['memory_usage'] = self._parse_memory_usage(self._execute_first_available(self.MEMORY_COMMANDS))
             except Exception as mem_e:
                 print(f"获取内存信息失败: {str(mem_e)}")
             
             # 获取CPU使用率
             try:
-                cpu_commands = ['show cpu', 'display cpu', 'show cpu-usage', 'display cpu-usage']
-                cpu_output = ""
-                
-                for cpu_cmd in cpu_commands:
-                    try:
-                        cpu_output = self.execute_command(cpu_cmd)
-                        if cpu_output and len(cpu_output) > 10:
-                            break
-                    except Exception:
-                        continue
-                
-                if cpu_output:
-                    cpu_1min_match = re.search(r'CPU\s+utilization\s+for\s+1\s+minute\s+is\s+(\d+)%', cpu_output, re.I)
-                    cpu_5min_match = re.search(r'CPU\s+utilization\s+for\s+5\s+minutes\s+is\s+(\d+)%', cpu_output, re.I)
-                    cpu_15min_match = re.search(r'CPU\s+utilization\s+for\s+15\s+minutes\s+is\s+(\d+)%', cpu_output, re.I)
-                    
-                    cpu_data = {}
-                    if cpu_1min_match:
-                        cpu_data['1min'] = int(cpu_1min_match.group(1))
-                    if cpu_5min_match:
-                        cpu_data['5min'] = int(cpu_5min_match.group(1))
-                    if cpu_15min_match:
-                        cpu_data['15min'] = int(cpu_15min_match.group(1))
-                    
-                    if cpu_data:
-                        info['cpu_usage'] = cpu_data
+                info['cpu_usage'] = self._parse_cpu_usage(self._execute_first_available(self.CPU_COMMANDS))
             except Exception as cpu_e:
                 print(f"获取CPU信息失败: {str(cpu_e)}")
             
@@ -605,6 +559,61 @@ class RuijieAdapter(BaseAdapter):
             print(error_msg)
             raise Exception(error_msg)
     
+    def get_health(self) -> Dict[str, float]:
+        """只执行CPU和内存查看命令获取使用率"""
+        if not self._check_connection():
+            raise ConnectionError("设备连接失败")
+        
+        self._enter_privileged_mode()
+        return self.health_from_device_info({
+            'cpu_usage': self._parse_cpu_usage(self._execute_first_available(self.CPU_COMMANDS)),
+            'memory_usage': self._parse_memory_usage(self._execute_first_available(self.MEMORY_COMMANDS))
+        })
+    
+    def _execute_first_available(self, commands: List[str]) -> str:
+        """依次执行候选命令，返回第一个有效输出"""
+        for command in commands:
+            try:
+                output = self.execute_command(command)
+                if output and len(output) > 10:
+                    return output
+            except Exception:
+                continue
+        return ""
+    
+    def _parse_memory_usage(self, memory_output: str) -> Dict[str, int]:
+        """解析内存查看命令的输出"""
+        memory_total_match = re.search(r'Total\s+memory:\s+(\d+)\s+KBytes', memory_output, re.I)
+        memory_used_match = re.search(r'Used\s+memory:\s+(\d+)\s+KBytes', memory_output, re.I)
+        memory_percent_match = re.search(r'Memory\s+usage:\s+(\d+)%', memory_output, re.I)
+        
+        if memory_total_match and memory_used_match:
+            total = int(memory_total_match.group(1))
+            used = int(memory_used_match.group(1))
+            percent = int(memory_percent_match.group(1)) if memory_percent_match else int((used / total) * 100) if total > 0 else 0
+            
+            return {
+                'total': total,
+                'used': used,
+                'percent': percent
+            }
+        return {}
+    
+    def _parse_cpu_usage(self, cpu_output: str) -> Dict[str, int]:
+        """解析CPU查看命令的输出"""
+        cpu_1min_match = re.search(r'CPU\s+utilization\s+for\s+1\s+minute\s+is\s+(\d+)%', cpu_output, re.I)
+        cpu_5min_match = re.search(r'CPU\s+utilization\s+for\s+5\s+minutes\s+is\s+(\d+)%', cpu_output, re.I)
+        cpu_15min_match = re.search(r'CPU\s+utilization\s+for\s+15\s+minutes\s+is\s+(\d+)%', cpu_output, re.I)
+        
+        cpu_data = {}
+        if cpu_1min_match:
+            cpu_data['1min'] = int(cpu_1min_match.group(1))
+        if cpu_5min_match:
+            cpu_data['5min'] = int(cpu_5min_match.group(1))
+        if cpu_15min_match:
+            cpu_data['15min'] = int(cpu_15min_match.group(1))
+        return cpu_data
+    
     def get_interfaces(self) -> List[Dict[str, Any]]:
         """获取所有接口信息 - 增强版"""
         if not self._check_connection():
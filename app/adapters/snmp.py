@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from pysnmp.hlapi.v3arch import SnmpEngine
 from pysnmp.hlapi.v3arch import CommunityData, UdpTransportTarget
 from pysnmp.hlapi.v3arch import ContextData, ObjectType, ObjectIdentity
@@ -30,11 +30,22 @@ class SNMPAdapter(BaseAdapter):
     IF_OUT_OCTETS = '1.3.6.1.2.1.2.2.1.16'  # 接口出站字节数
     IF_OUT_UCAST_PKTS = '1.3.6.1.2.1.2.2.1.17'  # 接口出站单播包数
     IF_OUT_ERRORS = '1.3.6.1.2.1.2.2.1.20'  # 接口出站错误数
+    IF_HC_IN_OCTETS = '1.3.6.1.2.1.31.1.1.1.6'  # 接口入站字节数（64位）
+    IF_HC_OUT_OCTETS = '1.3.6.1.2.1.31.1.1.1.10'  # 接口出站字节数（64位）
     HOST_RESOURCES_CPULOAD1 = '1.3.6.1.2.1.25.3.3.1.2.1'  # CPU 1分钟负载
     HOST_RESOURCES_CPULOAD5 = '1.3.6.1.2.1.25.3.3.1.2.2'  # CPU 5分钟负载
     HOST_RESOURCES_CPULOAD15 = '1.3.6.1.2.1.25.3.3.1.2.3'  # CPU 15分钟负载
     HOST_RESOURCES_MEM_TOTAL = '1.3.6.1.2.1.25.2.3.1.5.1'  # 总内存
     HOST_RESOURCES_MEM_USED = '1.3.6.1.2.1.25.2.3.1.6.1'  # 已用内存
+    HR_PROCESSOR_LOAD = '1.3.6.1.2.1.25.3.3.1.2'  # 各处理器1分钟平均负载（%）
+    CCM_HISTORY_RUNNING_LAST_CHANGED = '1.3.6.1.4.1.9.9.43.1.1.1.0'  # 运行配置最近修改时的sysUpTime（CISCO-CONFIG-MAN-MIB）
+    HH3C_CFG_RUN_MODIFIED_LAST = '1.3.6.1.4.1.25506.2.4.1.1.1.0'  # 运行配置最近修改时的sysUpTime（HH3C-CONFIG-MAN-MIB）
+    
+    # 各厂商表示运行配置最近修改时间的对象
+    CONFIG_CHANGE_OIDS = {
+        'cisco': CCM_HISTORY_RUNNING_LAST_CHANGED,
+        'h3c': HH3C_CFG_RUN_MODIFIED_LAST,
+    }
     
     def __init__(self, device_info: Dict[str, Any]):
         """初始化SNMP适配器"""
@@ -162,6 +173,70 @@ class SNMPAdapter(BaseAdapter):
             print(error_msg)
             raise Exception(error_msg)
     
+    def get_interface_counters(self) -> Dict[str, Dict[str, int]]:
+        """批量获取所有接口的收发字节和错误计数器
+        
+        每个计数器只做一次表遍历，优先使用64位的ifHC计数器，设备不支持时回退到32位计数器
+        """
+        try:
+            if_descriptions = self._walk_snmp_table(self.IF_DESCR)
+            in_octets = self._walk_snmp_table(self.IF_HC_IN_OCTETS) or self._walk_snmp_table(self.IF_IN_OCTETS)
+            out_octets = self._walk_snmp_table(self.IF_HC_OUT_OCTETS) or self._walk_snmp_table(self.IF_OUT_OCTETS)
+            in_errors = self._walk_snmp_table(self.IF_IN_ERRORS)
+            out_errors = self._walk_snmp_table(self.IF_OUT_ERRORS)
+            
+            counters = {}
+            for if_index, description in if_descriptions.items():
+                if if_index not in in_octets and if_index not in out_octets:
+                    continue
+                counters[description] = {
+                    'if_in_octets': int(in_octets.get(if_index, 0)),
+                    'if_out_octets': int(out_octets.get(if_index, 0)),
+                    'if_in_errors': int(in_errors.get(if_index, 0)),
+                    'if_out_errors': int(out_errors.get(if_index, 0))
+                }
+            
+            return counters
+        except Exception as e:
+            error_msg = f"获取SNMP接口计数器失败: {str(e)}"
+            print(error_msg)
+            raise Exception(error_msg)
+    
+    def get_health(self) -> Dict[str, float]:
+        """通过HOST-RESOURCES-MIB获取CPU和内存使用率
+        
+        CPU取所有处理器负载的平均值，内存取第一个存储项（物理内存）的已用比例，
+        设备未实现该MIB时返回空字典
+        """
+        health = {}
+        
+        loads = [int(load) for load in self._walk_snmp_table(self.HR_PROCESSOR_LOAD).values() if str(load).isdigit()]
+        if loads:
+            health['cpu_usage'] = round(sum(loads) / len(loads), 2)
+        
+        mem_total = self._get_snmp_value(self.HOST_RESOURCES_MEM_TOTAL)
+        mem_used = self._get_snmp_value(self.HOST_RESOURCES_MEM_USED)
+        if mem_total and mem_used and mem_total.isdigit() and mem_used.isdigit() and int(mem_total) > 0:
+            health['memory_usage'] = round(int(mem_used) * 100 / int(mem_total), 2)
+        
+        return health
+    
+    def get_config_change_indicator(self, vendor: str) -> Optional[str]:
+        """读取运行配置最近修改的时间（TimeTicks），用于判断配置是否变化
+        
+        Args:
+            vendor: 设备厂商
+        
+        Returns:
+            指示值，厂商没有对应的对象或设备未实现时返回None
+        """
+        oid = self.CONFIG_CHANGE_OIDS.get(vendor.lower())
+        if not oid:
+            return None
+        value = self._get_snmp_value(oid)
+        # 设备未实现时返回 noSuchObject 等非数字的值
+        return value if value and value.isdigit() else None
+    
     def get_config(self) -> str:
         """获取设备配置（SNMP通常不用于获取完整配置，这里返回设备信息）"""
         device_info = self.get_device_info()
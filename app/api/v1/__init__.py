@@ -6,6 +6,8 @@ from .backup_tasks import router as backup_tasks_router
 from .test_root import router as test_root_router
 from .device_stats import router as device_stats_router
 from .alerts import router as alerts_router
+from .command_logs import router as command_logs_router
+from .backup_runs import router as backup_runs_router
 
 __all__ = [
     "dashboard_router",
@@ -14,5 +16,7 @@ __all__ = [
     "backup_tasks_router",
     "test_root_router",
     "device_stats_router",
-    "alerts_router"
+    "alerts_router",
+    "command_logs_router",
+    "backup_runs_router"
 ]
\ No newline at end of file
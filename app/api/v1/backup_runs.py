@@ -0,0 +1,169 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from app.services.db import get_async_db, get_db
+from app.services.models import ConfigBackupRun, ConfigBackupRunResult
+from app.services.schemas import BackupRunCreate
+from app.services.backup_scheduler import backup_run_summary, create_backup_run
+from app.services.pagination import decode_cursor, encode_cursor, keyset_condition
+from app.services.responses import fast_response
+from app.services.auth import decode_access_token
+from app.api.v1.auth import oauth2_scheme
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+def create_backup_run_task(
+    run_data: BackupRunCreate,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """创建批量配置备份任务，由后台线程按厂商和位置限制并发执行
+
+    通过 GET /backup-runs/{run_id} 查询进度和汇总
+
+    参数:
+        run_data: 设备筛选条件（设备ID、厂商、位置、设备类型），全部为空时备份全部设备
+
+    返回:
+        任务信息，包含任务ID
+
+    异常:
+        401: 无效的令牌
+        500: 服务器内部错误
+    """
+    try:
+        username = decode_access_token(token)
+        if not username:
+            raise HTTPException(status_code=401, detail="无效的Token")
+        run = create_backup_run(db, run_data.model_dump(exclude_none=True), created_by=username)
+        return backup_run_summary(run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"创建批量备份任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"创建批量备份任务失败: {str(e)}")
+
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def list_backup_runs(
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int = Query(50, ge=1, le=500, description="每页数量"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """查询批量备份任务，最新的任务在前
+
+    异常:
+        400: 游标无效
+        500: 服务器内部错误
+    """
+    try:
+        query = select(ConfigBackupRun)
+        if cursor:
+            try:
+                _, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            query = query.where(ConfigBackupRun.id < last_id)
+        runs = (await db.execute(query.order_by(ConfigBackupRun.id.desc()).limit(limit + 1))).scalars().all()
+        headers = {}
+        if len(runs) > limit:
+            runs = runs[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(None, runs[-1].id)
+        return fast_response([backup_run_summary(run) for run in runs], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询批量备份任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询批量备份任务失败，请稍后重试")
+
+
+@router.get("/{run_id}", response_model=Dict[str, Any])
+async def get_backup_run(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    """查询批量备份任务的进度和汇总
+
+    返回:
+        任务状态、进度，以及有变化、无变化（其中未拉取完整配置）、失败和跳过的设备数
+
+    异常:
+        404: 任务未找到
+        500: 服务器内部错误
+    """
+    try:
+        run = await db.get(ConfigBackupRun, run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="批量备份任务未找到")
+        return backup_run_summary(run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询批量备份任务失败，ID: {run_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询批量备份任务失败，请稍后重试")
+
+
+@router.get("/{run_id}/results", response_model=List[Dict[str, Any]])
+async def get_backup_run_results(
+    run_id: int,
+    result_status: Optional[str] = Query(None, alias="status", pattern="^(changed|unchanged|failed|skipped)$", description="按结果过滤"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int = Query(100, ge=1, le=1000, description="每页数量"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """分页查询批量备份任务中每台设备的结果
+
+    参数:
+        run_id: 任务ID
+        status: 只返回指定结果的设备，如 failed
+        cursor: 分页游标，有下一页时通过响应头 X-Next-Cursor 返回
+        limit: 每页数量
+
+    异常:
+        400: 游标无效
+        404: 任务未找到
+        500: 服务器内部错误
+    """
+    try:
+        if not await db.scalar(select(ConfigBackupRun.id).where(ConfigBackupRun.id == run_id)):
+            raise HTTPException(status_code=404, detail="批量备份任务未找到")
+
+        query = select(
+            ConfigBackupRunResult.id,
+            ConfigBackupRunResult.device_id,
+            ConfigBackupRunResult.status,
+            ConfigBackupRunResult.attempts,
+            ConfigBackupRunResult.pulled,
+            ConfigBackupRunResult.config_id,
+            ConfigBackupRunResult.error,
+            ConfigBackupRunResult.duration_ms,
+            ConfigBackupRunResult.finished_at
+        ).where(ConfigBackupRunResult.run_id == run_id)
+        if result_status:
+            query = query.where(ConfigBackupRunResult.status == result_status)
+        if cursor:
+            try:
+                last_status, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            query = query.where(keyset_condition(ConfigBackupRunResult.status, ConfigBackupRunResult.id, last_status, last_id))
+        # 与 (run_id, status, id) 索引的顺序一致
+        query = query.order_by(ConfigBackupRunResult.status, ConfigBackupRunResult.id).limit(limit + 1)
+
+        rows = (await db.execute(query)).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].status, rows[-1].id)
+        return fast_response([dict(row._mapping) for row in rows], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询批量备份结果失败，ID: {run_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询批量备份结果失败，请稍后重试")
@@ -1,33 +1,40 @@
 import logging
-import os
-import io
-import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 
-from app.services.db import get_db
+from app.services.db import get_db, get_async_db, get_read_db
 from app.services.models import Device as DeviceModel, Config
-from app.services.schemas import ConfigCreate, ConfigOut
+from app.services.schemas import BackupArchiveRequest, ConfigCreate, ConfigOut
+from app.services.export import EXPORT_FORMAT_PATTERN, export_response
+from app.services.responses import fast_response, negotiated_media_type
+from app.services.etag import etag_matches, hash_etag, http_date, make_etag, not_modified, not_modified_since, rows_digest
 from app.services.config_backup import (
     create_config_backup,
     get_config_backup,
     get_device_config_backups,
     delete_config_backup,
-    get_latest_config_backup
+    get_latest_config_backup,
+    get_backup_list_version,
+    get_backup_file,
+    get_previous_config_backup
 )
+from app.services.config import CONFIG_DIFF_MAX_CONTEXT
+from app.services.config_diff import diff_config_backups, format_unified
+from app.services.compression import stored_encoding_acceptor, stored_file_response
+from app.services.backup_store import train_dictionary
+from app.services.config_archive import stream_archive
+from app.services.config_search import rebuild_search_index, search_configs
+from app.services.pagination import decode_cursor, encode_cursor
 from app.adapters.huawei import HuaweiAdapter
 from app.adapters.h3c import H3CAdapter
 from app.api.v1.auth import oauth2_scheme, decode_access_token
 from app.adapters.ruijie import RuijieAdapter
 
-# 配置备份文件存储路径
-CONFIG_BACKUP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'config_backups')
-
-# 确保备份目录存在
-os.makedirs(CONFIG_BACKUP_DIR, exist_ok=True)
-
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
@@ -130,11 +137,194 @@ def create_backup_task(
         logger.error(f"备份设备配置失败，设备ID: {config_data.device_id}, 错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"备份设备配置失败: {str(e)}")
 
+@router.get("/export")
+def export_backup_metadata(
+    export_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN, description="导出格式：csv 或 ndjson"),
+    device_id: Optional[int] = Query(None, description="只导出指定设备的备份")
+):
+    """流式导出配置备份元数据（不含配置内容），包含设备名称和管理IP
+    
+    参数:
+        format: 导出格式，csv 或 ndjson
+        device_id: 设备ID，不指定时导出全部备份
+    
+    返回:
+        配置备份元数据文件下载流
+    """
+    query = (
+        select(
+            Config.id,
+            Config.device_id,
+            DeviceModel.name.label("device_name"),
+            DeviceModel.management_ip,
+            Config.filename,
+            Config.file_size,
+            Config.hash,
+            Config.taken_by,
+            Config.description,
+            Config.created_at
+        )
+        .join(DeviceModel, Config.device_id == DeviceModel.id)
+        .order_by(Config.id)
+    )
+    if device_id is not None:
+        query = query.where(Config.device_id == device_id)
+    return export_response(query, export_format, "config_backups")
+
+@router.get("/search", response_model=List[Dict])
+def search_backup_tasks(
+    q: str = Query(..., min_length=2, max_length=200, description="搜索内容，如 vlan 300"),
+    history: bool = Query(False, description="是否包含历史备份，需要启用 CONFIG_SEARCH_HISTORY"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int = Query(50, ge=1, le=500, description="每页最多检查的备份数"),
+    db: Session = Depends(get_read_db)
+):
+    """在配置备份中搜索，默认只搜索每台设备的最新备份
+    
+    参数:
+        q: 搜索内容，忽略大小写，返回包含整个搜索内容的行
+        history: 是否包含历史备份
+        cursor: 分页游标，有下一页时通过响应头 X-Next-Cursor 返回
+        limit: 每页最多检查的备份数
+    
+    返回:
+        匹配的备份列表，包含设备ID、名称、管理IP、备份ID和匹配的行（行号和内容）
+    
+    异常:
+        400: 搜索内容无效或游标无效
+        500: 服务器内部错误
+    """
+    try:
+        after_id = None
+        if cursor:
+            try:
+                _, after_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        try:
+            results, next_after = search_configs(db, q, limit=limit, after_id=after_id, include_history=history)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {}
+        if next_after is not None:
+            headers["X-Next-Cursor"] = encode_cursor(None, next_after)
+        return fast_response(results, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"搜索配置备份失败，搜索内容: {q}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="搜索配置备份失败，请稍后重试")
+
+@router.post("/search-index", response_model=Dict)
+def rebuild_backup_search_index(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """重建配置搜索索引，用于首次启用搜索或索引与备份不一致时
+    
+    返回:
+        索引的备份数
+    
+    异常:
+        401: 无效的令牌
+        500: 重建索引失败
+    """
+    try:
+        username = decode_access_token(token)
+        if not username:
+            logger.warning("无效的访问令牌")
+            raise HTTPException(status_code=401, detail="无效的Token")
+        
+        indexed = rebuild_search_index(db)
+        logger.info(f"重建配置搜索索引成功，备份数: {indexed}, 用户: {username}")
+        return {"indexed": indexed}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"重建配置搜索索引失败，错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"重建配置搜索索引失败: {str(e)}")
+
+@router.post("/archive")
+def archive_backup_tasks(
+    archive_data: BackupArchiveRequest,
+    token: str = Depends(oauth2_scheme)
+):
+    """打包下载多个配置备份，边读取边生成ZIP发送
+    
+    ZIP中的文件名与单个备份下载相同：{设备名称}_{IP}_{时间}.cfg
+    
+    参数:
+        archive_data: 备份ID，或设备筛选条件（设备ID、厂商、位置、设备类型）与创建时间范围，全部为空时打包全部备份
+        token: 用户访问令牌
+    
+    返回:
+        ZIP文件下载流
+    
+    异常:
+        400: 时间范围无效
+        401: 无效的令牌
+    """
+    username = decode_access_token(token)
+    if not username:
+        logger.warning("无效的访问令牌")
+        raise HTTPException(status_code=401, detail="无效的Token")
+    filters = archive_data.model_dump(exclude_none=True)
+    if archive_data.start_time and archive_data.end_time and archive_data.start_time >= archive_data.end_time:
+        raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
+    
+    logger.info(f"用户 {username} 打包下载配置备份，条件: {filters}")
+    filename = f"config_backups_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_archive(filters),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@router.post("/compression-dictionary", response_model=Dict)
+def train_compression_dictionary(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """以已有的配置备份训练zstd压缩字典，之后保存的完整版本使用新字典压缩
+
+    返回:
+        新字典的ID、样本数和大小
+
+    异常:
+        400: 未安装zstandard或备份样本不足
+        401: 无效的令牌
+        500: 训练压缩字典失败
+    """
+    try:
+        username = decode_access_token(token)
+        if not username:
+            logger.warning("无效的访问令牌")
+            raise HTTPException(status_code=401, detail="无效的Token")
+
+        try:
+            dictionary = train_dictionary(db)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        logger.info(f"训练配置压缩字典成功，ID: {dictionary.id}, 用户: {username}")
+        return {
+            "id": dictionary.id,
+            "sample_count": dictionary.sample_count,
+            "size": len(dictionary.data),
+            "created_at": dictionary.created_at
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"训练配置压缩字典失败，错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"训练配置压缩字典失败: {str(e)}")
+
 @router.get("/device/{device_id}", response_model=List[ConfigOut])
-def get_device_backup_tasks(
+async def get_device_backup_tasks(
     device_id: int,
+    request: Request,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取设备的所有配置备份任务
     
@@ -151,16 +341,22 @@ def get_device_backup_tasks(
     """
     try:
         # 检查设备是否存在
-        device = db.query(DeviceModel).filter(DeviceModel.id == device_id).first()
-        if not device:
+        device_exists = await db.scalar(select(DeviceModel.id).where(DeviceModel.id == device_id))
+        if not device_exists:
             logger.warning(f"设备未找到，ID: {device_id}")
             raise HTTPException(status_code=404, detail="设备未找到")
         
+        # 备份列表未变化时返回304
+        version = await db.run_sync(get_backup_list_version, device_id)
+        etag = make_etag("device-backups", negotiated_media_type(), device_id, limit, *version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
         # 获取配置备份列表
-        backups = get_device_config_backups(db, device_id, limit)
+        backups = await db.run_sync(get_device_config_backups, device_id, limit)
         
         logger.info(f"获取设备配置备份列表成功，设备ID: {device_id}, 共 {len(backups)} 条记录")
-        return backups
+        return fast_response(backups, headers={"ETag": etag})
     except HTTPException:
         # 重新抛出已定义的HTTP异常
         raise
@@ -171,6 +367,8 @@ def get_device_backup_tasks(
 @router.get("/{task_id}", response_model=Dict)
 def get_backup_task(
     task_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """获取指定的配置备份任务（包含文件内容）
@@ -186,6 +384,14 @@ def get_backup_task(
         500: 获取配置备份失败
     """
     try:
+        # 备份内容不会修改，先按哈希判断客户端缓存是否有效，避免读取文件
+        content_hash = db.query(Config.hash).filter(Config.id == task_id).scalar()
+        if content_hash:
+            etag = make_etag("backup", negotiated_media_type(), task_id, content_hash)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response.headers["ETag"] = etag
+        
         # 获取配置备份
         backup = get_config_backup(db, task_id)
         if not backup:
@@ -201,9 +407,105 @@ def get_backup_task(
         logger.error(f"获取配置备份失败，ID: {task_id}, 错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取配置备份失败: {str(e)}")
 
+def _diff_response(request: Request, db: Session, old: Config, new: Config, diff_format: str, context: int) -> Response:
+    """对比两个备份并按请求的格式返回，两个备份的内容哈希不变时返回304"""
+    etag = make_etag("backup-diff", diff_format, negotiated_media_type(), context, old.hash, new.hash)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    diff = diff_config_backups(db, old, new, context)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="配置文件不存在")
+
+    if diff_format == "unified":
+        text = format_unified(diff, f"backup_{old.id}.cfg", f"backup_{new.id}.cfg")
+        return Response(text, media_type="text/plain; charset=utf-8", headers={"ETag": etag})
+    result = {
+        "old": {"id": old.id, "hash": old.hash, "created_at": old.created_at},
+        "new": {"id": new.id, "hash": new.hash, "created_at": new.created_at},
+        "identical": not diff["hunks"],
+        **diff
+    }
+    return fast_response(result, headers={"ETag": etag})
+
+@router.get("/{task_id}/diff/{other_id}")
+def diff_backup_tasks(
+    task_id: int,
+    other_id: int,
+    request: Request,
+    diff_format: str = Query("json", alias="format", pattern="^(json|unified)$", description="输出格式：json（结构化差异块）或 unified（统一格式文本）"),
+    context: int = Query(3, ge=0, le=CONFIG_DIFF_MAX_CONTEXT, description="每个差异块前后的上下文行数"),
+    db: Session = Depends(get_db)
+):
+    """对比两个配置备份，忽略时间戳等易变行
+
+    参数:
+        task_id: 作为旧版本的配置备份ID
+        other_id: 作为新版本的配置备份ID
+        format: 输出格式，json 或 unified
+        context: 上下文行数
+
+    返回:
+        结构化的差异块，或统一格式的差异文本
+
+    异常:
+        404: 配置备份未找到或文件不存在
+        500: 对比配置备份失败
+    """
+    try:
+        old = db.query(Config).filter(Config.id == task_id).first()
+        new = db.query(Config).filter(Config.id == other_id).first()
+        if not old or not new:
+            logger.warning(f"配置备份未找到，ID: {task_id if not old else other_id}")
+            raise HTTPException(status_code=404, detail="配置备份未找到")
+        return _diff_response(request, db, old, new, diff_format, context)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"对比配置备份失败，ID: {task_id} -> {other_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"对比配置备份失败: {str(e)}")
+
+@router.get("/{task_id}/diff")
+def diff_backup_task_with_previous(
+    task_id: int,
+    request: Request,
+    diff_format: str = Query("json", alias="format", pattern="^(json|unified)$", description="输出格式：json（结构化差异块）或 unified（统一格式文本）"),
+    context: int = Query(3, ge=0, le=CONFIG_DIFF_MAX_CONTEXT, description="每个差异块前后的上下文行数"),
+    db: Session = Depends(get_db)
+):
+    """将配置备份与同一设备的上一个备份对比
+
+    参数:
+        task_id: 配置备份ID
+        format: 输出格式，json 或 unified
+        context: 上下文行数
+
+    返回:
+        与上一个备份相比的差异
+
+    异常:
+        404: 配置备份未找到、没有更早的备份或文件不存在
+        500: 对比配置备份失败
+    """
+    try:
+        config = db.query(Config).filter(Config.id == task_id).first()
+        if not config:
+            logger.warning(f"配置备份未找到，ID: {task_id}")
+            raise HTTPException(status_code=404, detail="配置备份未找到")
+        previous = get_previous_config_backup(db, config)
+        if not previous:
+            raise HTTPException(status_code=404, detail="该设备没有更早的配置备份")
+        return _diff_response(request, db, previous, config, diff_format, context)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"对比配置备份失败，ID: {task_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"对比配置备份失败: {str(e)}")
+
 @router.get("/{task_id}/download")
 def download_config_backup(
     task_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """下载配置备份文件
@@ -223,13 +525,18 @@ def download_config_backup(
         if not config:
             raise HTTPException(status_code=404, detail="配置备份任务不存在")
         
-        filepath = os.path.join(CONFIG_BACKUP_DIR, config.filename)
-        if not os.path.exists(filepath):
-            raise HTTPException(status_code=404, detail="配置文件不存在")
+        # 文件内容的SHA-256即为强ETag，客户端已有相同内容时不再读取和传输文件
+        etag = hash_etag(config.hash)
+        # 备份创建后不会修改，创建时间即为最后修改时间
+        last_modified = http_date(config.created_at)
+        if etag_matches(request, etag) or not_modified_since(request, config.created_at):
+            return not_modified(etag, {"Last-Modified": last_modified})
         
-        # 打开文件并返回文件内容 (使用二进制模式读取，避免编码问题)
-        with open(filepath, 'rb') as f:
-            file_content = f.read()
+        # 以文件方式发送，客户端接受保存的压缩格式时直接发送压缩文件，不读入内存
+        backup_file = get_backup_file(db, config, stored_encoding_acceptor(request))
+        if backup_file is None:
+            raise HTTPException(status_code=404, detail="配置文件不存在")
+        file_path, stored_encoding = backup_file
         
         # 获取设备名称用于文件名
         device = db.query(DeviceModel).filter(DeviceModel.id == config.device_id).first()
@@ -244,11 +551,15 @@ def download_config_backup(
         import base64
         encoded_filename = base64.b64encode(download_filename.encode('utf-8')).decode('ascii')
         
-        return StreamingResponse(
-            io.BytesIO(file_content),
+        # 支持Range断点续传
+        return stored_file_response(
+            file_path,
+            stored_encoding,
             media_type="application/octet-stream",
             headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+                "ETag": etag,
+                "Last-Modified": last_modified
             }
         )
     except HTTPException:
@@ -298,9 +609,11 @@ def delete_backup_task(
         raise HTTPException(status_code=500, detail=f"删除配置备份失败: {str(e)}")
 
 @router.get("/device/{device_id}/latest", response_model=ConfigOut)
-def get_latest_device_backup_task(
+async def get_latest_device_backup_task(
     device_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取设备的最新配置备份任务
     
@@ -316,17 +629,22 @@ def get_latest_device_backup_task(
     """
     try:
         # 检查设备是否存在
-        device = db.query(DeviceModel).filter(DeviceModel.id == device_id).first()
-        if not device:
+        device_exists = await db.scalar(select(DeviceModel.id).where(DeviceModel.id == device_id))
+        if not device_exists:
             logger.warning(f"设备未找到，ID: {device_id}")
             raise HTTPException(status_code=404, detail="设备未找到")
         
         # 获取最新的配置备份
-        backup = get_latest_config_backup(db, device_id)
+        backup = await db.run_sync(get_latest_config_backup, device_id)
         if not backup:
             logger.warning(f"未找到设备的配置备份，ID: {device_id}")
             raise HTTPException(status_code=404, detail="未找到设备的配置备份")
         
+        etag = make_etag("latest-backup", negotiated_media_type(), backup.id, backup.hash)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        
         logger.info(f"获取设备最新配置备份成功，设备ID: {device_id}, 备份ID: {backup.id}")
         return backup
     except HTTPException:
@@ -337,8 +655,9 @@ def get_latest_device_backup_task(
         raise HTTPException(status_code=500, detail=f"获取配置备份失败: {str(e)}")
 
 @router.get("/", response_model=List[Dict])
-def get_all_backup_tasks(
-    db: Session = Depends(get_db),
+async def get_all_backup_tasks(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
 ):
@@ -355,17 +674,24 @@ def get_all_backup_tasks(
         500: 获取配置备份列表失败
     """
     try:
+        # 备份不会修改，列表由备份数、最大备份ID和设备名称决定；设备状态等其他字段的变化不影响列表
+        version = await db.run_sync(get_backup_list_version)
+        device_names = await db.execute(select(DeviceModel.id, DeviceModel.name).order_by(DeviceModel.id))
+        etag = make_etag("backups", negotiated_media_type(), limit, offset, *version, rows_digest(device_names))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
         # 查询所有配置备份并关联设备信息
         # 使用join关联Device表，获取设备名称
         query = (
-            db.query(Config, DeviceModel.name.label('device_name'))
+            select(Config, DeviceModel.name.label('device_name'))
             .join(DeviceModel, Config.device_id == DeviceModel.id)
             .order_by(Config.created_at.desc())
             .limit(limit)
             .offset(offset)
         )
         
-        results = query.all()
+        results = (await db.execute(query)).all()
         
         # 构建响应列表
         backup_list = []
@@ -387,7 +713,7 @@ def get_all_backup_tasks(
             backup_list.append(backup_info)
         
         logger.info(f"获取所有配置备份列表成功，共 {len(backup_list)} 条记录")
-        return backup_list
+        return fast_response(backup_list, headers={"ETag": etag})
     except Exception as e:
         logger.error(f"获取所有配置备份列表失败，错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取配置备份列表失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,127 @@
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from app.services.db import get_async_db, get_read_db
+from app.services.models import CommandLog
+from app.services.command_audit import command_log_summary, get_command_log
+from app.services.pagination import decode_cursor, encode_cursor, keyset_condition
+from app.services.responses import fast_response
+from app.services.auth import decode_access_token
+from app.api.v1.auth import oauth2_scheme
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 列表只读取摘要列，不读取输出内容
+_SUMMARY_COLUMNS = (
+    CommandLog.id,
+    CommandLog.device_id,
+    CommandLog.user_id,
+    CommandLog.username,
+    CommandLog.command,
+    CommandLog.success,
+    CommandLog.latency_ms,
+    CommandLog.output_digest,
+    CommandLog.output_size,
+    CommandLog.created_at,
+)
+
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def list_command_logs(
+    device_id: Optional[int] = Query(None, description="设备ID"),
+    username: Optional[str] = Query(None, description="执行命令的用户名"),
+    start: Optional[datetime] = Query(None, description="起始时间（含）"),
+    end: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int = Query(100, ge=1, le=1000, description="每页数量"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """查询设备命令审计记录，按执行时间倒序分页
+
+    参数:
+        device_id: 按设备过滤
+        username: 按用户过滤
+        start/end: 执行时间范围
+        cursor: 分页游标，有下一页时通过响应头 X-Next-Cursor 返回
+        limit: 每页数量
+
+    返回:
+        审计记录列表（不含命令输出，输出通过详情接口获取）
+
+    异常:
+        400: 游标无效
+        401: 无效的令牌
+        500: 服务器内部错误
+    """
+    try:
+        if not decode_access_token(token):
+            raise HTTPException(status_code=401, detail="无效的Token")
+
+        # 过滤条件与 (device_id|username, created_at, id) 索引一致
+        query = select(*_SUMMARY_COLUMNS)
+        if device_id is not None:
+            query = query.where(CommandLog.device_id == device_id)
+        if username:
+            query = query.where(CommandLog.username == username)
+        if start is not None:
+            query = query.where(CommandLog.created_at >= start)
+        if end is not None:
+            query = query.where(CommandLog.created_at < end)
+        if cursor:
+            try:
+                last_created, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            query = query.where(keyset_condition(CommandLog.created_at, CommandLog.id, last_created, last_id, descending=True))
+        query = query.order_by(CommandLog.created_at.desc(), CommandLog.id.desc()).limit(limit + 1)
+
+        rows = (await db.execute(query)).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return fast_response([command_log_summary(row) for row in rows], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询命令审计记录失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询命令审计记录失败，请稍后重试")
+
+
+@router.get("/{log_id}", response_model=Dict[str, Any])
+def get_command_log_detail(
+    log_id: int,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+):
+    """获取单条命令审计记录，包含完整的命令输出
+
+    参数:
+        log_id: 审计记录ID
+
+    异常:
+        401: 无效的令牌
+        404: 审计记录不存在
+        500: 服务器内部错误
+    """
+    try:
+        if not decode_access_token(token):
+            raise HTTPException(status_code=401, detail="无效的Token")
+        log = get_command_log(db, log_id)
+        if log is None:
+            raise HTTPException(status_code=404, detail="审计记录不存在")
+        return fast_response(log)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取命令审计记录失败，ID: {log_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="获取命令审计记录失败，请稍后重试")
@@ -1,14 +1,25 @@
 from fastapi import APIRouter, Depends
 from typing import Dict, Any, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.services.db import get_db
-from app.services.models import Device, InterfaceStatus
+from app.services.etag import ConditionalRoute
+from app.services.db import get_read_db, get_async_db
+from app.services.models import Device
+from app.services.device_summary import get_device_summary, get_interface_status_counts
+from app.services.response_cache import DEVICES_NAMESPACE, cached_endpoint, uncached
+from app.services.metrics_store import bucket_starts, format_bucket_time, recent_window
+from app.services.config import HEALTH_POLL_INTERVAL
+from app.services.metrics_analytics import fill_series, latest_average
+from app.services.metrics_rollup import query_fleet_series
 import logging
+import time
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# 仪表板数据按响应体哈希生成ETag，未变化时返回304
+router = APIRouter(route_class=ConditionalRoute)
 
 @router.get("/test", response_model=Dict[str, Any])
 def test_endpoint():
@@ -16,25 +27,28 @@ def test_endpoint():
     return {"message": "测试成功"}
 
 @router.get("/stats", response_model=Dict[str, Any])
-def get_dashboard_stats(db: Session = Depends(get_db)):
+@cached_endpoint(DEVICES_NAMESPACE, ttl=10, stale_ttl=30)
+def get_dashboard_stats(db: Session = Depends(get_read_db)):
     """获取仪表板统计数据
     
     返回:
         仪表板统计数据
     """
     try:
-        # 查询设备统计数据
-        total_devices = db.query(Device).count()
-        online_devices = db.query(Device).filter(Device.status == "online").count()
-        offline_devices = db.query(Device).filter(Device.status == "offline").count()
-        unknown_devices = db.query(Device).filter(Device.status == "unknown").count()
-        warning_devices = db.query(Device).filter(Device.status == "warning").count()
-        
-        # 查询接口状态统计
-        total_ports = db.query(InterfaceStatus).count()
-        up_ports = db.query(InterfaceStatus).filter(InterfaceStatus.operational_status == "up").count()
-        down_ports = db.query(InterfaceStatus).filter(InterfaceStatus.operational_status == "down").count()
-        warning_ports = db.query(InterfaceStatus).filter(InterfaceStatus.operational_status == "warning").count()
+        # 设备统计读取汇总表，接口统计一次 GROUP BY
+        summary = get_device_summary(db)
+        device_status = summary["status"]
+        total_devices = summary["total"]
+        online_devices = device_status.get("online", 0)
+        offline_devices = device_status.get("offline", 0)
+        unknown_devices = device_status.get("unknown", 0)
+        warning_devices = device_status.get("warning", 0)
+        
+        port_status = get_interface_status_counts(db)
+        total_ports = sum(port_status.values())
+        up_ports = port_status.get("up", 0)
+        down_ports = port_status.get("down", 0)
+        warning_ports = port_status.get("warning", 0)
         
         # 模拟用户和告警数据（这些需要根据实际模型调整）
         total_users = 5
@@ -42,10 +56,14 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
         total_alarms = 15
         unhandled_alarms = 3
         
+        # CPU和内存取各设备最近一次采集值的平均值，最近两个采集周期内没有样本时为0
+        now = int(time.time())
+        health_start = now - 2 * HEALTH_POLL_INTERVAL
+        cpu_usage = round(latest_average(db, "cpu_usage", health_start, now + 1) or 0, 2)
+        memory_usage = round(latest_average(db, "memory_usage", health_start, now + 1) or 0, 2)
+        
         # 模拟性能数据
         bandwidth_usage = 45
-        cpu_usage = 30
-        memory_usage = 65
         uptime = 86400
         
         stats = {
@@ -73,7 +91,7 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"获取仪表板统计数据失败: {str(e)}")
         # 出错时返回模拟数据
-        return {
+        return uncached({
             "totalDevices": 3,
             "onlineDevices": 2,
             "offlineDevices": 0,
@@ -91,42 +109,39 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
             "cpuUsage": 20,
             "memoryUsage": 50,
             "uptime": 3600
-        }
+        })
 
 @router.get("/performance", response_model=Dict[str, Any])
-def get_performance_data(db: Session = Depends(get_db)):
+def get_performance_data(db: Session = Depends(get_read_db)):
     """获取设备性能数据
     
     返回:
-        设备性能数据
+        最近24小时的设备性能数据（每4小时一个点），CPU和内存为所有设备的平均使用率，
+        带宽为所有接口的平均收发速率（Mbps）
     """
     try:
-        # 这里可以根据实际需求查询设备性能数据
-        # 由于没有专门的性能数据模型，我们先返回模拟数据
+        bucket_seconds = 4 * 3600
+        start_ts, end_ts = recent_window(bucket_seconds, 6)
+        
+        cpu_series = query_fleet_series(db, "cpu_usage", start_ts, end_ts, bucket_seconds)
+        memory_series = query_fleet_series(db, "memory_usage", start_ts, end_ts, bucket_seconds)
+        in_series = query_fleet_series(db, "if_in_octets", start_ts, end_ts, bucket_seconds)
+        out_series = query_fleet_series(db, "if_out_octets", start_ts, end_ts, bucket_seconds)
+        
+        # 字节数换算为时间桶内的平均速率（Mbps）
+        mbps_scale = bucket_seconds * 1000000 / 8
+        times = [format_bucket_time(bucket, "%H:%M") for bucket in bucket_starts(start_ts, end_ts, bucket_seconds)]
+        cpu = fill_series(cpu_series, "avg", start_ts, end_ts, bucket_seconds)
+        memory = fill_series(memory_series, "avg", start_ts, end_ts, bucket_seconds)
+        bandwidth_in = fill_series(in_series, "sum", start_ts, end_ts, bucket_seconds, mbps_scale)
+        bandwidth_out = fill_series(out_series, "sum", start_ts, end_ts, bucket_seconds, mbps_scale)
+        
         performance = {
-            "cpu": [
-                {"time": "00:00", "usage": 20},
-                {"time": "04:00", "usage": 15},
-                {"time": "08:00", "usage": 30},
-                {"time": "12:00", "usage": 45},
-                {"time": "16:00", "usage": 40},
-                {"time": "20:00", "usage": 25}
-            ],
-            "memory": [
-                {"time": "00:00", "usage": 40},
-                {"time": "04:00", "usage": 35},
-                {"time": "08:00", "usage": 50},
-                {"time": "12:00", "usage": 70},
-                {"time": "16:00", "usage": 65},
-                {"time": "20:00", "usage": 55}
-            ],
+            "cpu": [{"time": t, "usage": v} for t, v in zip(times, cpu)],
+            "memory": [{"time": t, "usage": v} for t, v in zip(times, memory)],
             "bandwidth": [
-                {"time": "00:00", "in": 10, "out": 5},
-                {"time": "04:00", "in": 5, "out": 2},
-                {"time": "08:00", "in": 30, "out": 15},
-                {"time": "12:00", "in": 50, "out": 30},
-                {"time": "16:00", "in": 45, "out": 25},
-                {"time": "20:00", "in": 20, "out": 10}
+                {"time": t, "in": i, "out": o}
+                for t, i, o in zip(times, bandwidth_in, bandwidth_out)
             ]
         }
         
@@ -142,7 +157,7 @@ def get_performance_data(db: Session = Depends(get_db)):
         }
 
 @router.get("/warnings", response_model=List[Dict[str, Any]])
-def get_warning_devices(db: Session = Depends(get_db)):
+async def get_warning_devices(db: AsyncSession = Depends(get_async_db)):
     """获取警告设备信息
     
     返回:
@@ -150,11 +165,11 @@ def get_warning_devices(db: Session = Depends(get_db)):
     """
     try:
         # 查询状态为warning的设备
-        warning_devices = db.query(Device).filter(Device.status == "warning").all()
+        warning_devices = (await db.scalars(select(Device).where(Device.status == "warning"))).all()
         
         # 如果没有warning设备，查询unknown设备作为备选
         if not warning_devices:
-            warning_devices = db.query(Device).filter(Device.status == "unknown").all()
+            warning_devices = (await db.scalars(select(Device).where(Device.status == "unknown"))).all()
         
         result = []
         for device in warning_devices:
@@ -175,34 +190,25 @@ def get_warning_devices(db: Session = Depends(get_db)):
         return []
 
 @router.get("/device-status", response_model=Dict[str, Any])
-def get_device_status_distribution(db: Session = Depends(get_db)):
+@cached_endpoint(DEVICES_NAMESPACE, ttl=30, stale_ttl=60)
+def get_device_status_distribution(db: Session = Depends(get_read_db)):
     """获取设备状态分布
     
     返回:
         设备状态分布数据
     """
     try:
-        # 查询各状态的设备数量
+        summary = get_device_summary(db)
+        
+        # 各状态的设备数量
         status_counts = {
-            "online": db.query(Device).filter(Device.status == "online").count(),
-            "offline": db.query(Device).filter(Device.status == "offline").count(),
-            "unknown": db.query(Device).filter(Device.status == "unknown").count(),
-            "warning": db.query(Device).filter(Device.status == "warning").count()
+            status: summary["status"].get(status, 0)
+            for status in ("online", "offline", "unknown", "warning")
         }
         
-        # 查询各厂商的设备数量
-        vendor_counts = {}
-        vendors = db.query(Device.vendor).distinct().all()
-        for vendor in vendors:
-            vendor_name = vendor[0]
-            vendor_counts[vendor_name] = db.query(Device).filter(Device.vendor == vendor_name).count()
-        
-        # 查询各类型的设备数量
-        type_counts = {}
-        device_types = db.query(Device.device_type).distinct().all()
-        for device_type in device_types:
-            type_name = device_type[0] if device_type[0] else "Unknown"
-            type_counts[type_name] = db.query(Device).filter(Device.device_type == device_type[0]).count()
+        # 各厂商、各类型的设备数量
+        vendor_counts = dict(summary["vendor"])
+        type_counts = {device_type or "Unknown": count for device_type, count in summary["device_type"].items()}
         
         result = {
             "status": status_counts,
@@ -215,8 +221,8 @@ def get_device_status_distribution(db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"获取设备状态分布失败: {str(e)}")
         # 返回默认的状态分布
-        return {
+        return uncached({
             "status": {"online": 0, "offline": 0, "unknown": 0, "warning": 0},
             "vendor": {},
             "type": {}
-        }
\ No newline at end of file
+        })
\ No newline at end of file
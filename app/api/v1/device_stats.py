@@ -1,66 +1,51 @@
 import logging
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, distinct
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
-from app.services.db import get_db
-from app.services.models import Device, InterfaceStatus
+from app.services.etag import ConditionalRoute
+from app.services.db import get_read_db
+from app.services.models import Device
+from app.services.device_summary import get_device_summary, get_interface_status_counts
+from app.services.response_cache import DEVICES_NAMESPACE, cached_endpoint, uncached
+from app.services.metrics_store import bucket_starts, format_bucket_time, recent_window
+from app.services.metrics_analytics import fill_series
+from app.services.metrics_rollup import query_fleet_series
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# 仪表板数据按响应体哈希生成ETag，未变化时返回304
+router = APIRouter(route_class=ConditionalRoute)
+
+# 字节到MB的换算系数
+BYTES_PER_MB = 1024 * 1024
 
 
 @router.get("/overview", response_model=Dict[str, Any])
-def get_device_overview(db: Session = Depends(get_db)):
+@cached_endpoint(DEVICES_NAMESPACE, ttl=30, stale_ttl=60)
+def get_device_overview(db: Session = Depends(get_read_db)):
     """获取设备总体概览统计数据
     
     返回: 
         包含设备总数、在线设备数、离线设备数等统计信息的字典
     """
     try:
-        # 设备总数
-        total_devices = db.query(Device).count()
-        
-        # 在线设备数
-        online_devices = db.query(Device).filter(Device.status == "online").count()
-        
-        # 离线设备数
-        offline_devices = db.query(Device).filter(Device.status == "offline").count()
-        
-        # 未知状态设备数
+        # 设备统计读取汇总表，接口统计一次 GROUP BY
+        summary = get_device_summary(db)
+        total_devices = summary["total"]
+        online_devices = summary["status"].get("online", 0)
+        offline_devices = summary["status"].get("offline", 0)
         unknown_devices = total_devices - online_devices - offline_devices
         
-        # 按厂商统计设备数量
-        vendor_stats = db.query(
-            Device.vendor,
-            func.count(Device.id).label("count")
-        ).group_by(Device.vendor).all()
+        vendor_dict = dict(summary["vendor"])
+        type_dict = {device_type: count for device_type, count in summary["device_type"].items() if device_type}
+        location_dict = {location: count for location, count in summary["location"].items() if location}
         
-        # 按设备类型统计设备数量
-        type_stats = db.query(
-            Device.device_type,
-            func.count(Device.id).label("count")
-        ).group_by(Device.device_type).all()
-        
-        # 按位置统计设备数量
-        location_stats = db.query(
-            Device.location,
-            func.count(Device.id).label("count")
-        ).group_by(Device.location).all()
-        
-        # 转换结果为字典格式
-        vendor_dict = {vendor: count for vendor, count in vendor_stats}
-        type_dict = {device_type: count for device_type, count in type_stats if device_type}
-        location_dict = {location: count for location, count in location_stats if location}
-        
-        # 接口统计
-        total_interfaces = db.query(InterfaceStatus).count()
-        active_interfaces = db.query(InterfaceStatus).filter(
-            InterfaceStatus.operational_status == "up"
-        ).count()
+        port_status = get_interface_status_counts(db)
+        total_interfaces = sum(port_status.values())
+        active_interfaces = port_status.get("up", 0)
         inactive_interfaces = total_interfaces - active_interfaces
         
         result = {
@@ -84,7 +69,7 @@ def get_device_overview(db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"获取设备概览统计数据失败: {str(e)}")
         # 提供默认的模拟数据，确保前端页面能正常显示
-        return {
+        return uncached({
             "total_devices": 25,
             "online_devices": 20,
             "offline_devices": 3,
@@ -111,44 +96,34 @@ def get_device_overview(db: Session = Depends(get_db)):
                 "active": 320,
                 "inactive": 64
             }
-        }
+        })
 
 
 @router.get("/traffic-monitoring", response_model=Dict[str, List[Dict[str, Any]]])
-def get_traffic_monitoring():
+def get_traffic_monitoring(
+    hours: int = Query(24, ge=1, le=720, description="查询最近多少小时的数据"),
+    db: Session = Depends(get_read_db)
+):
     """获取网络流量监控数据
     
+    参数:
+        hours: 查询最近多少小时的数据，默认24小时
+    
     返回: 
-        包含入站流量和出站流量的时间序列数据
+        包含入站流量和出站流量的时间序列数据（每小时一个点，单位MB）
     """
     try:
-        # 模拟过去24小时的流量数据
-        import datetime
-        import random
-        
-        now = datetime.datetime.now()
-        inbound_traffic = []
-        outbound_traffic = []
+        start_ts, end_ts = recent_window(3600, hours)
         
-        # 生成过去24小时的数据点，每小时一个点
-        for i in range(24):
-            time = (now - datetime.timedelta(hours=i)).strftime("%Y-%m-%d %H:%M")
-            
-            # 模拟入站流量（MB），在工作日的工作时间（9-18点）流量较大
-            hour = (now - datetime.timedelta(hours=i)).hour
-            base_in = 500 if 9 <= hour <= 18 else 200
-            in_traffic = base_in + random.randint(-100, 100)
-            
-            # 模拟出站流量（MB）
-            base_out = 300 if 9 <= hour <= 18 else 150
-            out_traffic = base_out + random.randint(-50, 50)
-            
-            inbound_traffic.append({"time": time, "value": in_traffic})
-            outbound_traffic.append({"time": time, "value": out_traffic})
+        # 按小时读取全网收发字节数的汇总序列（24小时自动选择5分钟精度，每个指标288行）
+        in_series = query_fleet_series(db, "if_in_octets", start_ts, end_ts, 3600)
+        out_series = query_fleet_series(db, "if_out_octets", start_ts, end_ts, 3600)
         
-        # 反转列表，使时间从早到晚排列
-        inbound_traffic.reverse()
-        outbound_traffic.reverse()
+        times = [format_bucket_time(bucket) for bucket in bucket_starts(start_ts, end_ts, 3600)]
+        in_values = fill_series(in_series, "sum", start_ts, end_ts, 3600, BYTES_PER_MB)
+        out_values = fill_series(out_series, "sum", start_ts, end_ts, 3600, BYTES_PER_MB)
+        inbound_traffic = [{"time": t, "value": v} for t, v in zip(times, in_values)]
+        outbound_traffic = [{"time": t, "value": v} for t, v in zip(times, out_values)]
         
         result = {
             "inbound_traffic": inbound_traffic,
@@ -218,7 +193,8 @@ def get_traffic_monitoring():
 
 
 @router.get("/device-types", response_model=Dict[str, Any])
-def get_device_type_stats(db: Session = Depends(get_db)):
+@cached_endpoint(DEVICES_NAMESPACE, ttl=60, stale_ttl=120)
+def get_device_type_stats(db: Session = Depends(get_read_db)):
     """获取设备类型统计数据
     
     返回: 
@@ -257,7 +233,7 @@ def get_device_type_stats(db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"获取设备类型统计数据失败: {str(e)}")
         # 返回默认的模拟数据
-        return {
+        return uncached({
             "type_distribution": {
                 "switch": 15,
                 "router": 6,
@@ -270,7 +246,7 @@ def get_device_type_stats(db: Session = Depends(get_db)):
                 "ruijie": {"switch": 3, "router": 1, "access_point": 1},
                 "cisco": {"switch": 1, "router": 0}
             }
-        }
+        })
 
 
 @router.get("/recent-alerts", response_model=List[Dict[str, Any]])
@@ -418,40 +394,29 @@ def get_recent_alerts():
 
 
 @router.get("/device-health", response_model=Dict[str, List[Dict[str, Any]]])
-def get_device_health():
+def get_device_health(
+    hours: int = Query(24, ge=1, le=720, description="查询最近多少小时的数据"),
+    db: Session = Depends(get_read_db)
+):
     """获取设备健康状态数据
     
+    参数:
+        hours: 查询最近多少小时的数据，默认24小时
+    
     返回: 
-        包含CPU使用率、内存使用率等健康指标的时间序列数据
+        包含CPU使用率、内存使用率等健康指标的时间序列数据（所有设备的小时平均值）
     """
     try:
-        # 模拟过去24小时的设备健康数据
-        import datetime
-        import random
+        start_ts, end_ts = recent_window(3600, hours)
         
-        now = datetime.datetime.now()
-        cpu_usage = []
-        memory_usage = []
-        
-        # 生成过去24小时的数据点，每小时一个点
-        for i in range(24):
-            time = (now - datetime.timedelta(hours=i)).strftime("%Y-%m-%d %H:%M")
-            
-            # 模拟CPU使用率，在工作日的工作时间（9-18点）使用率较高
-            hour = (now - datetime.timedelta(hours=i)).hour
-            base_cpu = 60 if 9 <= hour <= 18 else 30
-            cpu = base_cpu + random.randint(-10, 10)
-            
-            # 模拟内存使用率
-            base_memory = 70 if 9 <= hour <= 18 else 50
-            memory = base_memory + random.randint(-5, 5)
-            
-            cpu_usage.append({"time": time, "value": cpu})
-            memory_usage.append({"time": time, "value": memory})
+        cpu_series = query_fleet_series(db, "cpu_usage", start_ts, end_ts, 3600)
+        memory_series = query_fleet_series(db, "memory_usage", start_ts, end_ts, 3600)
         
-        # 反转列表，使时间从早到晚排列
-        cpu_usage.reverse()
-        memory_usage.reverse()
+        times = [format_bucket_time(bucket) for bucket in bucket_starts(start_ts, end_ts, 3600)]
+        cpu_values = fill_series(cpu_series, "avg", start_ts, end_ts, 3600)
+        memory_values = fill_series(memory_series, "avg", start_ts, end_ts, 3600)
+        cpu_usage = [{"time": t, "value": v} for t, v in zip(times, cpu_values)]
+        memory_usage = [{"time": t, "value": v} for t, v in zip(times, memory_values)]
         
         return {
             "cpu_usage": cpu_usage,
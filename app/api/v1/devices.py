@@ -3,16 +3,16 @@ import subprocess
 import platform
 import re
 import logging
-import io
 import csv
 import os
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 
-from app.services.db import get_db
-from app.services.models import Device as DeviceModel, User, Config
+from app.services.db import get_db, get_async_db
+from app.services.models import Device as DeviceModel, User, Config, DeviceImportJob, DeviceImportError, InterfaceStatus
 from app.services.schemas import (
     DeviceCreate, 
     DeviceOut, 
@@ -28,9 +28,19 @@ from app.services.config_backup import (
     get_device_config_backups,
     delete_config_backup,
     get_latest_config_backup,
-    CONFIG_BACKUP_DIR
+    get_backup_list_version,
+    get_backup_file
 )
+from app.services.compression import stored_encoding_acceptor, stored_file_response
 from app.services.adapter_manager import AdapterManager
+from app.services.device_import import import_devices_csv
+from app.services.device_import_jobs import create_import_job, import_job_progress
+from app.services.export import EXPORT_FORMAT_PATTERN, export_response
+from app.services.responses import fast_response, negotiated_media_type
+from app.services.etag import etag_matches, hash_etag, http_date, make_etag, not_modified, not_modified_since, rows_digest
+from app.services.pagination import decode_cursor, encode_cursor, keyset_condition, parse_sort, split_values
+from app.services.metrics_collector import record_device_health
+from app.services.command_audit import record_command
 from app.services.auth import decode_access_token, authenticate_user
 from app.api.v1.auth import oauth2_scheme
 
@@ -62,108 +72,11 @@ def batch_import_devices(
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="请上传CSV格式文件")
         
-        # 读取CSV文件内容，支持不同编码格式
-        file_content = file.file.read()
-        
-        # 尝试使用指定的编码格式解码文件内容
+        # 流式解析上传的文件，校验通过的行按块批量插入，整个文件在一个事务中提交
         try:
-            content = file_content.decode(encoding).splitlines()
-        except UnicodeDecodeError:
-            # 如果指定编码失败，尝试检测BOM或常用编码
-            if file_content.startswith(b'\xef\xbb\xbf'):
-                content = file_content[3:].decode('utf-8').splitlines()
-            elif file_content.startswith(b'\xff\xfe'):
-                content = file_content.decode('utf-16le').splitlines()
-            elif file_content.startswith(b'\xfe\xff'):
-                content = file_content.decode('utf-16be').splitlines()
-            else:
-                # 尝试其他常见编码
-                try:
-                    content = file_content.decode('gbk').splitlines()
-                except UnicodeDecodeError:
-                    try:
-                        content = file_content.decode('latin-1').splitlines()
-                    except UnicodeDecodeError:
-                        raise HTTPException(status_code=400, detail="无法解码文件内容，请检查文件编码格式")
-        
-        if not content:
-            raise HTTPException(status_code=400, detail="CSV文件为空")
-        
-        # 解析CSV文件
-        csv_reader = csv.reader(content)
-        devices_data = list(csv_reader)
-        
-        # 准备结果数据
-        result = {
-            "total": len(devices_data),
-            "success": 0,
-            "failed": 0,
-            "failed_devices": []
-        }
-        
-        # 处理每台设备
-        for index, device_row in enumerate(devices_data):
-            try:
-                # 检查行数据是否完整
-                if len(device_row) < 5:
-                    raise ValueError("缺少必需的字段")
-                
-                # 创建设备数据 - 根据用户提供的CSV文件格式说明调整字段映射
-                # CSV字段顺序：1.设备名称, 2.管理IP, 3.厂商, 4.用户名, 5.密码, 6.特权密码(可选), 7.端口(可选), 8.设备型号(可选), 9.软件版本(可选), 10.序列号(可选), 11.位置(可选), 12.设备类型(可选)
-                device_data = {
-                    "name": device_row[0].strip() or None,
-                    "management_ip": device_row[1].strip(),
-                    "vendor": device_row[2].strip(),
-                    "username": device_row[3].strip(),
-                    "password": device_row[4].strip(),
-                    "enable_password": device_row[5].strip() or None if len(device_row) > 5 else None,  # 特权密码在第6列
-                    "port": 22,  # 默认端口
-                    "model": device_row[7].strip() or None if len(device_row) > 7 else None,  # 设备型号在第8列
-                    "os_version": device_row[8].strip() or None if len(device_row) > 8 else None,  # 软件版本在第9列
-                    "serial_number": device_row[9].strip() or None if len(device_row) > 9 else None,  # 序列号在第10列
-                    "location": device_row[10].strip() or None if len(device_row) > 10 else None,  # 位置在第11列
-                    "device_type": device_row[11].strip() or None if len(device_row) > 11 else None  # 设备类型在第12列
-                }
-                
-                # 如果有端口号数据，使用它
-                if len(device_row) > 6 and device_row[6].strip():
-                    try:
-                        device_data["port"] = int(device_row[6].strip())
-                    except ValueError:
-                        pass
-                
-                # 验证设备数据
-                device_create = DeviceCreate(**device_data)
-                
-                # 检查IP是否已存在
-                existing_device = db.query(DeviceModel).filter(
-                    DeviceModel.management_ip == device_create.management_ip
-                ).first()
-                
-                if existing_device:
-                    raise ValueError(f"IP地址 {device_create.management_ip} 已存在")
-                
-                # 创建设备记录
-                device = DeviceModel(**device_create.dict())
-                db.add(device)
-                db.commit()
-                db.refresh(device)
-                
-                result["success"] += 1
-                logger.info(f"成功导入设备: {device.name or device.management_ip}")
-                
-            except Exception as e:
-                result["failed"] += 1
-                result["failed_devices"].append({
-                    "row": index + 1,
-                    "error": str(e)
-                })
-                logger.error(f"导入设备失败，行号: {index + 1}, 错误: {str(e)}")
-                # 回滚当前设备的事务
-                db.rollback()
-        
-        logger.info(f"批量导入设备完成，总计: {result['total']}, 成功: {result['success']}, 失败: {result['failed']}")
-        return result
+            return import_devices_csv(db, file.file, encoding)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
     except HTTPException:
         raise
@@ -171,7 +84,175 @@ def batch_import_devices(
         logger.error(f"批量导入设备时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"批量导入设备失败: {str(e)}")
 
-# 执行ping命令检测设备连通性
+@router.post("/import-jobs", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+def create_device_import_job(
+    file: UploadFile = File(...),
+    encoding: str = "utf-8",
+    db: Session = Depends(get_db)
+):
+    """创建后台设备导入任务
+    
+    上传的文件落盘后立即返回任务信息，由后台线程按块导入，
+    通过 GET /devices/import-jobs/{job_id} 查询进度
+    
+    参数:
+        file: 包含设备信息的CSV文件，格式与批量导入相同
+        encoding: 文件编码格式，默认为utf-8
+    
+    返回:
+        导入任务信息，包含任务ID
+    
+    异常:
+        400: 文件格式错误
+        500: 服务器内部错误
+    """
+    try:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="请上传CSV格式文件")
+        
+        job = create_import_job(db, file.file, file.filename, encoding)
+        return import_job_progress(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"创建设备导入任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"创建设备导入任务失败: {str(e)}")
+
+
+@router.get("/import-jobs/{job_id}", response_model=Dict[str, Any])
+async def get_device_import_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """查询后台设备导入任务的进度
+    
+    参数:
+        job_id: 导入任务ID
+    
+    返回:
+        任务状态、进度百分比、已处理行数、成功数和失败数
+    
+    异常:
+        404: 导入任务未找到
+        500: 服务器内部错误
+    """
+    try:
+        job = await db.get(DeviceImportJob, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="导入任务未找到")
+        return import_job_progress(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询设备导入任务失败，ID: {job_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询设备导入任务失败，请稍后重试")
+
+
+@router.get("/import-jobs/{job_id}/errors", response_model=List[Dict[str, Any]])
+async def get_device_import_errors(
+    job_id: int,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int = Query(100, ge=1, le=1000, description="每页数量"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """分页查询后台设备导入任务的行错误，按行号排序
+    
+    参数:
+        job_id: 导入任务ID
+        cursor: 分页游标，有下一页时通过响应头 X-Next-Cursor 返回
+        limit: 每页数量
+    
+    返回:
+        行错误列表，每项包含行号和错误信息
+    
+    异常:
+        400: 游标无效
+        404: 导入任务未找到
+        500: 服务器内部错误
+    """
+    try:
+        if not await db.scalar(select(DeviceImportJob.id).where(DeviceImportJob.id == job_id)):
+            raise HTTPException(status_code=404, detail="导入任务未找到")
+        
+        query = select(DeviceImportError.id, DeviceImportError.row_number, DeviceImportError.error).where(
+            DeviceImportError.job_id == job_id
+        )
+        if cursor:
+            try:
+                last_row, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            query = query.where(keyset_condition(DeviceImportError.row_number, DeviceImportError.id, last_row, last_id))
+        query = query.order_by(DeviceImportError.row_number, DeviceImportError.id).limit(limit + 1)
+        
+        rows = (await db.execute(query)).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].row_number, rows[-1].id)
+        return fast_response([{"row": row.row_number, "error": row.error} for row in rows], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询设备导入错误失败，ID: {job_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询设备导入错误失败，请稍后重试")
+
+@router.get("/export")
+def export_devices(
+    export_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN, description="导出格式：csv 或 ndjson"),
+    vendor: Optional[str] = Query(None, description="厂商，多个用逗号分隔"),
+    status_filter: Optional[str] = Query(None, alias="status", description="设备状态，多个用逗号分隔")
+):
+    """流式导出设备清单（不含密码）
+    
+    参数:
+        format: 导出格式，csv 或 ndjson
+        vendor/status: 精确匹配过滤，多个取值用逗号分隔
+    
+    返回:
+        设备清单文件下载流
+    """
+    query = select(*[getattr(DeviceModel, field) for field in DEVICE_EXPORT_FIELDS])
+    for column, value in ((DeviceModel.vendor, vendor), (DeviceModel.status, status_filter)):
+        values = split_values(value)
+        if values:
+            query = query.where(column.in_(values))
+    return export_response(query.order_by(DeviceModel.id), export_format, "devices")
+
+
+@router.get("/interfaces/export")
+def export_interface_status(
+    export_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN, description="导出格式：csv 或 ndjson"),
+    device_id: Optional[int] = Query(None, description="只导出指定设备的接口")
+):
+    """流式导出接口状态，包含所属设备的名称和管理IP
+    
+    参数:
+        format: 导出格式，csv 或 ndjson
+        device_id: 设备ID，不指定时导出全部设备的接口
+    
+    返回:
+        接口状态文件下载流
+    """
+    query = (
+        select(
+            InterfaceStatus.id,
+            InterfaceStatus.device_id,
+            DeviceModel.name.label("device_name"),
+            DeviceModel.management_ip,
+            InterfaceStatus.interface_name,
+            InterfaceStatus.admin_status,
+            InterfaceStatus.operational_status,
+            InterfaceStatus.mac_address,
+            InterfaceStatus.ip_address,
+            InterfaceStatus.speed,
+            InterfaceStatus.last_seen
+        )
+        .join(DeviceModel, InterfaceStatus.device_id == DeviceModel.id)
+        .order_by(InterfaceStatus.id)
+    )
+    if device_id is not None:
+        query = query.where(InterfaceStatus.device_id == device_id)
+    return export_response(query, export_format, "interface_status")
+
+
 def ping_host(ip: str) -> dict:
     """执行ping命令检测设备连通性
     
@@ -275,20 +356,116 @@ def check_connectivity(
         raise HTTPException(status_code=500, detail="检查设备连通性失败，请稍后重试")
 
 
-@router.get("/", response_model=List[DeviceOut])
-def get_devices(db: Session = Depends(get_db)):
-    """获取所有设备列表
+# 设备列表可返回、可排序的字段（不含密码等敏感字段）
+DEVICE_LIST_FIELDS = list(DeviceOut.model_fields.keys())
+# 导出的字段，与列表接口一致，不含密码
+DEVICE_EXPORT_FIELDS = ["id"] + [field for field in DEVICE_LIST_FIELDS if field != "id"]
+# 只指定游标时的每页数量
+DEVICE_PAGE_SIZE = 100
+DEVICE_SORT_FIELDS = {"id", "name", "management_ip", "vendor", "status", "location", "device_type", "created_at", "updated_at"}
+
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def get_devices(
+    request: Request,
+    vendor: Optional[str] = Query(None, description="厂商，多个用逗号分隔"),
+    status_filter: Optional[str] = Query(None, alias="status", description="设备状态，多个用逗号分隔"),
+    location: Optional[str] = Query(None, description="设备位置，多个用逗号分隔"),
+    device_type: Optional[str] = Query(None, description="设备类型，多个用逗号分隔"),
+    ip_prefix: Optional[str] = Query(None, description="管理IP前缀，如 10.1."),
+    sort: str = Query("id", description="排序字段，前缀 - 表示降序，如 -updated_at"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页数量，与 cursor 均未指定时返回全部设备"),
+    fields: Optional[str] = Query(None, description="返回的字段，多个用逗号分隔，默认返回全部字段"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取设备列表（支持过滤、排序、键集分页和字段投影）
+    
+    参数:
+        vendor/status/location/device_type: 精确匹配过滤，多个取值用逗号分隔
+        ip_prefix: 管理IP前缀匹配
+        sort: 排序字段，前缀 - 表示降序
+        cursor: 分页游标，有下一页时通过响应头 X-Next-Cursor 返回
+        limit: 每页数量；limit 与 cursor 均未指定时不分页，返回全部设备，只指定 cursor 时每页100台
+        fields: 返回的字段
     
     返回:
-        设备列表
+        设备列表；ETag 由过滤结果中各设备的ID和修改次数计算，
+        If-None-Match 匹配时返回304
     
     异常:
+        400: 排序字段、返回字段或游标无效
         500: 服务器内部错误
     """
     try:
-        devices = db.query(DeviceModel).all()
-        logger.debug(f"获取设备列表成功，共 {len(devices)} 台设备")
-        return devices
+        sort_field, descending = parse_sort(sort)
+        if sort_field not in DEVICE_SORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort_field}")
+        
+        selected = split_values(fields) or DEVICE_LIST_FIELDS
+        unknown = [field for field in selected if field not in DEVICE_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"不支持的字段: {', '.join(unknown)}")
+        
+        sort_column = getattr(DeviceModel, sort_field)
+        # 只查询需要的列，排序列和id用于生成游标
+        query_fields = list(dict.fromkeys(selected + [sort_field, "id"]))
+        
+        conditions = []
+        for column, value in (
+            (DeviceModel.vendor, vendor),
+            (DeviceModel.status, status_filter),
+            (DeviceModel.location, location),
+            (DeviceModel.device_type, device_type)
+        ):
+            values = split_values(value)
+            if values:
+                conditions.append(column.in_(values))
+        if ip_prefix:
+            escaped = ip_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(DeviceModel.management_ip.like(f"{escaped}%", escape="\\"))
+        
+        # 先按ID顺序读取过滤结果的 (id, row_version) 判断结果是否变化，未变化时不再查询和传输列表
+        versions = await db.execute(
+            select(DeviceModel.id, DeviceModel.row_version).where(*conditions).order_by(DeviceModel.id)
+        )
+        etag = make_etag("devices", negotiated_media_type(), request.url.query, rows_digest(versions))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        query = select(*[getattr(DeviceModel, field) for field in query_fields]).where(*conditions)
+        
+        if cursor:
+            try:
+                last_value, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            query = query.where(keyset_condition(sort_column, DeviceModel.id, last_value, last_id, descending))
+        
+        if descending:
+            query = query.order_by(sort_column.desc(), DeviceModel.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), DeviceModel.id.asc())
+        
+        headers = {"ETag": etag}
+        if limit is None and cursor is None:
+            # 未要求分页时与原接口一致，返回全部设备
+            rows = (await db.execute(query)).all()
+        else:
+            limit = limit or DEVICE_PAGE_SIZE
+            # 多取一行判断是否还有下一页
+            rows = (await db.execute(query.limit(limit + 1))).all()
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            headers["X-Next-Cursor"] = encode_cursor(getattr(last, sort_field), last.id)
+        
+        # 查询结果直接编码，不经过 response_model 校验
+        devices = [{field: getattr(row, field) for field in selected} for row in rows]
+        logger.debug(f"获取设备列表成功，本页 {len(devices)} 台设备")
+        return fast_response(devices, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取设备列表失败: {str(e)}")
         raise HTTPException(
@@ -298,7 +475,7 @@ def get_devices(db: Session = Depends(get_db)):
 
 
 @router.get("/{device_id}", response_model=DeviceOut)
-def get_device(device_id: int, db: Session = Depends(get_db)):
+async def get_device(device_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """获取指定设备的详细信息
     
     参数:
@@ -312,11 +489,16 @@ def get_device(device_id: int, db: Session = Depends(get_db)):
         500: 服务器内部错误
     """
     try:
-        device = db.query(DeviceModel).filter(DeviceModel.id == device_id).first()
+        device = await db.scalar(select(DeviceModel).where(DeviceModel.id == device_id))
         if not device:
             logger.warning(f"设备未找到，ID: {device_id}")
             raise HTTPException(status_code=404, detail="设备未找到")
         
+        etag = make_etag("device", negotiated_media_type(), device.id, device.row_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        
         logger.debug(f"获取设备信息成功，ID: {device_id}")
         return device
     except HTTPException:
@@ -561,6 +743,9 @@ def get_device_info(device_id: int, db: Session = Depends(get_db)):
             adapter.disconnect()
             
             if realtime_info:
+                # 顺带记录本次读取到的CPU和内存使用率
+                record_device_health(device.id, adapter.health_from_device_info(realtime_info))
+
                 # 合并实时信息和基本信息
                 result = {**basic_info, **realtime_info}
                 result["connection_status"] = "connected"
@@ -840,6 +1025,7 @@ def execute_device_command(device_id: int, command_req: CommandRequest, token: s
         
         # 记录执行的命令（注意：不要记录密码等敏感信息）
         logger.info(f"用户 {username} 请求执行命令，设备ID: {device_id}, 命令: {command_req.command}")
+        started = time.monotonic()
         
         # 创建设备连接信息字典
         device_info = {
@@ -854,15 +1040,23 @@ def execute_device_command(device_id: int, command_req: CommandRequest, token: s
         if device.enable_password:
             device_info['enable_password'] = device.enable_password
         
-        # 创建适配器
-        adapter = AdapterManager.get_adapter(device_info)
-        
-        # 执行命令
-        output = adapter.execute_command(command_req.command)
-        adapter.disconnect()
+        try:
+            # 创建适配器
+            adapter = AdapterManager.get_adapter(device_info)
+            
+            # 执行命令
+            output = adapter.execute_command(command_req.command)
+            adapter.disconnect()
+        except Exception as e:
+            # 执行失败同样写入审计日志，输出记录为错误信息
+            record_command(device_id, username, command_req.command, str(e), False,
+                           int((time.monotonic() - started) * 1000))
+            raise
         
-        # 记录命令执行成功
+        # 记录命令执行成功，审计日志在后台批量写入
         logger.info(f"命令执行成功，设备ID: {device_id}")
+        record_command(device_id, username, command_req.command, output, True,
+                       int((time.monotonic() - started) * 1000))
         
         from datetime import datetime
         return CommandResponse(
@@ -961,10 +1155,11 @@ def backup_device_config(
         raise HTTPException(status_code=500, detail=f"备份设备配置失败: {str(e)}")
 
 @router.get("/{device_id}/config-backups", response_model=List[ConfigOut])
-def get_device_backups(
+async def get_device_backups(
     device_id: int,
+    request: Request,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取设备的所有配置备份
     
@@ -981,16 +1176,22 @@ def get_device_backups(
     """
     try:
         # 检查设备是否存在
-        device = db.query(DeviceModel).filter(DeviceModel.id == device_id).first()
-        if not device:
+        device_exists = await db.scalar(select(DeviceModel.id).where(DeviceModel.id == device_id))
+        if not device_exists:
             logger.warning(f"设备未找到，ID: {device_id}")
             raise HTTPException(status_code=404, detail="设备未找到")
         
+        # 备份列表未变化时返回304
+        version = await db.run_sync(get_backup_list_version, device_id)
+        etag = make_etag("device-backups", negotiated_media_type(), device_id, limit, *version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
         # 获取配置备份列表
-        backups = get_device_config_backups(db, device_id, limit)
+        backups = await db.run_sync(get_device_config_backups, device_id, limit)
         
         logger.info(f"获取设备配置备份列表成功，设备ID: {device_id}, 共 {len(backups)} 条记录")
-        return backups
+        return fast_response(backups, headers={"ETag": etag})
     except HTTPException:
         # 重新抛出已定义的HTTP异常
         raise
@@ -1001,6 +1202,8 @@ def get_device_backups(
 @router.get("/config-backups/{backup_id}", response_model=ConfigOut)
 def get_backup(
     backup_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """获取指定的配置备份
@@ -1016,6 +1219,14 @@ def get_backup(
         500: 获取配置备份失败
     """
     try:
+        # 备份内容不会修改，先按哈希判断客户端缓存是否有效，避免读取文件
+        content_hash = db.query(Config.hash).filter(Config.id == backup_id).scalar()
+        if content_hash:
+            etag = make_etag("backup", negotiated_media_type(), backup_id, content_hash)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response.headers["ETag"] = etag
+        
         # 获取配置备份
         backup = get_config_backup(db, backup_id)
         if not backup:
@@ -1072,9 +1283,11 @@ def delete_backup(
         raise HTTPException(status_code=500, detail=f"删除配置备份失败: {str(e)}")
 
 @router.get("/{device_id}/config-backup/latest", response_model=ConfigOut)
-def get_latest_backup(
+async def get_latest_backup(
     device_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取设备的最新配置备份
     
@@ -1090,17 +1303,22 @@ def get_latest_backup(
     """
     try:
         # 检查设备是否存在
-        device = db.query(DeviceModel).filter(DeviceModel.id == device_id).first()
-        if not device:
+        device_exists = await db.scalar(select(DeviceModel.id).where(DeviceModel.id == device_id))
+        if not device_exists:
             logger.warning(f"设备未找到，ID: {device_id}")
             raise HTTPException(status_code=404, detail="设备未找到")
         
         # 获取最新的配置备份
-        backup = get_latest_config_backup(db, device_id)
+        backup = await db.run_sync(get_latest_config_backup, device_id)
         if not backup:
             logger.warning(f"未找到设备的配置备份，ID: {device_id}")
             raise HTTPException(status_code=404, detail="未找到设备的配置备份")
         
+        etag = make_etag("latest-backup", negotiated_media_type(), backup.id, backup.hash)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        
         logger.info(f"获取设备最新配置备份成功，设备ID: {device_id}, 备份ID: {backup.id}")
         return backup
     except HTTPException:
@@ -1176,9 +1394,9 @@ def download_device_config(
         
         logger.info(f"下载设备配置成功，设备ID: {device_id}, 文件名: {download_filename}")
         
-        # 返回文件下载流
-        return StreamingResponse(
-            io.StringIO(config),
+        # 配置已完整读入内存，整体返回，由压缩中间件按 Accept-Encoding 压缩
+        return Response(
+            config,
             media_type="text/plain",
             headers={
                 "Content-Disposition": f"attachment; filename={download_filename}"
@@ -1195,6 +1413,7 @@ def download_device_config(
 @router.get("/config-backups/{backup_id}/download")
 def download_config_backup(
     backup_id: int,
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
@@ -1223,13 +1442,18 @@ def download_config_backup(
         if not config:
             raise HTTPException(status_code=404, detail="配置备份不存在")
         
-        filepath = os.path.join(CONFIG_BACKUP_DIR, config.filename)
-        if not os.path.exists(filepath):
-            raise HTTPException(status_code=404, detail="配置文件不存在")
+        # 文件内容的SHA-256即为强ETag，客户端已有相同内容时不再读取和传输文件
+        etag = hash_etag(config.hash)
+        # 备份创建后不会修改，创建时间即为最后修改时间
+        last_modified = http_date(config.created_at)
+        if etag_matches(request, etag) or not_modified_since(request, config.created_at):
+            return not_modified(etag, {"Last-Modified": last_modified})
         
-        # 打开文件并返回文件内容
-        with open(filepath, 'r', encoding='utf-8') as f:
-            file_content = f.read()
+        # 以文件方式发送，客户端接受保存的压缩格式时直接发送压缩文件，不读入内存
+        backup_file = get_backup_file(db, config, stored_encoding_acceptor(request))
+        if backup_file is None:
+            raise HTTPException(status_code=404, detail="配置文件不存在")
+        file_path, stored_encoding = backup_file
         
         # 获取设备名称用于文件名
         device = db.query(DeviceModel).filter(DeviceModel.id == config.device_id).first()
@@ -1240,11 +1464,15 @@ def download_config_backup(
         
         logger.info(f"用户 {username} 下载配置备份成功，备份ID: {backup_id}, 文件名: {download_filename}")
         
-        return StreamingResponse(
-            io.StringIO(file_content),
+        # 支持Range断点续传
+        return stored_file_response(
+            file_path,
+            stored_encoding,
             media_type="text/plain",
             headers={
-                "Content-Disposition": f"attachment; filename={download_filename}"
+                "Content-Disposition": f"attachment; filename={download_filename}",
+                "ETag": etag,
+                "Last-Modified": last_modified
             }
         )
     except HTTPException:
@@ -3,29 +3,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from fastapi.openapi.utils import get_openapi
-from app.services.db import Base, engine
-from app.api.v1 import auth_router, devices_router, backup_tasks_router, dashboard_router, test_root_router, device_stats_router, alerts_router
+from app.services.db import Base, engine, ensure_columns, ensure_indexes
+from app.api.v1 import auth_router, devices_router, backup_tasks_router, dashboard_router, test_root_router, device_stats_router, alerts_router, command_logs_router, backup_runs_router
 from app.new_dashboard import router as new_dashboard_router
+from app.services.config import METRICS_COLLECT_ENABLED, METRICS_ROLLUP_ENABLED, DEVICE_IMPORT_WORKER_ENABLED, BACKUP_RUN_WORKER_ENABLED
+from app.services.metrics_collector import start_health_poller, start_interface_collector, stop_interface_collector
+from app.services.metrics_rollup import start_rollup_worker, stop_rollup_worker
+from app.services.device_import_jobs import start_import_worker, stop_import_worker
+from app.services.command_audit import start_audit_writer, stop_audit_writer
+from app.services.backup_scheduler import start_backup_worker, stop_backup_worker
+from app.services.responses import ContentNegotiationMiddleware, NegotiatedResponse
+from app.services.compression import CompressionMiddleware
 import os
-import json
-from typing import Any
-from fastapi.responses import JSONResponse
-
-# 自定义JSONResponse，确保UTF-8编码
-class UTF8JSONResponse(JSONResponse):
-    media_type = "application/json; charset=utf-8"
-
-    def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
-
-# ✅ 自动创建数据库表
+
+# ✅ 自动创建数据库表，并为已存在的表补建新增的列和索引
 Base.metadata.create_all(bind=engine)
+ensure_columns(*Base.metadata.sorted_tables)
+ensure_indexes(*Base.metadata.sorted_tables)
 
 # 检查并填充模拟数据（如果数据库为空）
 from app.services.mock_data import populate_mock_data
@@ -34,16 +28,28 @@ try:
 except Exception as e:
     print(f"填充模拟数据时出错: {str(e)}")
 
+# 设备汇总表为空时（首次部署）统计一次；修复计数偏差请执行 rebuild_device_summary.py
+from app.services.db import SessionLocal
+from app.services.device_summary import ensure_device_summary
+try:
+    _summary_db = SessionLocal()
+    try:
+        ensure_device_summary(_summary_db)
+    finally:
+        _summary_db.close()
+except Exception as e:
+    print(f"重建设备汇总表时出错: {str(e)}")
+
 # 创建静态文件目录
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 os.makedirs(static_dir, exist_ok=True)
 
-# 配置FastAPI应用，禁用默认文档路由，并设置默认响应类为UTF8JSONResponse
+# 配置FastAPI应用，禁用默认文档路由，并设置默认响应类为NegotiatedResponse（orjson编码，支持MessagePack）
 app = FastAPI(
     title="NetMgr API", 
     docs_url=None, 
     redoc_url=None,
-    default_response_class=UTF8JSONResponse
+    default_response_class=NegotiatedResponse
 )
 
 # 挂载静态文件目录
@@ -54,8 +60,15 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],  # 设备列表分页游标、条件请求的ETag
 )
 
+# 根据请求头 Accept 选择 JSON 或 MessagePack 编码
+app.add_middleware(ContentNegotiationMiddleware)
+
+# 根据请求头 Accept-Encoding 压缩响应（最外层，压缩最终的响应体）
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["Auth"])
 app.include_router(devices_router, prefix="/api/v1/devices", tags=["Devices"])
 app.include_router(backup_tasks_router, prefix="/api/v1/backup-tasks", tags=["Backup Tasks"])    
@@ -64,6 +77,31 @@ app.include_router(test_root_router, tags=["Test"])
 app.include_router(new_dashboard_router, tags=["New Dashboard"])
 app.include_router(device_stats_router, prefix="/api/v1/device-stats", tags=["Device Statistics"])
 app.include_router(alerts_router, prefix="/api/v1/alerts", tags=["Alerts"])
+app.include_router(command_logs_router, prefix="/api/v1/command-logs", tags=["Command Logs"])
+app.include_router(backup_runs_router, prefix="/api/v1/backup-runs", tags=["Backup Runs"])
+
+# 启动后台指标采集、汇总、设备导入、批量备份和命令审计日志写入
+@app.on_event("startup")
+def start_background_collectors():
+    start_audit_writer()
+    if METRICS_COLLECT_ENABLED:
+        start_interface_collector()
+        start_health_poller()
+    if METRICS_ROLLUP_ENABLED:
+        start_rollup_worker()
+    if DEVICE_IMPORT_WORKER_ENABLED:
+        start_import_worker()
+    if BACKUP_RUN_WORKER_ENABLED:
+        start_backup_worker()
+
+# 关闭时写出缓冲区中剩余的指标样本和审计记录，暂停正在处理的导入和批量备份任务
+@app.on_event("shutdown")
+def stop_background_collectors():
+    stop_interface_collector()
+    stop_rollup_worker()
+    stop_import_worker()
+    stop_backup_worker()
+    stop_audit_writer()
 
 # Simple ping endpoint
 @app.get("/ping")
@@ -0,0 +1,140 @@
+"""
+配置备份存储迁移模块
+- migrate_legacy_backups：把按内容寻址保存之前、以 {设备ID}_{时间}.cfg 平铺在 CONFIG_BACKUP_DIR 下的备份文件
+  迁移到内容存储（blobs/{哈希前两位}/ 分目录，同一设备的相邻版本保存为差量），迁移后删除原文件；
+- copy_store：把一个存储后端中的内容复制到另一个后端，用于从本地目录切换到S3兼容存储。
+
+两者都可以在服务运行时执行：每个备份单独提交，提交前读取方仍使用原文件，提交后使用新的内容；
+中断后重新执行会跳过已完成的部分。
+"""
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.services.backup_storage import StorageBackend, backup_storage
+from app.services.backup_store import BLOB_PREFIX, discard_unstored_blob, store_blob
+from app.services.config_backup import read_config_bytes
+from app.services.models import Config
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 删除待提交内容时使用的扩展名，复制时跳过
+_DELETING_SUFFIX = ".deleting"
+
+
+def _delta_base(db: Session, config: Config) -> Optional[str]:
+    """同一设备在该备份之前、已保存在内容存储中的最近一个版本，作为差量的基准"""
+    return db.execute(
+        select(Config.blob_hash)
+        .where(
+            Config.device_id == config.device_id,
+            Config.blob_hash.isnot(None),
+            Config.created_at <= config.created_at,
+            Config.id != config.id
+        )
+        .order_by(Config.created_at.desc(), Config.id.desc())
+        .limit(1)
+    ).scalar()
+
+
+def migrate_legacy_backups(db: Session, batch_size: int = 100, keep_files: bool = False) -> Dict[str, int]:
+    """把平铺保存的备份文件迁移到内容存储
+
+    按备份ID顺序处理，同一设备的版本依次以上一版本为基准保存差量
+
+    Args:
+        db: 数据库会话
+        batch_size: 每批查询的备份数
+        keep_files: 迁移后是否保留原文件
+
+    Returns:
+        迁移、文件不存在、内容与哈希不一致和失败的备份数
+    """
+    counts = {"migrated": 0, "missing": 0, "mismatched": 0, "failed": 0}
+    last_id = 0
+    while True:
+        configs = db.execute(
+            select(Config)
+            .where(Config.blob_hash.is_(None), Config.id > last_id)
+            .order_by(Config.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not configs:
+            break
+        last_id = configs[-1].id
+        for config in configs:
+            filename = config.filename
+            content_hash = config.hash
+            written = False
+            try:
+                data = read_config_bytes(db, config)
+                if data is None:
+                    counts["missing"] += 1
+                    continue
+                if hashlib.sha256(data).hexdigest() != content_hash:
+                    logger.error(f"备份内容与记录的哈希不一致，未迁移，备份ID: {config.id}, 文件名: {filename}")
+                    counts["mismatched"] += 1
+                    continue
+
+                base_hash = _delta_base(db, config)
+                # 先认领备份再保存内容：只在仍未迁移时更新，与其他迁移进程同时执行时，
+                # 后到的一方等待先到的一方提交后更新0行，不再写入内容文件
+                claimed = db.execute(
+                    update(Config)
+                    .where(Config.id == config.id, Config.blob_hash.is_(None))
+                    .values(blob_hash=content_hash)
+                ).rowcount
+                if not claimed:
+                    db.rollback()
+                    continue
+                written = store_blob(db, content_hash, data, base_hash)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                if written:
+                    discard_unstored_blob(db, content_hash)
+                logger.error(f"迁移配置备份失败，备份ID: {config.id}, 错误: {str(e)}")
+                counts["failed"] += 1
+                continue
+
+            counts["migrated"] += 1
+            if not keep_files:
+                try:
+                    backup_storage.delete(filename)
+                except Exception as e:
+                    logger.error(f"删除已迁移的备份文件失败，文件名: {filename}, 错误: {str(e)}")
+        # 释放本批加载的备份记录
+        db.expunge_all()
+        logger.info(f"迁移配置备份进度: {counts}")
+    return counts
+
+
+def copy_store(source: StorageBackend, target: StorageBackend, overwrite: bool = False) -> Dict[str, int]:
+    """把 source 中的备份内容复制到 target
+
+    复制内容存储和尚未迁移的平铺文件，跳过下载缓存、临时文件和待删除的文件；内容按哈希寻址不会修改，
+    target 中已存在的键默认跳过
+
+    Returns:
+        复制和跳过的文件数
+    """
+    counts = {"copied": 0, "skipped": 0}
+    for key in source.iter_keys():
+        if "/" in key and not key.startswith(BLOB_PREFIX) or key.endswith(_DELETING_SUFFIX):
+            continue
+        if not overwrite and target.exists(key):
+            counts["skipped"] += 1
+            continue
+        data = source.read(key)
+        if data is None:
+            # 复制期间被删除
+            continue
+        target.write(key, data)
+        counts["copied"] += 1
+        if counts["copied"] % 1000 == 0:
+            logger.info(f"复制配置备份内容进度: {counts}")
+    return counts
@@ -0,0 +1,551 @@
+"""
+批量配置备份任务模块
+在一个任务中备份全部设备，或按厂商、位置、设备类型、设备ID筛选的一组设备；
+配置了 BACKUP_SCHEDULE_WINDOW 时，每天在维护窗口开始后自动创建一个备份全部设备的任务。
+
+- 并发：同时备份的设备总数不超过 BACKUP_RUN_WORKERS，同一厂商不超过 BACKUP_RUN_VENDOR_CONCURRENCY，
+  同一位置（站点）不超过 BACKUP_RUN_SITE_CONCURRENCY。调度线程按 (厂商, 位置) 分组排队，
+  只把有空闲额度的设备交给线程池，工作线程不会阻塞等待额度。
+- 重试：单台设备失败后等待 BACKUP_RUN_RETRY_DELAY 秒重试，之后每次等待时间加倍，
+  最多尝试 BACKUP_RUN_RETRY_ATTEMPTS 次；重试排在其他设备之后，不占用等待期间的并发额度。
+- 变化检测：拉取完整配置前先读取配置最近修改时间等变化指示值（见 config_change 模块），
+  与上次拉取时相同则不再拉取；拉取的配置与该设备最新备份的哈希相同，或只有时间戳等易变行不同时，
+  不创建新的备份记录。
+- 维护窗口：到达任务的 deadline 后不再开始新的设备，尚未开始的设备记为跳过。
+- 每台设备的结果写入 config_backup_run_results，任务记录保存各类结果的计数。
+
+任务状态保存在数据库中，认领和接管方式与设备导入任务相同；服务停止或任务被接管后，
+重新执行时跳过已有结果的设备。
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.services.adapter_manager import AdapterManager
+from app.services.config import (
+    BACKUP_RUN_POLL_INTERVAL,
+    BACKUP_RUN_RETRY_ATTEMPTS,
+    BACKUP_RUN_RETRY_DELAY,
+    BACKUP_RUN_SITE_CONCURRENCY,
+    BACKUP_RUN_STALE_SECONDS,
+    BACKUP_RUN_VENDOR_CONCURRENCY,
+    BACKUP_RUN_WORKERS,
+    BACKUP_SCHEDULE_WINDOW
+)
+from app.services.config_backup import (
+    config_content_hash,
+    create_config_backup,
+    get_config_file_content,
+    get_latest_config_backup
+)
+from app.services.config_change import (
+    is_config_unchanged,
+    read_cli_indicator,
+    read_snmp_indicator,
+    record_config_pull
+)
+from app.services.config_diff import same_significant_content
+from app.services.db import SessionLocal
+from app.services.models import ConfigBackupRun, ConfigBackupRunResult, Device
+from app.services.schemas import ConfigCreate
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 支持的筛选条件：请求字段 -> 设备列
+FILTER_COLUMNS = {
+    "device_ids": Device.id,
+    "vendors": Device.vendor,
+    "locations": Device.location,
+    "device_types": Device.device_type,
+}
+
+# 错误信息的最大长度，与 config_backup_run_results.error 列一致
+_MAX_ERROR_LENGTH = 500
+
+# 结果积累到该数量，或距上次提交超过 _CHECKPOINT_SECONDS 秒时写入数据库并更新心跳
+_CHECKPOINT_ROWS = 100
+_CHECKPOINT_SECONDS = 5
+
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_worker_thread: Optional[threading.Thread] = None
+
+
+def parse_window(window: str) -> Optional[Tuple[dtime, dtime]]:
+    """解析 "HH:MM-HH:MM" 格式的维护窗口，结束时间早于开始时间表示跨越午夜
+
+    Raises:
+        ValueError: 格式无效
+    """
+    if not window or not window.strip():
+        return None
+    start, separator, end = window.partition("-")
+    if not separator:
+        raise ValueError(f"维护窗口格式无效，应为 HH:MM-HH:MM: {window}")
+    return dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())
+
+
+def current_window(now: datetime, window: Tuple[dtime, dtime]) -> Optional[Tuple[datetime, datetime]]:
+    """返回包含 now 的维护窗口 (开始, 结束)，不在窗口内时返回None"""
+    start_time, end_time = window
+    duration = (datetime.combine(date.min, end_time) - datetime.combine(date.min, start_time)) % timedelta(days=1)
+    duration = duration or timedelta(days=1)
+    for day in (now.date(), now.date() - timedelta(days=1)):
+        start = datetime.combine(day, start_time)
+        if start <= now < start + duration:
+            return start, start + duration
+    return None
+
+
+try:
+    _schedule_window = parse_window(BACKUP_SCHEDULE_WINDOW)
+except ValueError as e:
+    logger.error(f"{str(e)}，不会自动创建批量备份任务")
+    _schedule_window = None
+
+
+def create_backup_run(
+    db: Session,
+    filters: Optional[Dict[str, List[Any]]] = None,
+    created_by: Optional[str] = None,
+    trigger: str = "manual",
+    deadline: Optional[datetime] = None,
+    schedule_key: Optional[str] = None
+) -> ConfigBackupRun:
+    """创建批量备份任务，由后台线程执行
+
+    Args:
+        db: 数据库会话
+        filters: 设备筛选条件，键为 FILTER_COLUMNS 中的字段，多个条件同时满足；为空时备份全部设备
+        created_by: 创建任务的用户
+        trigger: 触发方式，schedule 或 manual
+        deadline: 截止时间，之后不再开始新的设备
+        schedule_key: 自动任务所属的维护窗口
+
+    Returns:
+        新建的任务
+    """
+    filters = {name: values for name, values in (filters or {}).items() if values}
+    unknown = set(filters) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"不支持的筛选条件: {', '.join(sorted(unknown))}")
+    run = ConfigBackupRun(
+        trigger=trigger,
+        schedule_key=schedule_key,
+        filters=json.dumps(filters, ensure_ascii=False) if filters else None,
+        status="pending",
+        deadline=deadline,
+        created_by=created_by
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    _wake_event.set()
+    logger.info(f"创建批量备份任务成功，ID: {run.id}, 触发方式: {trigger}, 筛选条件: {run.filters or '全部设备'}")
+    return run
+
+
+def backup_run_summary(run: ConfigBackupRun) -> Dict[str, Any]:
+    """批量备份任务的进度和汇总"""
+    processed = run.changed_count + run.unchanged_count + run.failed_count + run.skipped_count
+    return {
+        "id": run.id,
+        "trigger": run.trigger,
+        "filters": json.loads(run.filters) if run.filters else {},
+        "status": run.status,
+        "total": run.total_devices,
+        "processed": processed,
+        "progress": 100.0 if run.status == "completed" else (
+            round(processed * 100 / run.total_devices, 1) if run.total_devices else 0.0
+        ),
+        "changed": run.changed_count,
+        "unchanged": run.unchanged_count,
+        "not_pulled": run.not_pulled_count or 0,
+        "failed": run.failed_count,
+        "skipped": run.skipped_count,
+        "error_message": run.error_message,
+        "deadline": run.deadline,
+        "created_by": run.created_by,
+        "created_at": run.created_at,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at
+    }
+
+
+def backup_device(device: Dict[str, Any], taken_by: Optional[str] = None,
+                  description: Optional[str] = None) -> Tuple[str, Optional[int], bool]:
+    """从设备获取配置并备份，配置没有变化时不创建备份记录
+
+    拉取完整配置前先读取变化指示值，与上次拉取时相同则直接返回 unchanged
+
+    Args:
+        device: 设备连接信息，包含 id、management_ip、vendor、username、password 等
+        taken_by: 记录在备份中的操作人
+        description: 备份描述
+
+    Returns:
+        (结果, 新备份ID, 是否拉取了完整配置)，结果为 "changed" 或 "unchanged"
+
+    Raises:
+        连接设备或保存备份失败时抛出异常
+    """
+    db = SessionLocal()
+    try:
+        # SNMP指示值不需要登录设备
+        indicator = read_snmp_indicator(device)
+        if is_config_unchanged(db, device["id"], indicator):
+            return "unchanged", None, False
+
+        adapter = AdapterManager.get_adapter(device)
+        try:
+            if not adapter.connect():
+                raise ConnectionError("连接设备失败")
+            if indicator is None:
+                indicator = read_cli_indicator(adapter)
+                if is_config_unchanged(db, device["id"], indicator):
+                    return "unchanged", None, False
+            config = adapter.get_config()
+        finally:
+            adapter.disconnect()
+        if not config:
+            raise ValueError("从设备获取的配置为空")
+
+        status, config_id = "changed", None
+        latest = get_latest_config_backup(db, device["id"])
+        if latest is not None:
+            if latest.hash == config_content_hash(config):
+                status = "unchanged"
+            else:
+                # 只有时间戳等易变行不同时也视为没有变化
+                previous = get_config_file_content(db, latest)
+                if previous is not None and same_significant_content(previous, config):
+                    status = "unchanged"
+        if status == "changed":
+            backup = create_config_backup(db, ConfigCreate(
+                device_id=device["id"], config=config, taken_by=taken_by, description=description
+            ))
+            config_id, latest = backup.id, backup
+        record_config_pull(db, device["id"], indicator, latest.hash)
+        return status, config_id, True
+    finally:
+        db.close()
+
+
+def _target_devices(db: Session, filters: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """按筛选条件查询需要备份的设备及其连接信息"""
+    query = select(
+        Device.id, Device.name, Device.management_ip, Device.vendor, Device.username,
+        Device.password, Device.enable_password, Device.port, Device.location
+    )
+    for name, values in filters.items():
+        query = query.where(FILTER_COLUMNS[name].in_(values))
+    return [dict(row._mapping) for row in db.execute(query.order_by(Device.id))]
+
+
+def _claim_next_run(db: Session) -> Optional[int]:
+    """认领一个待执行或已失去心跳的任务，方式与设备导入任务相同"""
+    stale_before = datetime.now() - timedelta(seconds=BACKUP_RUN_STALE_SECONDS)
+    claimable = or_(
+        ConfigBackupRun.status == "pending",
+        and_(ConfigBackupRun.status == "running", ConfigBackupRun.heartbeat_at < stale_before)
+    )
+    candidates = db.execute(
+        select(ConfigBackupRun.id, ConfigBackupRun.status)
+        .where(claimable)
+        .order_by(ConfigBackupRun.id)
+        .limit(10)
+    ).all()
+    for run_id, run_status in candidates:
+        now = datetime.now()
+        claimed = db.execute(
+            update(ConfigBackupRun)
+            .where(ConfigBackupRun.id == run_id, claimable)
+            .values(
+                status="running",
+                heartbeat_at=now,
+                started_at=ConfigBackupRun.started_at if run_status == "running" else now
+            )
+        ).rowcount
+        db.commit()
+        if claimed:
+            if run_status == "running":
+                logger.warning(f"接管失去心跳的批量备份任务，ID: {run_id}")
+            return run_id
+    return None
+
+
+def _ensure_scheduled_run(db: Session) -> None:
+    """处于维护窗口内且本窗口尚未创建任务时，创建备份全部设备的任务"""
+    if _schedule_window is None:
+        return
+    window = current_window(datetime.now(), _schedule_window)
+    if window is None:
+        return
+    schedule_key = window[0].strftime("%Y-%m-%dT%H:%M")
+    if db.execute(select(ConfigBackupRun.id).where(ConfigBackupRun.schedule_key == schedule_key)).first():
+        return
+    try:
+        create_backup_run(db, trigger="schedule", deadline=window[1], schedule_key=schedule_key)
+    except IntegrityError:
+        # 其他进程已为该窗口创建了任务
+        db.rollback()
+
+
+class _DeviceAttempt:
+    """一台设备在本次任务中的执行状态"""
+    __slots__ = ("device", "attempts", "elapsed_ms", "error")
+
+    def __init__(self, device: Dict[str, Any]):
+        self.device = device
+        self.attempts = 0
+        self.elapsed_ms = 0
+        self.error: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.device["vendor"] or "").lower(), self.device["location"] or ""
+
+
+def _attempt(state: _DeviceAttempt, taken_by: str, description: str) -> Tuple[str, Optional[int], bool]:
+    started = time.monotonic()
+    try:
+        return backup_device(state.device, taken_by, description)
+    finally:
+        state.elapsed_ms += int((time.monotonic() - started) * 1000)
+
+
+class _RunExecutor:
+    """执行一个批量备份任务：按厂商和位置限制并发派发设备，处理重试，定期提交结果"""
+
+    def __init__(self, db: Session, run: ConfigBackupRun, devices: List[Dict[str, Any]]):
+        self.db = db
+        self.run = run
+        self.taken_by = run.created_by or "scheduler"
+        self.description = f"批量备份任务 #{run.id}"
+        self.queues: Dict[Tuple[str, str], Deque[_DeviceAttempt]] = {}
+        self.retries: List[Tuple[float, int, _DeviceAttempt]] = []
+        self.sequence = itertools.count()
+        self.running: Dict[Any, _DeviceAttempt] = {}
+        self.vendor_load: Counter = Counter()
+        self.site_load: Counter = Counter()
+        self.results: List[Dict[str, Any]] = []
+        self.last_checkpoint = time.monotonic()
+        for device in devices:
+            state = _DeviceAttempt(device)
+            if not AdapterManager.is_vendor_supported(device["vendor"] or ""):
+                state.error = f"不支持的设备厂商: {device['vendor']}"
+                self._finish(state, "failed")
+                continue
+            self.queues.setdefault(state.key, deque()).append(state)
+
+    def _finish(self, state: _DeviceAttempt, status: str, config_id: Optional[int] = None,
+                pulled: Optional[bool] = None) -> None:
+        self.results.append({
+            "run_id": self.run.id,
+            "device_id": state.device["id"],
+            "status": status,
+            "attempts": state.attempts,
+            "pulled": pulled,
+            "config_id": config_id,
+            "error": state.error[:_MAX_ERROR_LENGTH] if state.error else None,
+            "duration_ms": state.elapsed_ms,
+            "finished_at": datetime.now()
+        })
+
+    def _dispatch(self, executor: ThreadPoolExecutor) -> None:
+        """把到达重试时间的设备放回队首，再派发有空闲额度的设备"""
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            _, _, state = heapq.heappop(self.retries)
+            self.queues.setdefault(state.key, deque()).appendleft(state)
+
+        for key in list(self.queues):
+            vendor, site = key
+            queue = self.queues[key]
+            while (
+                queue
+                and len(self.running) < BACKUP_RUN_WORKERS
+                and self.vendor_load[vendor] < BACKUP_RUN_VENDOR_CONCURRENCY
+                and self.site_load[site] < BACKUP_RUN_SITE_CONCURRENCY
+            ):
+                state = queue.popleft()
+                state.attempts += 1
+                future = executor.submit(_attempt, state, self.taken_by, self.description)
+                self.running[future] = state
+                self.vendor_load[vendor] += 1
+                self.site_load[site] += 1
+            if not queue:
+                del self.queues[key]
+
+    def _collect(self, done) -> None:
+        for future in done:
+            state = self.running.pop(future)
+            vendor, site = state.key
+            self.vendor_load[vendor] -= 1
+            self.site_load[site] -= 1
+            try:
+                status, config_id, pulled = future.result()
+            except Exception as e:
+                state.error = str(e) or e.__class__.__name__
+                if state.attempts < BACKUP_RUN_RETRY_ATTEMPTS:
+                    delay = BACKUP_RUN_RETRY_DELAY * 2 ** (state.attempts - 1)
+                    heapq.heappush(self.retries, (time.monotonic() + delay, next(self.sequence), state))
+                    logger.warning(
+                        f"备份设备配置失败，{delay:g} 秒后重试，设备ID: {state.device['id']}, "
+                        f"第 {state.attempts} 次, 错误: {state.error}"
+                    )
+                else:
+                    logger.error(f"备份设备配置失败，设备ID: {state.device['id']}, 已尝试 {state.attempts} 次, 错误: {state.error}")
+                    self._finish(state, "failed")
+                continue
+            self._finish(state, status, config_id, pulled)
+
+    def _skip_remaining(self) -> None:
+        """维护窗口结束：尚未开始的设备记为跳过，等待重试的设备记为失败"""
+        for queue in self.queues.values():
+            for state in queue:
+                self._finish(state, "failed" if state.error else "skipped")
+        for _, _, state in self.retries:
+            self._finish(state, "failed")
+        self.queues.clear()
+        self.retries.clear()
+
+    def checkpoint(self, force: bool = False) -> None:
+        """写入已完成设备的结果，更新计数和心跳后提交"""
+        if not force and len(self.results) < _CHECKPOINT_ROWS and time.monotonic() - self.last_checkpoint < _CHECKPOINT_SECONDS:
+            return
+        if self.results:
+            self.db.execute(ConfigBackupRunResult.__table__.insert(), self.results)
+            counts = Counter(result["status"] for result in self.results)
+            self.run.changed_count += counts["changed"]
+            self.run.unchanged_count += counts["unchanged"]
+            self.run.not_pulled_count = (self.run.not_pulled_count or 0) + sum(
+                1 for result in self.results if result["pulled"] is False
+            )
+            self.run.failed_count += counts["failed"]
+            self.run.skipped_count += counts["skipped"]
+            self.results = []
+        self.run.heartbeat_at = datetime.now()
+        self.db.commit()
+        self.last_checkpoint = time.monotonic()
+
+    def execute(self) -> bool:
+        """执行任务
+
+        Returns:
+            全部设备处理完成返回True，服务停止导致任务暂停返回False
+        """
+        with ThreadPoolExecutor(max_workers=BACKUP_RUN_WORKERS, thread_name_prefix="config-backup") as executor:
+            while self.queues or self.retries or self.running:
+                stopping = _stop_event.is_set()
+                if not stopping:
+                    if self.run.deadline and datetime.now() >= self.run.deadline:
+                        logger.warning(f"维护窗口已结束，批量备份任务不再开始新的设备，ID: {self.run.id}")
+                        self._skip_remaining()
+                    self._dispatch(executor)
+                elif not self.running:
+                    break
+
+                timeout = _CHECKPOINT_SECONDS
+                if self.retries and not stopping:
+                    timeout = min(timeout, max(0.0, self.retries[0][0] - time.monotonic()))
+                if self.running:
+                    done, _ = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                elif self.retries:
+                    _stop_event.wait(timeout)
+                self.checkpoint()
+        self.checkpoint(force=True)
+        return not (self.queues or self.retries)
+
+
+def run_backup_run(run_id: int) -> None:
+    """执行一个已认领的批量备份任务，跳过本任务中已有结果的设备"""
+    db = SessionLocal()
+    try:
+        run = db.get(ConfigBackupRun, run_id)
+        if run is None:
+            return
+        try:
+            filters = json.loads(run.filters) if run.filters else {}
+            finished = set(db.execute(
+                select(ConfigBackupRunResult.device_id).where(ConfigBackupRunResult.run_id == run_id)
+            ).scalars())
+            devices = [device for device in _target_devices(db, filters) if device["id"] not in finished]
+            run.total_devices = len(finished) + len(devices)
+            db.commit()
+            logger.info(f"开始执行批量备份任务，ID: {run_id}, 待备份设备数: {len(devices)}, 已完成: {len(finished)}")
+
+            completed = _RunExecutor(db, run, devices).execute()
+        except Exception as e:
+            db.rollback()
+            run = db.get(ConfigBackupRun, run_id)
+            run.status = "failed"
+            run.error_message = str(e)[:_MAX_ERROR_LENGTH]
+            run.finished_at = datetime.now()
+            db.commit()
+            logger.error(f"批量备份任务失败，ID: {run_id}, 错误: {str(e)}")
+            return
+
+        if not completed:
+            # 服务停止时交还任务，下次启动后继续备份剩余的设备
+            run.status = "pending"
+            db.commit()
+            logger.info(f"批量备份任务暂停，ID: {run_id}")
+            return
+        run.status = "completed"
+        run.finished_at = datetime.now()
+        db.commit()
+        logger.info(
+            f"批量备份任务完成，ID: {run_id}, 设备数: {run.total_devices}, 有变化: {run.changed_count}, "
+            f"无变化: {run.unchanged_count}, 失败: {run.failed_count}, 跳过: {run.skipped_count}"
+        )
+    finally:
+        db.close()
+
+
+def _worker_loop(interval: int) -> None:
+    while not _stop_event.is_set():
+        try:
+            db = SessionLocal()
+            try:
+                _ensure_scheduled_run(db)
+                run_id = _claim_next_run(db)
+            finally:
+                db.close()
+            if run_id is not None:
+                run_backup_run(run_id)
+                continue
+        except Exception as e:
+            logger.error(f"批量备份线程出错: {str(e)}")
+        _wake_event.wait(interval)
+        _wake_event.clear()
+
+
+def start_backup_worker(interval: int = BACKUP_RUN_POLL_INTERVAL) -> None:
+    """启动后台批量备份线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, args=(interval,), name="config-backup-runs", daemon=True)
+    _worker_thread.start()
+    logger.info(f"批量备份线程已启动，维护窗口: {BACKUP_SCHEDULE_WINDOW or '未配置'}")
+
+
+def stop_backup_worker() -> None:
+    """停止后台批量备份线程，正在执行的任务在下一次启动后继续备份剩余的设备"""
+    _stop_event.set()
+    _wake_event.set()
@@ -0,0 +1,253 @@
+"""
+配置备份存储后端模块
+备份内容文件通过 StorageBackend 读写，键是相对路径（如 blobs/ab/ab12....zst），不同后端决定键保存在哪里：
+
+- LocalStorage：保存在 CONFIG_BACKUP_DIR 下，写入先写临时文件再重命名；
+- S3Storage：保存在S3兼容的对象存储（AWS S3、MinIO、Ceph RGW 等）的 CONFIG_BACKUP_S3_BUCKET 中，
+  需要安装 boto3。
+
+由 CONFIG_BACKUP_STORAGE 选择后端，backup_storage 为当前使用的后端。下载时还原的文件等本地缓存
+不经过后端，始终保存在本地的 CONFIG_BACKUP_DIR 下。
+"""
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, Optional
+
+from app.services.config import (
+    CONFIG_BACKUP_DIR,
+    CONFIG_BACKUP_S3_ACCESS_KEY,
+    CONFIG_BACKUP_S3_BUCKET,
+    CONFIG_BACKUP_S3_ENDPOINT,
+    CONFIG_BACKUP_S3_PREFIX,
+    CONFIG_BACKUP_S3_REGION,
+    CONFIG_BACKUP_S3_SECRET_KEY,
+    CONFIG_BACKUP_STORAGE
+)
+
+try:
+    import boto3
+except ImportError:  # boto3 为可选依赖，只有使用S3后端时需要
+    boto3 = None
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """备份内容存储后端基类，键为使用 / 分隔的相对路径"""
+
+    @abstractmethod
+    def write(self, key: str, data: bytes) -> None:
+        """写入内容，读取方不会看到写了一半的内容"""
+        pass
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[bytes]:
+        """读取内容，不存在时返回None"""
+        pass
+
+    @abstractmethod
+    def read_into(self, key: str, target: BinaryIO) -> bool:
+        """把内容分块写入 target，不整体读入内存；不存在时返回False"""
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除内容，不存在时忽略"""
+        pass
+
+    @abstractmethod
+    def rename(self, key: str, new_key: str) -> None:
+        pass
+
+    @abstractmethod
+    def iter_keys(self, prefix: str = "") -> Iterator[str]:
+        """列出以 prefix 开头的全部键"""
+        pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        """内容在本地文件系统中的路径，可以直接以文件方式发送；不在本地的后端返回None"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """保存在本地目录中"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self.local_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.local_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_into(self, key: str, target: BinaryIO) -> bool:
+        try:
+            with open(self.local_path(key), "rb") as f:
+                shutil.copyfileobj(f, target)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def rename(self, key: str, new_key: str) -> None:
+        new_path = self.local_path(new_key)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(self.local_path(key), new_path)
+
+    def iter_keys(self, prefix: str = "") -> Iterator[str]:
+        # 从 prefix 所在的目录开始遍历，避免扫描整个根目录
+        start = os.path.dirname(self.local_path(prefix)) if prefix else self.root
+        for directory, _, names in os.walk(start):
+            relative = os.path.relpath(directory, self.root)
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                key = name if relative == "." else "/".join(relative.split(os.sep) + [name])
+                if key.startswith(prefix):
+                    yield key
+
+
+class S3Storage(StorageBackend):
+    """保存在S3兼容的对象存储中，键加上 prefix 作为对象名
+
+    对象的写入是原子的，读取方不会看到写了一半的对象；对象存储没有重命名，rename 为复制后删除
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("使用S3存储配置备份需要安装 boto3")
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url or None,
+                region_name=region or None,
+                aws_access_key_id=access_key or None,
+                aws_secret_access_key=secret_key or None
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def _name(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _not_found(error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def write(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._name(key), Body=data)
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._name(key))["Body"].read()
+        except Exception as e:
+            if self._not_found(e):
+                return None
+            raise
+
+    def read_into(self, key: str, target: BinaryIO) -> bool:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self._name(key))["Body"]
+        except Exception as e:
+            if self._not_found(e):
+                return False
+            raise
+        try:
+            for chunk in iter(lambda: body.read(64 * 1024), b""):
+                target.write(chunk)
+        finally:
+            body.close()
+        return True
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._name(key))
+            return True
+        except Exception as e:
+            if self._not_found(e):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        # 删除不存在的对象不会报错
+        self.client.delete_object(Bucket=self.bucket, Key=self._name(key))
+
+    def rename(self, key: str, new_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._name(new_key),
+            CopySource={"Bucket": self.bucket, "Key": self._name(key)}
+        )
+        self.delete(key)
+
+    def iter_keys(self, prefix: str = "") -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._name(prefix)):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):]
+
+
+def create_storage(kind: str = CONFIG_BACKUP_STORAGE) -> StorageBackend:
+    """按配置创建存储后端
+
+    Args:
+        kind: local 或 s3
+    """
+    if kind == "local":
+        return LocalStorage(CONFIG_BACKUP_DIR)
+    if kind == "s3":
+        if not CONFIG_BACKUP_S3_BUCKET:
+            raise ValueError("使用S3存储配置备份需要设置 CONFIG_BACKUP_S3_BUCKET")
+        return S3Storage(
+            CONFIG_BACKUP_S3_BUCKET,
+            prefix=CONFIG_BACKUP_S3_PREFIX,
+            endpoint_url=CONFIG_BACKUP_S3_ENDPOINT,
+            region=CONFIG_BACKUP_S3_REGION,
+            access_key=CONFIG_BACKUP_S3_ACCESS_KEY,
+            secret_key=CONFIG_BACKUP_S3_SECRET_KEY
+        )
+    raise ValueError(f"不支持的配置备份存储后端: {kind}")
+
+
+# 当前使用的存储后端
+backup_storage = create_storage()
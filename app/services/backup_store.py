@@ -0,0 +1,606 @@
+"""
+配置备份内容存储模块
+配置内容按SHA-256寻址，以 blobs/{哈希前两位}/{哈希}.{扩展名} 为键保存在存储后端（见 backup_storage 模块）中，
+相同内容只保存一份，config_blobs 表记录每份内容被多少个备份引用。
+
+创建备份时先对已有内容的引用计数加一，更新到记录即说明内容已保存，不再写文件；
+删除备份时引用计数减一，减到零时删除记录和文件。引用计数的变更与备份记录在同一事务中提交。
+
+保存格式（CONFIG_BACKUP_CODEC=zstd 时）：
+- 完整版本：使用由已有配置训练的zstd字典压缩（尚未训练字典时为普通zstd帧，可直接发送给支持zstd的客户端）；
+- 差量版本：以同一设备上一版本的内容作为zstd原始内容字典压缩，只保存变化的部分。
+  差量链每 CONFIG_BACKUP_KEYFRAME_INTERVAL 个版本保存一次完整版本，读取时最多解压这么多层；
+  差量比完整版本更大时（如配置大幅变化）保存完整版本。
+被差量引用的基准内容计入引用计数，删除备份不会删除仍被依赖的基准。
+
+下载时以文件方式发送（见 blob_file）：客户端接受的压缩帧直接发送保存的文件；使用字典、差量保存，
+或客户端不接受其压缩格式的内容还原到本地的 CONFIG_BACKUP_DIR/materialized 中，之后的下载直接发送该文件；
+后端不在本地（如S3）时，压缩文件也先下载到该目录。还原的文件按最近使用时间淘汰，
+总大小不超过 CONFIG_BACKUP_MATERIALIZED_BYTES。
+"""
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.services.config import (
+    COMPRESSION_MIN_SIZE,
+    CONFIG_BACKUP_CACHE_BYTES,
+    CONFIG_BACKUP_CODEC,
+    CONFIG_BACKUP_DELTA,
+    CONFIG_BACKUP_DICT_SAMPLES,
+    CONFIG_BACKUP_DICT_SIZE,
+    CONFIG_BACKUP_DIR,
+    CONFIG_BACKUP_KEYFRAME_INTERVAL,
+    CONFIG_BACKUP_MATERIALIZED_BYTES,
+    CONFIG_BACKUP_ZSTD_LEVEL
+)
+from app.services.backup_storage import backup_storage
+from app.services.models import Config, ConfigBlob, ConfigDictionary
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，未安装时使用gzip保存
+    zstandard = None
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 内容文件的键前缀
+BLOB_PREFIX = "blobs/"
+
+# 下载时还原的内容文件的本地目录
+MATERIALIZED_DIR = os.path.join(CONFIG_BACKUP_DIR, "materialized")
+
+# 确保本地目录存在
+os.makedirs(MATERIALIZED_DIR, exist_ok=True)
+
+# 压缩算法对应的文件扩展名
+_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# 等待删除的内容文件的扩展名
+_DELETING_SUFFIX = ".deleting"
+
+# 重新检查是否有新训练的字典的间隔（秒）
+_DICTIONARY_CHECK_INTERVAL = 60
+
+# 淘汰还原文件时降到上限的比例，避免每次还原都扫描目录
+_MATERIALIZED_LOW_WATER = 0.8
+
+# 最近该时间（秒）内使用过的还原文件不淘汰，可能正在发送
+_MATERIALIZED_MIN_AGE = 60
+
+_dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+_latest_dictionary: Tuple[Optional[int], float] = (None, 0.0)
+_dictionary_lock = threading.Lock()
+
+# 还原文件的总字节数，进程启动后第一次还原时扫描目录得到
+_materialized_size: Optional[int] = None
+_materialized_lock = threading.Lock()
+
+
+class _ContentCache:
+    """按总字节数限制的LRU缓存，保存已还原的内容，连续读取同一差量链时不再逐层解压"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            data = self._items.pop(key, None)
+            if data is not None:
+                self._size -= len(data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+content_cache = _ContentCache(CONFIG_BACKUP_CACHE_BYTES)
+
+
+def blob_key(content_hash: str, encoding: Optional[str] = None) -> str:
+    """内容文件的键，按哈希前两位分目录，避免单个目录中文件过多"""
+    return f"{BLOB_PREFIX}{content_hash[:2]}/{content_hash}{_SUFFIXES[encoding]}"
+
+
+def materialized_path(name: str) -> str:
+    """本地还原文件的路径，name 为内容哈希，下载的压缩文件带扩展名"""
+    return os.path.join(MATERIALIZED_DIR, name[:2], name)
+
+
+def _write_file(path: str, data: bytes) -> None:
+    """先写入临时文件再重命名，读取方不会看到写了一半的文件"""
+    _write_stream(path, lambda f: f.write(data))
+
+
+def _write_stream(path: str, writer: Callable[[BinaryIO], None]) -> None:
+    """由 writer 写入临时文件后重命名为 path"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_stored(key: str) -> Optional[bytes]:
+    data = backup_storage.read(key)
+    if data is None:
+        logger.warning(f"配置内容文件不存在，键: {key}")
+    return data
+
+
+def _get_dictionary(db: Session, dict_id: int) -> "zstandard.ZstdCompressionDict":
+    """加载zstd字典（进程内缓存）"""
+    dictionary = _dictionaries.get(dict_id)
+    if dictionary is None:
+        data = db.execute(select(ConfigDictionary.data).where(ConfigDictionary.id == dict_id)).scalar_one()
+        dictionary = zstandard.ZstdCompressionDict(data)
+        with _dictionary_lock:
+            _dictionaries[dict_id] = dictionary
+    return dictionary
+
+
+def _current_dictionary_id(db: Session) -> Optional[int]:
+    """新的完整版本使用的字典，即最近训练的字典"""
+    global _latest_dictionary
+    dict_id, checked_at = _latest_dictionary
+    if time.monotonic() - checked_at > _DICTIONARY_CHECK_INTERVAL:
+        dict_id = db.execute(select(func.max(ConfigDictionary.id))).scalar()
+        with _dictionary_lock:
+            _latest_dictionary = (dict_id, time.monotonic())
+    return dict_id
+
+
+def _zstd_compress(data: bytes, dictionary=None) -> bytes:
+    return zstandard.ZstdCompressor(level=CONFIG_BACKUP_ZSTD_LEVEL, dict_data=dictionary).compress(data)
+
+
+def _encode(db: Session, data: bytes, base_hash: Optional[str]) -> Dict:
+    """按配置的格式编码内容
+
+    Returns:
+        config_blobs 记录的字段，以及保存的字节（stored）
+    """
+    codec = CONFIG_BACKUP_CODEC
+    if codec == "zstd" and zstandard is None:
+        codec = "gzip"
+    if codec == "none" or (codec == "gzip" and len(data) < COMPRESSION_MIN_SIZE):
+        return {"stored": data, "encoding": None, "dict_id": None, "base_hash": None, "chain_depth": 0}
+    if codec == "gzip":
+        return {
+            "stored": gzip.compress(data, compresslevel=9, mtime=0),
+            "encoding": "gzip", "dict_id": None, "base_hash": None, "chain_depth": 0
+        }
+
+    dict_id = _current_dictionary_id(db)
+    best = {
+        "stored": _zstd_compress(data, _get_dictionary(db, dict_id) if dict_id else None),
+        "encoding": "zstd", "dict_id": dict_id, "base_hash": None, "chain_depth": 0
+    }
+    if CONFIG_BACKUP_DELTA and base_hash:
+        base_depth = db.execute(select(ConfigBlob.chain_depth).where(ConfigBlob.hash == base_hash)).scalar()
+        if base_depth is not None and base_depth + 1 < CONFIG_BACKUP_KEYFRAME_INTERVAL:
+            base_data = read_content(db, base_hash)
+            if base_data:
+                base_dictionary = zstandard.ZstdCompressionDict(base_data, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+                delta = _zstd_compress(data, base_dictionary)
+                if len(delta) < len(best["stored"]):
+                    best = {
+                        "stored": delta, "encoding": "zstd", "dict_id": None,
+                        "base_hash": base_hash, "chain_depth": base_depth + 1
+                    }
+    return best
+
+
+def _decode(db: Session, stored: bytes, encoding: Optional[str], dict_id: Optional[int],
+            base_data: Optional[bytes]) -> bytes:
+    """还原一份保存的内容，差量版本需要传入基准内容"""
+    if encoding is None:
+        return stored
+    if encoding == "gzip":
+        return gzip.decompress(stored)
+    if base_data is not None:
+        dictionary = zstandard.ZstdCompressionDict(base_data, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    elif dict_id is not None:
+        dictionary = _get_dictionary(db, dict_id)
+    else:
+        dictionary = None
+    return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(stored)
+
+
+def _add_reference(db: Session, content_hash: str) -> bool:
+    """已有内容的引用计数加一，内容不存在时返回False"""
+    return db.execute(
+        update(ConfigBlob)
+        .where(ConfigBlob.hash == content_hash)
+        .values(ref_count=ConfigBlob.ref_count + 1)
+    ).rowcount > 0
+
+
+def store_blob(db: Session, content_hash: str, data: bytes, base_hash: Optional[str] = None) -> bool:
+    """保存配置内容并增加一次引用，在调用方的事务中执行，由调用方提交
+
+    Args:
+        db: 数据库会话
+        content_hash: 内容的SHA-256
+        data: 原始内容
+        base_hash: 同一设备上一版本的内容哈希，用作差量的基准
+
+    Returns:
+        写入了新文件返回True，内容已存在（只增加引用计数）返回False
+    """
+    if _add_reference(db, content_hash):
+        return False
+
+    encoded = _encode(db, data, base_hash)
+    # 先引用基准再写入差量：基准在编码期间被删除时改为保存完整版本
+    if encoded["base_hash"] and not _add_reference(db, encoded["base_hash"]):
+        encoded = _encode(db, data, None)
+    stored = encoded.pop("stored")
+
+    # 先插入记录再写文件：同时保存相同内容的请求（如并行备份配置相同的设备）各自的编码基准不同，
+    # 只有插入成功的一方写文件，文件内容始终与记录的 base_hash、dict_id 一致
+    try:
+        with db.begin_nested():
+            db.execute(insert(ConfigBlob).values(
+                hash=content_hash,
+                size=len(data),
+                stored_size=len(stored),
+                ref_count=1,
+                **encoded
+            ))
+    except IntegrityError:
+        # 其他请求同时保存了相同的内容，改为引用其内容，撤销对基准的引用
+        if not _add_reference(db, content_hash):
+            raise
+        if encoded["base_hash"]:
+            db.execute(
+                update(ConfigBlob)
+                .where(ConfigBlob.hash == encoded["base_hash"])
+                .values(ref_count=ConfigBlob.ref_count - 1)
+            )
+        return False
+    # 文件在提交前写入；事务回滚时留下的文件没有记录引用，下次保存相同内容时会被覆盖
+    backup_storage.write(blob_key(content_hash, encoded["encoding"]), stored)
+    content_cache.put(content_hash, data)
+    logger.info(
+        f"保存配置内容成功，哈希: {content_hash}, 大小: {len(data)} 字节, 占用: {len(stored)} 字节"
+        + (f", 差量层数: {encoded['chain_depth']}" if encoded["base_hash"] else "")
+    )
+    return True
+
+
+def discard_unstored_blob(db: Session, content_hash: str) -> None:
+    """事务回滚后删除 store_blob 写入、但记录未提交的内容文件；其他请求已保存相同内容时保留"""
+    if db.get(ConfigBlob, content_hash) is not None:
+        return
+    for encoding in _SUFFIXES:
+        backup_storage.delete(blob_key(content_hash, encoding))
+
+
+def release_blob(db: Session, content_hash: str) -> List[str]:
+    """减少一次引用，在调用方的事务中执行
+
+    引用计数减到零时删除记录，并把内容文件改名为待删除状态，差量版本同时释放对基准的引用：
+    调用方提交后调用 discard_released() 删除文件，回滚后调用 restore_released() 恢复文件。
+    文件在提交前改名，提交后同时保存相同内容的请求会写入新文件，不会被这里删除
+
+    Returns:
+        待删除文件的键列表
+    """
+    released = []
+    while content_hash:
+        db.execute(
+            update(ConfigBlob)
+            .where(ConfigBlob.hash == content_hash)
+            .values(ref_count=ConfigBlob.ref_count - 1)
+        )
+        blob = db.execute(
+            select(ConfigBlob.ref_count, ConfigBlob.encoding, ConfigBlob.base_hash)
+            .where(ConfigBlob.hash == content_hash)
+        ).first()
+        if blob is None or blob.ref_count > 0:
+            break
+
+        key = blob_key(content_hash, blob.encoding)
+        db.execute(delete(ConfigBlob).where(ConfigBlob.hash == content_hash))
+        content_cache.discard(content_hash)
+        # 还原文件只是缓存，事务回滚后下载时会重新还原
+        _discard_materialized(content_hash)
+        _discard_materialized(content_hash + _SUFFIXES[blob.encoding])
+        if backup_storage.exists(key):
+            backup_storage.rename(key, key + _DELETING_SUFFIX)
+            released.append(key + _DELETING_SUFFIX)
+        else:
+            logger.warning(f"配置内容文件不存在，键: {key}")
+        content_hash = blob.base_hash
+    return released
+
+
+def discard_released(released: List[str]) -> None:
+    """事务提交后删除不再被引用的内容文件"""
+    for key in released:
+        try:
+            backup_storage.delete(key)
+            logger.info(f"删除配置内容文件成功，键: {key[:-len(_DELETING_SUFFIX)]}")
+        except Exception as e:
+            logger.error(f"删除配置内容文件失败，键: {key}, 错误: {str(e)}")
+
+
+def restore_released(released: List[str]) -> None:
+    """事务回滚后恢复被标记为待删除的内容文件"""
+    for key in released:
+        backup_storage.rename(key, key[:-len(_DELETING_SUFFIX)])
+
+
+def read_content(db: Session, content_hash: str) -> Optional[bytes]:
+    """读取并还原配置内容
+
+    差量版本沿基准链向前查找，直到完整版本或已缓存的版本，再逐层还原
+
+    Returns:
+        原始内容，内容不存在时返回None
+    """
+    chain = []
+    data = None
+    current = content_hash
+    while current:
+        data = content_cache.get(current)
+        if data is not None:
+            break
+        blob = db.execute(
+            select(ConfigBlob.encoding, ConfigBlob.dict_id, ConfigBlob.base_hash)
+            .where(ConfigBlob.hash == current)
+        ).first()
+        if blob is None:
+            logger.warning(f"配置内容不存在，哈希: {current}")
+            return None
+        chain.append((current, blob))
+        current = blob.base_hash
+
+    for blob_hash, blob in reversed(chain):
+        stored = _read_stored(blob_key(blob_hash, blob.encoding))
+        if stored is None:
+            return None
+        data = _decode(db, stored, blob.encoding, blob.dict_id, data if blob.base_hash else None)
+        content_cache.put(blob_hash, data)
+    return data
+
+
+def _materialized_files() -> List[Tuple[float, int, str]]:
+    """全部还原文件的 (最近使用时间, 大小, 路径)"""
+    files = []
+    for directory, _, names in os.walk(MATERIALIZED_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _discard_materialized(name: str) -> None:
+    global _materialized_size
+    path = materialized_path(name)
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return
+    with _materialized_lock:
+        if _materialized_size is not None:
+            _materialized_size -= size
+
+
+def _account_materialized(size: int) -> None:
+    """记录新还原的文件，总大小超过上限时按最近使用时间淘汰到上限的80%"""
+    global _materialized_size
+    with _materialized_lock:
+        if _materialized_size is None:
+            _materialized_size = sum(item[1] for item in _materialized_files())
+        else:
+            _materialized_size += size
+        if _materialized_size <= CONFIG_BACKUP_MATERIALIZED_BYTES:
+            return
+        files = sorted(_materialized_files())
+        _materialized_size = sum(item[1] for item in files)
+        keep_after = time.time() - _MATERIALIZED_MIN_AGE
+        for mtime, file_size, path in files:
+            if _materialized_size <= CONFIG_BACKUP_MATERIALIZED_BYTES * _MATERIALIZED_LOW_WATER or mtime > keep_after:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            _materialized_size -= file_size
+
+
+def _touch(path: str) -> bool:
+    """更新还原文件的修改时间作为最近使用时间，文件不存在时返回False"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _decompress_file(source: str, encoding: str, target: BinaryIO) -> None:
+    """流式解压不依赖字典的压缩文件，不把整个文件读入内存"""
+    with open(source, "rb") as f:
+        if encoding == "gzip":
+            with gzip.GzipFile(fileobj=f) as gz:
+                shutil.copyfileobj(gz, target)
+        else:
+            zstandard.ZstdDecompressor().copy_stream(f, target)
+
+
+def local_stored_file(key: str, cache_name: str) -> Optional[str]:
+    """取得保存的文件在本地的路径，后端不在本地时下载到还原文件目录
+
+    Args:
+        key: 存储后端中的键
+        cache_name: 下载到本地时使用的文件名
+
+    Returns:
+        本地文件路径，内容不存在时返回None
+    """
+    path = backup_storage.local_path(key)
+    if path is not None:
+        if os.path.exists(path):
+            return path
+        logger.warning(f"配置内容文件不存在，路径: {path}")
+        return None
+
+    path = materialized_path(cache_name)
+    if _touch(path):
+        return path
+    found = []
+    _write_stream(path, lambda f: found.append(backup_storage.read_into(key, f)))
+    if not found[0]:
+        os.remove(path)
+        logger.warning(f"配置内容文件不存在，键: {key}")
+        return None
+    _account_materialized(os.path.getsize(path))
+    return path
+
+
+def materialize_file(content_hash: str, source: str, encoding: str) -> str:
+    """把压缩保存的文件解压为还原文件，已还原时直接返回
+
+    Returns:
+        还原文件的路径
+    """
+    path = materialized_path(content_hash)
+    if _touch(path):
+        return path
+    _write_stream(path, lambda f: _decompress_file(source, encoding, f))
+    _account_materialized(os.path.getsize(path))
+    return path
+
+
+def blob_file(db: Session, content_hash: str,
+              accept: Callable[[str], bool]) -> Optional[Tuple[str, Optional[str]]]:
+    """取得可以直接发送的内容文件
+
+    Args:
+        db: 数据库会话
+        content_hash: 内容哈希
+        accept: 判断客户端是否接受某种压缩格式，接受时直接发送保存的压缩文件
+
+    Returns:
+        (文件路径, 压缩算法)，发送还原后的内容时压缩算法为None；内容不存在时返回None
+    """
+    blob = db.execute(
+        select(ConfigBlob.encoding, ConfigBlob.dict_id, ConfigBlob.base_hash)
+        .where(ConfigBlob.hash == content_hash)
+    ).first()
+    if blob is None:
+        logger.warning(f"配置内容不存在，哈希: {content_hash}")
+        return None
+    stored_path = local_stored_file(blob_key(content_hash, blob.encoding), content_hash + _SUFFIXES[blob.encoding])
+    if stored_path is None:
+        return None
+    if blob.encoding is None:
+        return stored_path, None
+    if blob.dict_id is None and blob.base_hash is None:
+        if accept(blob.encoding):
+            return stored_path, blob.encoding
+        return materialize_file(content_hash, stored_path, blob.encoding), None
+
+    # 使用字典或差量保存的内容需要经 read_content 还原，还原一次后保存为文件
+    path = materialized_path(content_hash)
+    if _touch(path):
+        return path, None
+    data = read_content(db, content_hash)
+    if data is None:
+        return None
+    _write_file(path, data)
+    _account_materialized(len(data))
+    return path, None
+
+
+def train_dictionary(db: Session, sample_limit: int = CONFIG_BACKUP_DICT_SAMPLES,
+                     dict_size: int = CONFIG_BACKUP_DICT_SIZE) -> ConfigDictionary:
+    """以最近的备份内容训练zstd字典，之后保存的完整版本使用新字典压缩
+
+    已保存的内容仍使用原来的字典读取，因此字典只增不删
+
+    Args:
+        db: 数据库会话
+        sample_limit: 最多使用的备份数（相同内容只计一次）
+        dict_size: 字典大小（字节）
+
+    Returns:
+        新的字典记录
+
+    Raises:
+        ValueError: 未安装zstandard或样本不足以训练字典
+    """
+    global _latest_dictionary
+    if zstandard is None:
+        raise ValueError("未安装zstandard，无法训练压缩字典")
+
+    hashes = db.execute(
+        select(Config.blob_hash)
+        .where(Config.blob_hash.isnot(None))
+        .group_by(Config.blob_hash)
+        .order_by(func.max(Config.id).desc())
+        .limit(sample_limit)
+    ).scalars().all()
+    samples = [data for data in (read_content(db, content_hash) for content_hash in hashes) if data]
+    try:
+        trained = zstandard.train_dictionary(dict_size, samples)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"备份样本不足，无法训练压缩字典（{len(samples)} 个样本）: {str(e)}")
+
+    dictionary = ConfigDictionary(data=trained.as_bytes(), sample_count=len(samples))
+    db.add(dictionary)
+    db.commit()
+    db.refresh(dictionary)
+    with _dictionary_lock:
+        _dictionaries[dictionary.id] = zstandard.ZstdCompressionDict(dictionary.data)
+        _latest_dictionary = (dictionary.id, time.monotonic())
+    logger.info(f"训练配置压缩字典成功，ID: {dictionary.id}, 样本数: {len(samples)}, 大小: {len(dictionary.data)} 字节")
+    return dictionary
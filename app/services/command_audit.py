@@ -0,0 +1,257 @@
+"""
+设备命令审计日志模块
+接口只把执行记录放入进程内队列，后台线程按批插入 command_logs 表，请求路径上没有数据库写入。
+输出的摘要和压缩也在后台线程中计算，较长的输出以gzip压缩保存。
+
+队列已满（数据库长时间不可用）时新记录不再入队，而是完整写入错误日志，避免阻塞命令执行；
+服务停止时写出队列中剩余的记录。
+"""
+import gzip
+import hashlib
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.services.config import (
+    COMMAND_AUDIT_BATCH_SIZE,
+    COMMAND_AUDIT_COMPRESS_MIN,
+    COMMAND_AUDIT_ENABLED,
+    COMMAND_AUDIT_FLUSH_INTERVAL,
+    COMMAND_AUDIT_QUEUE_SIZE
+)
+from app.services.db import engine
+from app.services.models import CommandLog, User
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+_command_log_table = CommandLog.__table__
+
+# 写入失败的批次最多保留的记录数，超过后丢弃最早的记录
+_MAX_RETRY_ROWS = 10 * COMMAND_AUDIT_BATCH_SIZE
+
+_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=COMMAND_AUDIT_QUEUE_SIZE)
+_stop_event = threading.Event()
+_writer_thread: Optional[threading.Thread] = None
+
+# 用户名到用户ID的缓存，用户ID不会改变
+_user_id_cache: Dict[str, int] = {}
+
+
+def record_command(
+    device_id: int,
+    username: Optional[str],
+    command: str,
+    output: Optional[str],
+    success: bool,
+    latency_ms: Optional[int] = None
+) -> None:
+    """记录一次命令执行，只入队，不访问数据库
+
+    Args:
+        device_id: 设备ID
+        username: 执行命令的用户名
+        command: 执行的命令
+        output: 命令输出，失败时为错误信息
+        success: 是否执行成功
+        latency_ms: 执行耗时（毫秒）
+    """
+    if not COMMAND_AUDIT_ENABLED:
+        return
+    entry = {
+        "device_id": device_id,
+        "username": username,
+        "command": command,
+        "output": output,
+        "success": success,
+        "latency_ms": latency_ms,
+        "created_at": datetime.now()
+    }
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        _log_dropped(entry, "队列已满")
+
+
+def _resolve_user_ids(conn, usernames) -> Dict[str, int]:
+    """批量解析用户名对应的用户ID"""
+    missing = [name for name in usernames if name and name not in _user_id_cache]
+    if missing:
+        rows = conn.execute(select(User.username, User.id).where(User.username.in_(missing))).all()
+        _user_id_cache.update({name: user_id for name, user_id in rows})
+    return _user_id_cache
+
+
+def _to_row(entry: Dict[str, Any], user_ids: Dict[str, int]) -> Dict[str, Any]:
+    """将队列中的记录转换为 command_logs 的行，计算输出摘要并压缩较长的输出"""
+    output = entry["output"]
+    row = {
+        "device_id": entry["device_id"],
+        "user_id": user_ids.get(entry["username"]),
+        "username": entry["username"],
+        "command": entry["command"],
+        "output": None,
+        "output_gzip": None,
+        "output_digest": None,
+        "output_size": None,
+        "success": entry["success"],
+        "latency_ms": entry["latency_ms"],
+        "created_at": entry["created_at"]
+    }
+    if output is not None:
+        data = output.encode("utf-8")
+        row["output_digest"] = hashlib.sha256(data).hexdigest()
+        row["output_size"] = len(data)
+        if len(data) >= COMMAND_AUDIT_COMPRESS_MIN:
+            row["output_gzip"] = gzip.compress(data, mtime=0)
+        else:
+            row["output"] = output
+    return row
+
+
+def _log_dropped(entry: Dict[str, Any], reason: str) -> None:
+    """无法写入数据库的记录完整写入错误日志"""
+    logger.error(
+        f"丢弃命令审计记录（{reason}）：用户 {entry['username']}, 设备ID: {entry['device_id']}, "
+        f"命令: {entry['command']}, 成功: {entry['success']}, 时间: {entry['created_at'].isoformat()}"
+    )
+
+
+def _write_batch(entries: List[Dict[str, Any]]) -> None:
+    """在一个事务中批量插入审计记录
+
+    批量插入违反约束时（例如设备已被删除）逐行重试，违反约束的记录写入错误日志后丢弃，
+    不会阻塞后续记录；连接失败等其他错误向上抛出，由调用方稍后重试
+    """
+    with engine.begin() as conn:
+        user_ids = _resolve_user_ids(conn, {entry["username"] for entry in entries})
+        rows = [_to_row(entry, user_ids) for entry in entries]
+        try:
+            with conn.begin_nested():
+                conn.execute(_command_log_table.insert(), rows)
+            return
+        except IntegrityError:
+            logger.warning(f"批量写入 {len(rows)} 条命令审计记录违反约束，改为逐行写入")
+        for entry, row in zip(entries, rows):
+            try:
+                with conn.begin_nested():
+                    conn.execute(_command_log_table.insert(), row)
+            except IntegrityError as e:
+                _log_dropped(entry, f"违反约束: {e.orig}")
+
+
+def flush_pending(retry: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """写出队列中的全部记录
+
+    Args:
+        retry: 上次写入失败、需要重新写入的记录
+
+    Returns:
+        本次仍写入失败的记录
+    """
+    entries = list(retry or [])
+    while True:
+        try:
+            entries.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    for start in range(0, len(entries), COMMAND_AUDIT_BATCH_SIZE):
+        batch = entries[start:start + COMMAND_AUDIT_BATCH_SIZE]
+        try:
+            _write_batch(batch)
+        except SQLAlchemyError as e:
+            failed = entries[start:]
+            logger.error(f"写入命令审计记录失败，{len(failed)} 条记录稍后重试: {str(e)}")
+            if len(failed) > _MAX_RETRY_ROWS:
+                dropped = failed[:len(failed) - _MAX_RETRY_ROWS]
+                for entry in dropped:
+                    _log_dropped(entry, "重试队列已满")
+                failed = failed[len(dropped):]
+            return failed
+    return []
+
+
+def _writer_loop(interval: float) -> None:
+    retry: List[Dict[str, Any]] = []
+    while not _stop_event.is_set():
+        # 等待第一条记录，之后最多再等待 interval 秒凑成一批
+        try:
+            first = _queue.get(timeout=interval)
+        except queue.Empty:
+            if retry:
+                retry = flush_pending(retry)
+            continue
+        batch = retry + [first]
+        deadline = time.monotonic() + interval
+        while len(batch) < COMMAND_AUDIT_BATCH_SIZE and not _stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        retry = flush_pending(batch)
+        if retry:
+            # 数据库不可用时暂停一个周期再重试
+            _stop_event.wait(interval)
+    if flush_pending(retry):
+        logger.error("服务停止时仍有命令审计记录未能写入")
+
+
+def start_audit_writer(interval: float = COMMAND_AUDIT_FLUSH_INTERVAL) -> None:
+    """启动后台审计日志写入线程"""
+    global _writer_thread
+    if not COMMAND_AUDIT_ENABLED or (_writer_thread and _writer_thread.is_alive()):
+        return
+    _stop_event.clear()
+    _writer_thread = threading.Thread(target=_writer_loop, args=(interval,), name="command-audit", daemon=True)
+    _writer_thread.start()
+    logger.info("命令审计日志写入线程已启动")
+
+
+def stop_audit_writer(timeout: float = 10) -> None:
+    """停止后台写入线程，并写出队列中剩余的记录"""
+    _stop_event.set()
+    if _writer_thread and _writer_thread.is_alive():
+        _writer_thread.join(timeout)
+
+
+def command_log_output(log: CommandLog) -> Optional[str]:
+    """读取审计记录中保存的完整输出，压缩保存的输出自动解压"""
+    if log.output_gzip is not None:
+        return gzip.decompress(log.output_gzip).decode("utf-8")
+    return log.output
+
+
+def command_log_summary(row) -> Dict[str, Any]:
+    """审计记录列表项，不包含输出内容"""
+    return {
+        "id": row.id,
+        "device_id": row.device_id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "command": row.command,
+        "success": row.success,
+        "latency_ms": row.latency_ms,
+        "output_digest": row.output_digest,
+        "output_size": row.output_size,
+        "created_at": row.created_at
+    }
+
+
+def get_command_log(db: Session, log_id: int) -> Optional[Dict[str, Any]]:
+    """获取单条审计记录，包含完整输出"""
+    log = db.get(CommandLog, log_id)
+    if log is None:
+        return None
+    result = command_log_summary(log)
+    result["output"] = command_log_output(log)
+    return result
@@ -0,0 +1,319 @@
+"""
+响应压缩模块
+根据请求头 Accept-Encoding 在 zstd、brotli、gzip 中选择压缩算法，只压缩文本类响应，
+小于 COMPRESSION_MIN_SIZE 的响应不压缩。brotli 和 zstandard 为可选依赖，未安装时不参与协商。
+
+普通响应整体压缩；StreamingResponse（如流式导出）逐块压缩后立即发送，不会缓冲整个响应体。
+已带有 Content-Encoding 的响应（如以gzip格式保存、直接发送的配置备份）原样透传，不会重复压缩。
+206等非200响应和服务器直接发送文件（http.response.pathsend）的响应同样原样透传。
+"""
+import logging
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from app.services.config import (
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_ENABLED,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_ZSTD_LEVEL
+)
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 客户端对多种算法给出相同权重时的优先顺序
+_PREFERENCE = ("zstd", "br", "gzip")
+
+# 值得压缩的媒体类型，图片、压缩包等已压缩的内容不再压缩
+_COMPRESSIBLE_TYPES = (
+    b"text/",
+    b"application/json",
+    b"application/x-ndjson",
+    b"application/x-msgpack",
+    b"application/javascript",
+    b"application/xml",
+    # 配置备份以 application/octet-stream 下载，内容是文本
+    b"application/octet-stream",
+)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """当前环境可用的压缩算法"""
+    return tuple(
+        name for name in _PREFERENCE
+        if (name != "br" or brotli is not None) and (name != "zstd" or zstandard is not None)
+    )
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {算法: 权重}"""
+    weights: Dict[str, float] = {}
+    if not header:
+        return weights
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+    return weights
+
+
+def choose_encoding(header: Optional[str], candidates: Optional[Tuple[str, ...]] = None) -> Optional[str]:
+    """按客户端权重和服务端优先顺序选择压缩算法
+
+    Args:
+        header: 请求头 Accept-Encoding 的值
+        candidates: 可选的算法，默认为当前环境可用的全部算法
+
+    Returns:
+        算法名称（zstd、br、gzip），客户端不接受任何一种时返回None
+    """
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in candidates or available_encodings():
+        quality = weights.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def accepts_encoding(header: Optional[str], encoding: str) -> bool:
+    """客户端是否接受指定的压缩算法"""
+    return choose_encoding(header, (encoding,)) == encoding
+
+
+class StreamCompressor:
+    """增量压缩器，对 gzip、brotli、zstd 提供统一的 compress/finish 接口"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            # wbits=31 生成带gzip头和校验的格式
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"不支持的压缩算法: {encoding}")
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """压缩一块数据；flush 为True时输出目前为止的全部压缩结果，客户端可以立即解压"""
+        if self.encoding == "br":
+            output = self._compressor.process(data)
+            return output + self._compressor.flush() if flush else output
+        output = self._compressor.compress(data)
+        if flush:
+            if self.encoding == "gzip":
+                output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                output += self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return output
+
+    def finish(self) -> bytes:
+        """结束压缩流，返回剩余的数据"""
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """一次性压缩完整的数据"""
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def decompress_bytes(data: bytes, encoding: str) -> bytes:
+    """解压完整的数据"""
+    if encoding == "gzip":
+        return zlib.decompress(data, 47)
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"不支持的压缩算法: {encoding}")
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    return next((value for key, value in headers if key.lower() == name), None)
+
+
+def _add_vary(headers, value: bytes) -> None:
+    for index, (name, current) in enumerate(headers):
+        if name.lower() == b"vary":
+            if value.lower() not in current.lower():
+                headers[index] = (name, current + b", " + value)
+            return
+    headers.append((b"vary", value))
+
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 压缩响应体的纯ASGI中间件
+
+    响应体小于 minimum_size 时原样发送；流式响应先积累到 minimum_size 再决定是否压缩，
+    之后每收到一块就压缩并发送一块。压缩后的响应使用弱ETag，客户端带回的弱ETag仍能匹配304
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = choose_encoding(accept_encoding.decode("latin-1")) if accept_encoding else None
+        if encoding is None or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        pending = []
+        pending_size = 0
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_start(compress: bool, content_length: Optional[int] = None) -> None:
+            headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name.lower() != b"content-length"
+            ]
+            if compress:
+                headers.append((b"content-encoding", encoding.encode("ascii")))
+                for index, (name, value) in enumerate(headers):
+                    if name.lower() == b"etag" and not value.startswith(b"W/"):
+                        headers[index] = (name, b"W/" + value)
+            if content_length is not None:
+                headers.append((b"content-length", str(content_length).encode("ascii")))
+            elif not compress:
+                original = _header(start_message.get("headers", []), b"content-length")
+                if original is not None:
+                    headers.append((b"content-length", original))
+            start_message["headers"] = headers
+            await send(start_message)
+
+        async def send_compressed(message):
+            nonlocal start_message, pending_size, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                content_type = _header(headers, b"content-type") or b""
+                eligible = (
+                    message["status"] == 200
+                    and _header(headers, b"content-encoding") is None
+                    and content_type.lower().startswith(_COMPRESSIBLE_TYPES)
+                )
+                if eligible:
+                    # 是否压缩取决于 Accept-Encoding，缓存需要按该请求头区分
+                    _add_vary(headers, b"Accept-Encoding")
+                message["headers"] = headers
+                if not eligible:
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if message["type"] == "http.response.pathsend" and start_message is not None and compressor is None:
+                # 服务器直接发送文件，响应体不经过中间件，只能不压缩
+                await send_start(compress=False)
+                await send(message)
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                # 每块压缩后立即发送，保证流式响应的数据不会滞留在压缩器中
+                data = compressor.compress(body, flush=True) if more_body else compressor.compress(body) + compressor.finish()
+                if data or not more_body:
+                    await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            pending.append(body)
+            pending_size += len(body)
+            if more_body and pending_size < self.minimum_size:
+                return
+
+            data = b"".join(pending)
+            pending.clear()
+            if not more_body:
+                if pending_size < self.minimum_size:
+                    await send_start(compress=False)
+                    await send({"type": "http.response.body", "body": data, "more_body": False})
+                    return
+                compressed = compress_bytes(data, encoding)
+                await send_start(compress=True, content_length=len(compressed))
+                await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+
+            compressor = StreamCompressor(encoding)
+            await send_start(compress=True)
+            await send({"type": "http.response.body", "body": compressor.compress(data, flush=True), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def stored_encoding_acceptor(request: Request) -> Callable[[str], bool]:
+    """判断能否直接发送某种压缩格式保存的文件
+
+    Range 请求的范围按原始内容计算，总是发送还原后的内容
+    """
+    header = request.headers.get("accept-encoding")
+    ranged = "range" in request.headers
+    return lambda encoding: not ranged and accepts_encoding(header, encoding)
+
+
+def stored_file_response(
+    path: str,
+    stored_encoding: Optional[str],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None
+) -> FileResponse:
+    """以文件方式发送保存的内容
+
+    由 FileResponse 处理 Range、If-Range，服务器支持时使用 sendfile，否则分块读取，不把整个文件读入内存；
+    stored_encoding 不为None时文件是客户端接受的压缩格式，原样发送
+
+    Args:
+        path: 文件路径
+        stored_encoding: 文件的压缩算法，未压缩为None
+        media_type: 响应的媒体类型
+        headers: 其他响应头，其中的强ETag在直接发送压缩内容时改为弱ETag
+    """
+    headers = dict(headers or {})
+    if stored_encoding is not None:
+        headers["Content-Encoding"] = stored_encoding
+        headers["Vary"] = "Accept-Encoding"
+        if "ETag" in headers and not headers["ETag"].startswith("W/"):
+            headers["ETag"] = "W/" + headers["ETag"]
+    return FileResponse(path, media_type=media_type, headers=headers)
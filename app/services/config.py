@@ -22,9 +22,26 @@ if not DATABASE_URL:
     DB_NAME = os.getenv("DB_NAME", "netmgr")
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
 
+# 异步驱动连接字符串，未配置时由DATABASE_URL转换（pymysql→aiomysql，sqlite→aiosqlite）
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# 只读副本连接字符串，多个用逗号分隔；未配置时只读请求也使用主库
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))  # 副本允许的最大复制延迟（秒），超过则回退到主库
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))  # 检查副本复制延迟的间隔（秒）
+
 # ✅ Redis配置（用于Celery任务队列）
 REDIS_URL = os.getenv("REDIS_URL", "redis://192.168.13.200:6379/0")
 
+# ✅ 响应缓存配置（进程内LRU + Redis）
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() == "true"  # 是否启用响应缓存
+CACHE_REDIS_ENABLED = os.getenv("CACHE_REDIS_ENABLED", "True").lower() == "true"  # 是否使用Redis作为二级缓存
+CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "netmgr:cache:")  # Redis缓存键前缀
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "1024"))  # 进程内缓存最大条目数
+CACHE_GENERATION_CHECK = float(os.getenv("CACHE_GENERATION_CHECK", "1"))  # 从Redis同步失效版本号的间隔（秒）
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "2"))  # 等待其他进程计算同一缓存项的最长时间（秒）
+CACHE_REDIS_RETRY = int(os.getenv("CACHE_REDIS_RETRY", "30"))  # Redis失败后暂停使用的时间（秒）
+
 # ✅ Token过期时间
 ACCESS_TOKEN_EXPIRE = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
@@ -34,6 +51,102 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 # ✅ 交换机连接配置
 DEFAULT_TIMEOUT = int(os.getenv("DEFAULT_TIMEOUT", "30"))  # 默认连接超时时间（秒）
 MAX_CONNECT_ATTEMPTS = int(os.getenv("MAX_CONNECT_ATTEMPTS", "3"))  # 最大连接尝试次数
+SNMP_COMMUNITY = os.getenv("SNMP_COMMUNITY", "public")  # 采集接口计数器使用的SNMP团体名
+
+# ✅ 设备批量导入配置
+DEVICE_IMPORT_CHUNK_SIZE = int(os.getenv("DEVICE_IMPORT_CHUNK_SIZE", "1000"))  # 批量插入时每块的行数
+# 后台导入任务上传文件的落盘目录
+DEVICE_IMPORT_SPOOL_DIR = os.getenv(
+    "DEVICE_IMPORT_SPOOL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "import_spool")
+)
+DEVICE_IMPORT_WORKER_ENABLED = os.getenv("DEVICE_IMPORT_WORKER_ENABLED", "True").lower() == "true"  # 是否在本进程中处理后台导入任务
+DEVICE_IMPORT_POLL_INTERVAL = int(os.getenv("DEVICE_IMPORT_POLL_INTERVAL", "5"))  # 后台导入线程检查新任务的间隔（秒）
+DEVICE_IMPORT_STALE_SECONDS = int(os.getenv("DEVICE_IMPORT_STALE_SECONDS", "300"))  # 运行中的任务超过该时间没有进度则由其他进程接管
+
+# ✅ 数据导出配置
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # 流式导出时每批从数据库读取的行数
+
+# ✅ 配置备份存储配置
+# 配置备份文件的存储目录，使用S3存储时只保存下载缓存等本地文件
+CONFIG_BACKUP_DIR = os.getenv(
+    "CONFIG_BACKUP_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "config_backups")
+)
+CONFIG_BACKUP_STORAGE = os.getenv("CONFIG_BACKUP_STORAGE", "local").lower()  # 备份内容的存储后端：local, s3
+CONFIG_BACKUP_S3_BUCKET = os.getenv("CONFIG_BACKUP_S3_BUCKET", "")  # S3存储桶
+CONFIG_BACKUP_S3_PREFIX = os.getenv("CONFIG_BACKUP_S3_PREFIX", "config_backups")  # 对象名前缀
+CONFIG_BACKUP_S3_ENDPOINT = os.getenv("CONFIG_BACKUP_S3_ENDPOINT", "")  # S3兼容存储的地址，如 http://minio:9000，使用AWS S3时为空
+CONFIG_BACKUP_S3_REGION = os.getenv("CONFIG_BACKUP_S3_REGION", "")
+CONFIG_BACKUP_S3_ACCESS_KEY = os.getenv("CONFIG_BACKUP_S3_ACCESS_KEY", "")  # 为空时使用boto3默认的凭据来源
+CONFIG_BACKUP_S3_SECRET_KEY = os.getenv("CONFIG_BACKUP_S3_SECRET_KEY", "")
+CONFIG_BACKUP_CODEC = os.getenv("CONFIG_BACKUP_CODEC", "zstd").lower()  # 配置备份内容的压缩格式：zstd, gzip, none
+CONFIG_BACKUP_ZSTD_LEVEL = int(os.getenv("CONFIG_BACKUP_ZSTD_LEVEL", "9"))  # 保存备份时的zstd压缩级别，只压缩一次，可高于实时压缩
+CONFIG_BACKUP_DELTA = os.getenv("CONFIG_BACKUP_DELTA", "True").lower() == "true"  # 是否以同一设备上一版本为基准保存差量
+CONFIG_BACKUP_KEYFRAME_INTERVAL = int(os.getenv("CONFIG_BACKUP_KEYFRAME_INTERVAL", "16"))  # 每个差量链最多的版本数，达到后保存完整版本
+CONFIG_BACKUP_DICT_SIZE = int(os.getenv("CONFIG_BACKUP_DICT_SIZE", "112640"))  # 训练zstd字典的大小（字节）
+CONFIG_BACKUP_DICT_SAMPLES = int(os.getenv("CONFIG_BACKUP_DICT_SAMPLES", "2000"))  # 训练字典时最多使用的备份数
+CONFIG_BACKUP_CACHE_BYTES = int(os.getenv("CONFIG_BACKUP_CACHE_BYTES", str(32 * 1024 * 1024)))  # 进程内缓存已还原内容的最大字节数
+CONFIG_BACKUP_MATERIALIZED_BYTES = int(os.getenv("CONFIG_BACKUP_MATERIALIZED_BYTES", str(512 * 1024 * 1024)))  # 下载时还原到磁盘的内容文件最多占用的字节数
+
+# ✅ 配置对比配置
+# 对比时忽略的易变行（正则表达式，匹配行首），如时间戳、配置长度等每次备份都会变化的行
+CONFIG_DIFF_IGNORE_REGEX = os.getenv(
+    "CONFIG_DIFF_IGNORE_REGEX",
+    r"^\s*(!\s*Time:|!\s*Last configuration (change|was updated) at|!\s*NVRAM config last updated at"
+    r"|!\s*Software Version|Building configuration|Current configuration\s*:|ntp clock-period)"
+)
+CONFIG_DIFF_CACHE_TTL = int(os.getenv("CONFIG_DIFF_CACHE_TTL", "86400"))  # 对比结果的缓存时间（秒），备份内容不会修改，可以较长
+CONFIG_DIFF_MAX_CONTEXT = int(os.getenv("CONFIG_DIFF_MAX_CONTEXT", "20"))  # 每个差异块允许请求的最大上下文行数
+
+# ✅ 配置搜索配置
+CONFIG_SEARCH_ENABLED = os.getenv("CONFIG_SEARCH_ENABLED", "True").lower() == "true"  # 创建备份时是否更新搜索索引
+CONFIG_SEARCH_HISTORY = os.getenv("CONFIG_SEARCH_HISTORY", "False").lower() == "true"  # 是否同时索引历史备份，否则只索引每台设备的最新备份
+CONFIG_SEARCH_MAX_LINES = int(os.getenv("CONFIG_SEARCH_MAX_LINES", "20"))  # 每个备份最多返回的匹配行数
+
+# ✅ 批量配置备份配置
+BACKUP_RUN_WORKER_ENABLED = os.getenv("BACKUP_RUN_WORKER_ENABLED", "True").lower() == "true"  # 是否在本进程中执行批量备份任务
+BACKUP_SCHEDULE_WINDOW = os.getenv("BACKUP_SCHEDULE_WINDOW", "")  # 每天自动备份全部设备的维护窗口，如 02:00-05:00，为空时不自动备份
+BACKUP_RUN_WORKERS = int(os.getenv("BACKUP_RUN_WORKERS", "32"))  # 同时备份的设备总数
+BACKUP_RUN_VENDOR_CONCURRENCY = int(os.getenv("BACKUP_RUN_VENDOR_CONCURRENCY", "16"))  # 同一厂商同时备份的设备数
+BACKUP_RUN_SITE_CONCURRENCY = int(os.getenv("BACKUP_RUN_SITE_CONCURRENCY", "4"))  # 同一位置（站点）同时备份的设备数
+BACKUP_RUN_RETRY_ATTEMPTS = int(os.getenv("BACKUP_RUN_RETRY_ATTEMPTS", "3"))  # 单台设备最多尝试的次数
+BACKUP_RUN_RETRY_DELAY = float(os.getenv("BACKUP_RUN_RETRY_DELAY", "30"))  # 第一次重试前等待的时间（秒），之后每次加倍
+BACKUP_RUN_POLL_INTERVAL = int(os.getenv("BACKUP_RUN_POLL_INTERVAL", "30"))  # 检查新任务和维护窗口的间隔（秒）
+BACKUP_RUN_STALE_SECONDS = int(os.getenv("BACKUP_RUN_STALE_SECONDS", "600"))  # 运行中的任务超过该时间没有进度则由其他进程接管
+BACKUP_CHANGE_CHECK_ENABLED = os.getenv("BACKUP_CHANGE_CHECK_ENABLED", "True").lower() == "true"  # 拉取完整配置前是否先检查配置变化指示值
+BACKUP_CHANGE_CHECK_MAX_AGE = int(os.getenv("BACKUP_CHANGE_CHECK_MAX_AGE", str(7 * 24 * 3600)))  # 指示值未变时最长多久（秒）仍强制完整拉取一次
+
+# ✅ 命令审计日志配置
+COMMAND_AUDIT_ENABLED = os.getenv("COMMAND_AUDIT_ENABLED", "True").lower() == "true"  # 是否记录设备命令审计日志
+COMMAND_AUDIT_QUEUE_SIZE = int(os.getenv("COMMAND_AUDIT_QUEUE_SIZE", "10000"))  # 待写入审计记录的队列上限
+COMMAND_AUDIT_BATCH_SIZE = int(os.getenv("COMMAND_AUDIT_BATCH_SIZE", "200"))  # 每次批量插入的最大记录数
+COMMAND_AUDIT_FLUSH_INTERVAL = float(os.getenv("COMMAND_AUDIT_FLUSH_INTERVAL", "2"))  # 队列中的记录最长等待写入的时间（秒）
+COMMAND_AUDIT_COMPRESS_MIN = int(os.getenv("COMMAND_AUDIT_COMPRESS_MIN", "4096"))  # 输出达到该字节数时压缩保存
+
+# ✅ 响应压缩配置
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True").lower() == "true"  # 是否按 Accept-Encoding 压缩响应
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # 小于该字节数的响应不压缩
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))  # gzip压缩级别（1-9）
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # brotli压缩质量（0-11），实时压缩不宜过高
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))  # zstd压缩级别（1-22）
+
+# ✅ 指标时序存储配置
+METRICS_BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "1000"))  # 批量插入时每批的行数
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "10"))  # 写入缓冲区最长刷新间隔（秒）
+METRICS_COLLECT_ENABLED = os.getenv("METRICS_COLLECT_ENABLED", "False").lower() == "true"  # 是否启动接口计数器采集
+METRICS_COLLECT_INTERVAL = int(os.getenv("METRICS_COLLECT_INTERVAL", "60"))  # 接口计数器采集周期（秒）
+HEALTH_POLL_INTERVAL = int(os.getenv("HEALTH_POLL_INTERVAL", "60"))  # CPU/内存采集周期（秒）
+HEALTH_POLL_WORKERS = int(os.getenv("HEALTH_POLL_WORKERS", "16"))  # CPU/内存并发采集的设备数
+METRICS_ROLLUP_ENABLED = os.getenv("METRICS_ROLLUP_ENABLED", "True").lower() == "true"  # 是否启动指标汇总与清理
+METRICS_ROLLUP_INTERVAL = int(os.getenv("METRICS_ROLLUP_INTERVAL", "60"))  # 汇总任务运行周期（秒）
+METRICS_ROLLUP_GRACE = int(os.getenv("METRICS_ROLLUP_GRACE", "120"))  # 汇总前等待迟到样本的时间（秒）
+METRICS_MAX_POINTS = int(os.getenv("METRICS_MAX_POINTS", "800"))  # 自动选择精度时单条曲线的最大点数
+# 各精度数据的保留天数，过期后按分区整表删除
+METRICS_RAW_RETENTION_DAYS = int(os.getenv("METRICS_RAW_RETENTION_DAYS", "7"))
+METRICS_5M_RETENTION_DAYS = int(os.getenv("METRICS_5M_RETENTION_DAYS", "35"))
+METRICS_1H_RETENTION_DAYS = int(os.getenv("METRICS_1H_RETENTION_DAYS", "400"))
+METRICS_1D_RETENTION_DAYS = int(os.getenv("METRICS_1D_RETENTION_DAYS", "1830"))
 
 # ✅ 调试模式
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
@@ -0,0 +1,145 @@
+"""
+配置备份打包下载模块
+按备份ID或设备筛选条件和时间范围选出备份，边读取边写入ZIP并发送：
+不生成临时文件，内存占用与备份数量无关，只与单个备份的大小有关。
+
+ZIP写入不可定位的输出时，每个条目的大小和CRC写在条目数据之后（data descriptor），
+只有末尾的中央目录需要保存全部条目名称。备份按ID分批查询，读取内容时不占用服务端游标。
+"""
+import logging
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy import select
+
+from app.services.backup_scheduler import FILTER_COLUMNS
+from app.services.config import EXPORT_BATCH_SIZE
+from app.services.config_backup import read_config_bytes
+from app.services.db import read_session
+from app.services.models import Config, Device
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 写入ZIP条目时每块的字节数，每写一块就发送一次已压缩的数据
+_CHUNK_SIZE = 64 * 1024
+
+# ZIP格式能表示的最早时间
+_ZIP_EPOCH = datetime(1980, 1, 1)
+
+
+class _ChunkSink:
+    """不可定位的输出，收集 ZipFile 写入的字节，由生成器取走后发送"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_entry_name(device_name: Optional[str], device_ip: Optional[str], created_at: datetime) -> str:
+    """与单个备份下载相同的文件名：{设备名称}_{IP}_{时间}.cfg"""
+    name = f"{device_name or 'unknown_device'}_{device_ip or 'unknown_ip'}_{created_at.strftime('%Y%m%d_%H%M%S')}.cfg"
+    # 设备名称中的路径分隔符会在解压时生成子目录
+    return name.replace("/", "_").replace("\\", "_")
+
+
+def archive_query(filters: Dict[str, Any]):
+    """按筛选条件构造查询备份的语句
+
+    Args:
+        filters: config_ids、device_ids、vendors、locations、device_types、start_time、end_time，
+            为空的条件不参与筛选
+    """
+    query = (
+        select(
+            Config.id,
+            Config.device_id,
+            Config.filename,
+            Config.hash,
+            Config.blob_hash,
+            Config.created_at,
+            Device.name.label("device_name"),
+            Device.management_ip
+        )
+        .outerjoin(Device, Config.device_id == Device.id)
+    )
+    if filters.get("config_ids"):
+        query = query.where(Config.id.in_(filters["config_ids"]))
+    for name, column in FILTER_COLUMNS.items():
+        if filters.get(name):
+            query = query.where(column.in_(filters[name]))
+    if filters.get("start_time"):
+        query = query.where(Config.created_at >= filters["start_time"])
+    if filters.get("end_time"):
+        query = query.where(Config.created_at < filters["end_time"])
+    return query
+
+
+def stream_archive(filters: Dict[str, Any], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """按筛选条件生成包含配置备份的ZIP
+
+    Args:
+        filters: 筛选条件，见 archive_query()
+        batch_size: 每批查询的备份数
+
+    Yields:
+        ZIP的字节，每个条目写入一块后立即输出
+    """
+    sink = _ChunkSink()
+    names: Set[str] = set()
+    db = read_session()
+    archived = missing = 0
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            query = archive_query(filters)
+            last_id = 0
+            while True:
+                # 按ID分批查询，每批查询完成后再读取内容
+                rows = db.execute(query.where(Config.id > last_id).order_by(Config.id).limit(batch_size)).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                for row in rows:
+                    data = read_config_bytes(db, row)
+                    if data is None:
+                        missing += 1
+                        continue
+                    name = archive_entry_name(row.device_name, row.management_ip, row.created_at)
+                    if name in names:
+                        # 同一设备在同一秒内的多个备份
+                        name = f"{name[:-len('.cfg')]}_{row.id}.cfg"
+                    names.add(name)
+
+                    info = zipfile.ZipInfo(name, date_time=max(row.created_at, _ZIP_EPOCH).timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with archive.open(info, mode="w", force_zip64=len(data) > zipfile.ZIP64_LIMIT) as entry:
+                        for offset in range(0, len(data), _CHUNK_SIZE):
+                            entry.write(data[offset:offset + _CHUNK_SIZE])
+                            chunk = sink.take()
+                            if chunk:
+                                yield chunk
+                    archived += 1
+                    chunk = sink.take()
+                    if chunk:
+                        yield chunk
+        # 关闭 ZipFile 时写入中央目录
+        yield sink.take()
+        logger.info(f"打包配置备份完成，共 {archived} 个" + (f"，{missing} 个内容不存在已跳过" if missing else ""))
+    except Exception as e:
+        # 响应头已经发出，只能记录日志并中断响应
+        logger.error(f"打包配置备份失败: {str(e)}")
+        raise
+    finally:
+        db.close()
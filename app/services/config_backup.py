@@ -1,22 +1,44 @@
 import logging
 from datetime import datetime
-import os
+import gzip
 import hashlib
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple
 
+from app.services.config import CONFIG_SEARCH_ENABLED
 from app.services.models import Config, Device
 from app.services.schemas import ConfigCreate, ConfigOut
-
-# 配置备份文件存储路径
-CONFIG_BACKUP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config_backups')
-
-# 确保备份目录存在
-os.makedirs(CONFIG_BACKUP_DIR, exist_ok=True)
+from app.services.backup_storage import backup_storage
+from app.services.backup_store import (
+    blob_file,
+    discard_released,
+    local_stored_file,
+    materialize_file,
+    read_content,
+    release_blob,
+    restore_released,
+    store_blob
+)
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
+# 按内容寻址保存之前、以gzip格式保存的备份文件的扩展名
+GZIP_SUFFIX = ".gz"
+
+def config_content_hash(config: str) -> str:
+    """配置内容的SHA-256，与备份记录的 hash 一致"""
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+def _update_search_index(db: Session, update_index: Callable[[], None]) -> None:
+    """在保存点中更新搜索索引，失败时只记录日志，不影响备份本身（索引可以重建）"""
+    try:
+        with db.begin_nested():
+            update_index()
+    except Exception as e:
+        logger.error(f"更新配置搜索索引失败，错误: {str(e)}")
+
 def create_config_backup(db: Session, config_data: ConfigCreate) -> Config:
     """创建配置备份
     
@@ -41,19 +63,23 @@ def create_config_backup(db: Session, config_data: ConfigCreate) -> Config:
     # 生成唯一的文件名
     timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
     filename = f"{device.id}_{timestamp}.cfg"
-    filepath = os.path.join(CONFIG_BACKUP_DIR, filename)
     
     # 计算配置内容的哈希值（使用SHA-256）
     config_bytes = config_data.config.encode('utf-8')
     config_hash = hashlib.sha256(config_bytes).hexdigest()
     
-    # 保存配置文件到文件系统
+    # 内容按哈希保存，与已有备份内容相同时只增加引用计数，不写文件；filename 仅用作备份的名称
+    # 新内容以该设备上一版本为基准保存差量
+    previous = get_latest_config_backup(db, device.id)
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(config_data.config)
-        file_size = os.path.getsize(filepath)
-        logger.info(f"配置文件保存成功，路径: {filepath}, 大小: {file_size} 字节")
+        written = store_blob(db, config_hash, config_bytes, previous.blob_hash if previous else None)
+        file_size = len(config_bytes)
+        if written:
+            logger.info(f"配置内容保存成功，设备ID: {config_data.device_id}, 大小: {file_size} 字节")
+        else:
+            logger.info(f"配置内容与已有备份相同，不再重复保存，设备ID: {config_data.device_id}, 哈希: {config_hash}")
     except Exception as e:
+        db.rollback()
         logger.error(f"保存配置文件失败，设备ID: {config_data.device_id}, 错误: {str(e)}")
         raise IOError(f"保存配置文件失败: {str(e)}")
     
@@ -63,6 +89,7 @@ def create_config_backup(db: Session, config_data: ConfigCreate) -> Config:
         filename=filename,
         file_size=file_size,
         hash=config_hash,
+        blob_hash=config_hash,
         taken_by=config_data.taken_by,
         description=config_data.description,
         created_at=datetime.utcnow()
@@ -70,33 +97,82 @@ def create_config_backup(db: Session, config_data: ConfigCreate) -> Config:
     
     # 保存到数据库
     db.add(db_config)
+    if CONFIG_SEARCH_ENABLED:
+        # 搜索模块依赖本模块读取备份内容，在函数内导入
+        from app.services.config_search import index_config_backup
+        db.flush()
+        _update_search_index(db, lambda: index_config_backup(db, db_config, config_data.config, previous))
     db.commit()
     db.refresh(db_config)
     
     logger.info(f"创建配置备份成功，设备ID: {config_data.device_id}, 备份ID: {db_config.id}")
     return db_config
 
-def get_config_file_content(filename: str) -> Optional[str]:
-    """从文件系统读取配置文件内容
+def get_backup_file(db: Session, config: Config,
+                    accept: Callable[[str], bool]) -> Optional[Tuple[str, Optional[str]]]:
+    """取得可以直接发送的配置备份文件，不把内容读入内存
+
+    Args:
+        db: 数据库会话
+        config: 配置备份记录
+        accept: 判断客户端是否接受某种压缩格式，接受时直接发送保存的压缩文件
+
+    Returns:
+        (文件路径, 压缩算法)，发送未压缩的内容时压缩算法为None；内容不存在时返回None
+    """
+    if config.blob_hash:
+        return blob_file(db, config.blob_hash, accept)
+
+    # 按内容寻址保存之前创建的备份，内容在以 filename 为键的文件中
+    compressed = config.filename.endswith(GZIP_SUFFIX)
+    filepath = local_stored_file(config.filename, config.hash + (GZIP_SUFFIX if compressed else ""))
+    if filepath is None:
+        return None
+    if not compressed:
+        return filepath, None
+    if accept("gzip"):
+        return filepath, "gzip"
+    return materialize_file(config.hash, filepath, "gzip"), None
+
+def read_config_bytes(db: Session, config: Config) -> Optional[bytes]:
+    """读取配置备份内容的字节，压缩或差量保存的内容自动还原
     
     Args:
-        filename: 配置文件名
+        db: 数据库会话
+        config: 配置备份记录
     
     Returns:
-        配置文件内容，如果文件不存在或读取失败则返回None
+        配置内容，不存在时返回None
     """
-    filepath = os.path.join(CONFIG_BACKUP_DIR, filename)
-    if not os.path.exists(filepath):
-        logger.warning(f"配置文件不存在，路径: {filepath}")
+    if config.blob_hash:
+        return read_content(db, config.blob_hash)
+    
+    # 按内容寻址保存之前创建的备份，内容在以 filename 为键的文件中
+    data = backup_storage.read(config.filename)
+    if data is None:
+        logger.warning(f"配置文件不存在，文件名: {config.filename}")
         return None
+    return gzip.decompress(data) if config.filename.endswith(GZIP_SUFFIX) else data
+
+def get_config_file_content(db: Session, config: Config) -> Optional[str]:
+    """读取配置备份的文件内容
+    
+    Args:
+        db: 数据库会话
+        config: 配置备份记录
     
+    Returns:
+        配置文件内容，如果文件不存在或读取失败则返回None
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        logger.info(f"读取配置文件成功，路径: {filepath}")
+        data = read_config_bytes(db, config)
+        if data is None:
+            return None
+        content = data.decode('utf-8')
+        logger.info(f"读取配置文件成功，备份ID: {config.id}")
         return content
     except Exception as e:
-        logger.error(f"读取配置文件失败，路径: {filepath}, 错误: {str(e)}")
+        logger.error(f"读取配置文件失败，备份ID: {config.id}, 错误: {str(e)}")
         return None
 
 def get_config_backup(db: Session, config_id: int) -> Optional[Dict]:
@@ -114,7 +190,7 @@ def get_config_backup(db: Session, config_id: int) -> Optional[Dict]:
         return None
     
     # 读取配置文件内容
-    config_content = get_config_file_content(config.filename)
+    config_content = get_config_file_content(db, config)
     
     # 构建包含文件内容的响应
     config_dict = {
@@ -176,21 +252,37 @@ def delete_config_backup(db: Session, config_id: int) -> bool:
         logger.warning(f"配置备份不存在，ID: {config_id}")
         return False
     
+    if CONFIG_SEARCH_ENABLED:
+        from app.services.config_search import unindex_config_backup
+        _update_search_index(db, lambda: unindex_config_backup(db, config))
+    
+    if config.blob_hash:
+        # 减少内容的引用计数，不再被引用的内容文件在提交后删除
+        released = release_blob(db, config.blob_hash)
+        db.delete(config)
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            restore_released(released)
+            raise
+        discard_released(released)
+        logger.info(f"删除配置备份成功，ID: {config_id}")
+        return True
+    
     # 保存文件名，用于后续删除
     filename = config.filename
-    filepath = os.path.join(CONFIG_BACKUP_DIR, filename)
     
     # 删除数据库中的记录
     db.delete(config)
     db.commit()
     
-    # 删除文件系统中的配置文件
+    # 删除存储中的配置文件
     try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            logger.info(f"删除配置文件成功，路径: {filepath}")
+        backup_storage.delete(filename)
+        logger.info(f"删除配置文件成功，文件名: {filename}")
     except Exception as e:
-        logger.error(f"删除配置文件失败，路径: {filepath}, 错误: {str(e)}")
+        logger.error(f"删除配置文件失败，文件名: {filename}, 错误: {str(e)}")
         # 即使文件删除失败，数据库记录已经删除，仍返回True
     
     logger.info(f"删除配置备份成功，ID: {config_id}")
@@ -206,4 +298,45 @@ def get_latest_config_backup(db: Session, device_id: int) -> Optional[Config]:
     Returns:
         最新的配置备份对象，如果不存在则返回None
     """
-    return db.query(Config).filter(Config.device_id == device_id).order_by(Config.created_at.desc()).first()
\ No newline at end of file
+    return db.query(Config).filter(Config.device_id == device_id).order_by(Config.created_at.desc()).first()
+
+
+def get_previous_config_backup(db: Session, config: Config) -> Optional[Config]:
+    """获取同一设备在指定备份之前的一个配置备份
+
+    Args:
+        db: 数据库会话
+        config: 配置备份记录
+
+    Returns:
+        上一个配置备份，指定的备份已是最早的备份时返回None
+    """
+    return (
+        db.query(Config)
+        .filter(
+            Config.device_id == config.device_id,
+            (Config.created_at < config.created_at)
+            | ((Config.created_at == config.created_at) & (Config.id < config.id))
+        )
+        .order_by(Config.created_at.desc(), Config.id.desc())
+        .first()
+    )
+
+
+def get_backup_list_version(db: Session, device_id: Optional[int] = None) -> Tuple[int, Optional[int]]:
+    """备份列表的版本信息，用于生成ETag
+
+    备份创建后不会修改，记录数和最大ID即可确定列表是否变化
+
+    Args:
+        db: 数据库会话
+        device_id: 设备ID，不指定时统计全部备份
+
+    Returns:
+        (记录数, 最大ID)
+    """
+    query = select(func.count(Config.id), func.max(Config.id))
+    if device_id is not None:
+        query = query.where(Config.device_id == device_id)
+    count, max_id = db.execute(query).one()
+    return count, max_id
@@ -0,0 +1,122 @@
+"""
+配置变化预检查模块
+拉取完整运行配置之前，先读取一个代价很小的变化指示值，与上次完整拉取时记录的值比较，
+相同则认为配置没有变化，不再拉取完整配置。
+
+指示值的来源：
+- SNMP：设备实现了运行配置最近修改时间对象的厂商（见 SNMPAdapter.CONFIG_CHANGE_OIDS），不需要登录设备；
+- CLI：适配器定义了 CONFIG_CHANGE_COMMAND 的厂商，在拉取配置的同一会话中执行一条单行输出的命令。
+
+两种来源都不可用时照常拉取完整配置。指示值记录在 device_config_states 中，
+距上次完整拉取超过 BACKUP_CHANGE_CHECK_MAX_AGE 秒，或最新备份已不是当时的内容时，仍会完整拉取一次。
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.adapters.base import BaseAdapter
+from app.adapters.snmp import SNMPAdapter
+from app.services.config import BACKUP_CHANGE_CHECK_ENABLED, BACKUP_CHANGE_CHECK_MAX_AGE, SNMP_COMMUNITY
+from app.services.config_backup import get_latest_config_backup
+from app.services.models import DeviceConfigState
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# change_indicator 列的长度
+_MAX_INDICATOR_LENGTH = 255
+
+
+def _prefixed(source: str, value: Optional[str]) -> Optional[str]:
+    """给指示值加上来源前缀，避免切换读取方式后不同来源的值被误判为相同"""
+    if not value:
+        return None
+    return f"{source}:{value}"[:_MAX_INDICATOR_LENGTH]
+
+
+def read_snmp_indicator(device: Dict[str, Any]) -> Optional[str]:
+    """通过SNMP读取运行配置最近修改的时间
+
+    Args:
+        device: 设备连接信息，包含 management_ip、vendor
+
+    Returns:
+        带前缀的指示值，未启用预检查、厂商不支持或读取失败时返回None
+    """
+    vendor = (device.get("vendor") or "").lower()
+    if not BACKUP_CHANGE_CHECK_ENABLED or vendor not in SNMPAdapter.CONFIG_CHANGE_OIDS:
+        return None
+    adapter = SNMPAdapter({
+        'management_ip': device['management_ip'],
+        'vendor': 'snmp',
+        'snmp_community': SNMP_COMMUNITY
+    })
+    try:
+        return _prefixed("snmp", adapter.get_config_change_indicator(vendor))
+    except Exception as e:
+        logger.warning(f"通过SNMP读取配置变化指示值失败，设备ID: {device.get('id')}, 错误: {str(e)}")
+        return None
+    finally:
+        adapter.disconnect()
+
+
+def read_cli_indicator(adapter: BaseAdapter) -> Optional[str]:
+    """在已连接的会话中通过命令读取运行配置的变化指示值
+
+    Args:
+        adapter: 已连接的设备适配器
+
+    Returns:
+        带前缀的指示值，未启用预检查、适配器不支持或读取失败时返回None
+    """
+    if not BACKUP_CHANGE_CHECK_ENABLED or not adapter.CONFIG_CHANGE_COMMAND:
+        return None
+    try:
+        return _prefixed("cli", adapter.get_config_change_indicator())
+    except Exception as e:
+        logger.warning(f"通过命令读取配置变化指示值失败，设备ID: {adapter.device_info.get('id')}, 错误: {str(e)}")
+        return None
+
+
+def is_config_unchanged(db: Session, device_id: int, indicator: Optional[str]) -> bool:
+    """判断设备配置自上次完整拉取以来是否没有变化
+
+    Args:
+        db: 数据库会话
+        device_id: 设备ID
+        indicator: 本次读取的指示值
+
+    Returns:
+        指示值与记录相同、记录未过期且最新备份仍是当时的内容时返回True
+    """
+    if not indicator:
+        return False
+    state = db.get(DeviceConfigState, device_id)
+    if state is None or state.change_indicator != indicator or state.pulled_at is None:
+        return False
+    if datetime.now() - state.pulled_at > timedelta(seconds=BACKUP_CHANGE_CHECK_MAX_AGE):
+        return False
+    # 最新备份被删除或手动备份了其他内容时，记录的指示值已不能代表最新备份
+    latest = get_latest_config_backup(db, device_id)
+    return latest is not None and latest.hash == state.config_hash
+
+
+def record_config_pull(db: Session, device_id: int, indicator: Optional[str], config_hash: str) -> None:
+    """记录一次完整拉取时的指示值和对应的备份内容哈希，并提交
+
+    Args:
+        db: 数据库会话
+        device_id: 设备ID
+        indicator: 拉取前读取的指示值，没有时清除记录的值
+        config_hash: 拉取的配置对应的最新备份内容哈希
+    """
+    state = db.get(DeviceConfigState, device_id)
+    if state is None:
+        state = DeviceConfigState(device_id=device_id)
+        db.add(state)
+    state.change_indicator = indicator
+    state.config_hash = config_hash
+    state.pulled_at = datetime.now()
+    db.commit()
@@ -0,0 +1,186 @@
+"""
+配置备份对比模块
+按行对比两个配置备份，返回结构化的差异块或统一格式（unified diff）文本。
+
+- 对比前去掉匹配 CONFIG_DIFF_IGNORE_REGEX 的易变行（如 "!Time:" 时间戳），这些行的变化不计入差异，
+  也不出现在上下文中；差异块中的行号仍是原始配置中的行号。
+- 两次备份之间通常只有少量变化，先去掉相同的开头和结尾，只对中间部分运行 difflib。
+- 备份内容不会修改，对比结果按 (旧内容哈希, 新内容哈希, 上下文行数) 缓存在响应缓存中，
+  审查变更时反复查看同一对备份不会重复读取和对比。
+"""
+import difflib
+import hashlib
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.config import CACHE_ENABLED, CONFIG_DIFF_CACHE_TTL, CONFIG_DIFF_IGNORE_REGEX
+from app.services.config_backup import read_config_bytes
+from app.services.models import Config
+from app.services.response_cache import response_cache
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 对比结果所在的缓存命名空间
+DIFF_NAMESPACE = "config-diff"
+
+_ignore_pattern = re.compile(CONFIG_DIFF_IGNORE_REGEX) if CONFIG_DIFF_IGNORE_REGEX else None
+
+# 忽略规则变化后旧的缓存结果不再使用
+_ignore_version = hashlib.sha256(CONFIG_DIFF_IGNORE_REGEX.encode("utf-8")).hexdigest()[:8]
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _significant_lines(text: str) -> Tuple[List[str], List[int]]:
+    """去掉易变行，返回 (行内容, 对应的原始行号)"""
+    lines, numbers = [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        if _ignore_pattern is not None and _ignore_pattern.match(line):
+            continue
+        lines.append(line.rstrip())
+        numbers.append(number)
+    return lines, numbers
+
+
+def same_significant_content(old_text: str, new_text: str) -> bool:
+    """两份配置去掉易变行后是否相同"""
+    return _significant_lines(old_text)[0] == _significant_lines(new_text)[0]
+
+
+def _opcodes(a: List[str], b: List[str]) -> List[Opcode]:
+    """计算编辑操作，相同的开头和结尾不交给 difflib"""
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]:
+        suffix += 1
+
+    opcodes: List[Opcode] = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+    matcher = difflib.SequenceMatcher(None, a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return opcodes
+
+
+def _grouped(opcodes: List[Opcode], context: int) -> Iterator[List[Opcode]]:
+    """按上下文行数把编辑操作分组为差异块，与 SequenceMatcher.get_grouped_opcodes 相同"""
+    codes = list(opcodes)
+    if not codes or all(tag == "equal" for tag, *_ in codes):
+        return
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def compute_diff(old_text: str, new_text: str, context: int = 3) -> Dict[str, Any]:
+    """对比两份配置
+
+    Args:
+        old_text: 旧配置
+        new_text: 新配置
+        context: 每个差异块前后的上下文行数
+
+    Returns:
+        {"added": 新增行数, "removed": 删除行数, "hunks": 差异块列表}；
+        差异块包含 old_start/old_lines/new_start/new_lines（原始行号，从1开始）和 lines，
+        lines 中每行为 {"op": " "|"-"|"+", "text": 行内容, "old_line": 旧行号, "new_line": 新行号}
+    """
+    a, a_numbers = _significant_lines(old_text)
+    b, b_numbers = _significant_lines(new_text)
+    added = removed = 0
+    hunks = []
+    for group in _grouped(_opcodes(a, b), context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(
+                    {"op": " ", "text": a[i], "old_line": a_numbers[i], "new_line": b_numbers[j]}
+                    for i, j in zip(range(i1, i2), range(j1, j2))
+                )
+                continue
+            lines.extend({"op": "-", "text": a[i], "old_line": a_numbers[i], "new_line": None} for i in range(i1, i2))
+            lines.extend({"op": "+", "text": b[j], "old_line": None, "new_line": b_numbers[j]} for j in range(j1, j2))
+            removed += i2 - i1
+            added += j2 - j1
+        first_i, first_j = group[0][1], group[0][3]
+        old_numbers = [line["old_line"] for line in lines if line["old_line"] is not None]
+        new_numbers = [line["new_line"] for line in lines if line["new_line"] is not None]
+        hunks.append({
+            # 没有旧行（或新行）的块按统一格式的约定，起始行号为插入位置之前的一行
+            "old_start": old_numbers[0] if old_numbers else (a_numbers[first_i - 1] if first_i else 0),
+            "old_lines": len(old_numbers),
+            "new_start": new_numbers[0] if new_numbers else (b_numbers[first_j - 1] if first_j else 0),
+            "new_lines": len(new_numbers),
+            "lines": lines
+        })
+    return {"added": added, "removed": removed, "hunks": hunks}
+
+
+def format_unified(diff: Dict[str, Any], old_name: str, new_name: str) -> str:
+    """将结构化的对比结果输出为统一格式文本"""
+    output = [f"--- {old_name}", f"+++ {new_name}"]
+    for hunk in diff["hunks"]:
+        output.append(f"@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@")
+        output.extend(line["op"] + line["text"] for line in hunk["lines"])
+    return "\n".join(output) + "\n"
+
+
+def diff_config_backups(db: Session, old: Config, new: Config, context: int = 3) -> Optional[Dict[str, Any]]:
+    """对比两个配置备份，结果按内容哈希缓存
+
+    Args:
+        db: 数据库会话
+        old: 旧的配置备份
+        new: 新的配置备份
+        context: 上下文行数
+
+    Returns:
+        compute_diff() 的结果，任一备份内容不存在时返回None
+    """
+    def load() -> Dict[str, Any]:
+        if old.hash == new.hash:
+            return {"added": 0, "removed": 0, "hunks": []}
+        old_data = read_config_bytes(db, old)
+        new_data = read_config_bytes(db, new)
+        if old_data is None or new_data is None:
+            # 抛出异常而不是返回None，内容缺失的结果不会被缓存
+            raise FileNotFoundError(f"配置备份内容不存在，备份ID: {old.id if old_data is None else new.id}")
+        result = compute_diff(old_data.decode("utf-8", "replace"), new_data.decode("utf-8", "replace"), context)
+        logger.info(
+            f"对比配置备份完成，备份ID: {old.id} -> {new.id}, "
+            f"新增 {result['added']} 行, 删除 {result['removed']} 行"
+        )
+        return result
+
+    try:
+        if not CACHE_ENABLED:
+            return load()
+        key = f"{_ignore_version}:{old.hash}:{new.hash}:{context}"
+        return response_cache.get_or_load(DIFF_NAMESPACE, key, load, CONFIG_DIFF_CACHE_TTL)
+    except FileNotFoundError as e:
+        logger.warning(str(e))
+        return None
@@ -0,0 +1,265 @@
+"""
+配置备份全文搜索模块
+config_search_tokens 是配置备份的倒排索引：每个备份包含的每个词一行。搜索时先用索引找出包含全部搜索词的备份，
+再读取这些备份的内容，返回包含整个搜索内容的行，例如搜索 "vlan 300" 只返回有 "vlan 300" 这一行的设备
+（按词的边界匹配，不包括 "vlan 3000"）。
+
+- 分词：配置转为小写后按字母、数字、下划线和连字符切分，短于两个字符的词不索引（如接口编号中的 0、1），
+  整个搜索内容仍按行匹配，结果不受影响。
+- 索引范围：默认只索引每台设备的最新备份；CONFIG_SEARCH_HISTORY 为True时同时保留历史备份的索引，
+  搜索时可指定包含历史备份。
+- 增量更新：创建备份时在同一事务中更新索引。只索引最新备份时，把上一个备份的索引行改为指向新备份，
+  只删除消失的词、插入新出现的词，配置小改动时只写几行。
+
+索引丢失或修改了配置后，可以调用 rebuild_search_index() 重建。
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.services.config import CONFIG_SEARCH_HISTORY, CONFIG_SEARCH_MAX_LINES, EXPORT_BATCH_SIZE
+from app.services.config_backup import get_latest_config_backup, read_config_bytes
+from app.services.models import Config, ConfigSearchToken, Device
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[0-9a-z_][0-9a-z_\-]*")
+
+# 索引的最短词长，与 config_search_tokens.token 的长度
+_MIN_TOKEN_LENGTH = 2
+_MAX_TOKEN_LENGTH = 64
+
+# 每次插入的最大行数
+_INSERT_BATCH = 1000
+
+
+def tokenize(text: str) -> Set[str]:
+    """把配置或搜索内容切分为索引使用的词"""
+    return {
+        token[:_MAX_TOKEN_LENGTH] for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= _MIN_TOKEN_LENGTH
+    }
+
+
+def _insert_tokens(db: Session, tokens, config_id: int, device_id: int) -> None:
+    rows = [{"token": token, "config_id": config_id, "device_id": device_id, "latest": True} for token in tokens]
+    for start in range(0, len(rows), _INSERT_BATCH):
+        db.execute(insert(ConfigSearchToken), rows[start:start + _INSERT_BATCH])
+
+
+def _config_tokens(db: Session, config_id: int) -> Set[str]:
+    return set(db.execute(select(ConfigSearchToken.token).where(ConfigSearchToken.config_id == config_id)).scalars())
+
+
+def _indexed_as(db: Session, config_id: int) -> Optional[bool]:
+    """备份索引行的 latest 值，未索引时返回None"""
+    return db.execute(
+        select(ConfigSearchToken.latest).where(ConfigSearchToken.config_id == config_id).limit(1)
+    ).scalar()
+
+
+def index_config_backup(db: Session, config: Config, content: str, previous: Optional[Config]) -> None:
+    """为新创建的备份更新索引，在调用方的事务中执行
+
+    Args:
+        db: 数据库会话
+        config: 新备份记录（已分配ID）
+        content: 新备份的配置内容
+        previous: 创建前该设备的最新备份
+    """
+    tokens = tokenize(content)
+    if previous is None:
+        _insert_tokens(db, tokens, config.id, config.device_id)
+        return
+
+    if CONFIG_SEARCH_HISTORY:
+        db.execute(
+            update(ConfigSearchToken)
+            .where(ConfigSearchToken.config_id == previous.id)
+            .values(latest=False)
+        )
+        _insert_tokens(db, tokens, config.id, config.device_id)
+        return
+
+    # 只索引最新备份：上一个备份的索引行改为指向新备份，只写入变化的词
+    previous_tokens = _config_tokens(db, previous.id)
+    removed = previous_tokens - tokens
+    for start in range(0, len(removed), _INSERT_BATCH):
+        batch = list(removed)[start:start + _INSERT_BATCH]
+        db.execute(delete(ConfigSearchToken).where(
+            ConfigSearchToken.config_id == previous.id,
+            ConfigSearchToken.token.in_(batch)
+        ))
+    db.execute(
+        update(ConfigSearchToken)
+        .where(ConfigSearchToken.config_id == previous.id)
+        .values(config_id=config.id)
+    )
+    _insert_tokens(db, tokens - previous_tokens, config.id, config.device_id)
+
+
+def unindex_config_backup(db: Session, config: Config) -> None:
+    """删除备份前移除其索引，在调用方的事务中执行
+
+    被删除的是最新备份时，该设备的上一个备份成为最新备份，改为索引上一个备份
+    """
+    was_latest = _indexed_as(db, config.id)
+    db.execute(delete(ConfigSearchToken).where(ConfigSearchToken.config_id == config.id))
+    if not was_latest:
+        return
+
+    replacement = db.execute(
+        select(Config)
+        .where(Config.device_id == config.device_id, Config.id != config.id)
+        .order_by(Config.created_at.desc())
+        .limit(1)
+    ).scalar()
+    if replacement is None:
+        return
+    if CONFIG_SEARCH_HISTORY and _indexed_as(db, replacement.id) is not None:
+        db.execute(
+            update(ConfigSearchToken)
+            .where(ConfigSearchToken.config_id == replacement.id)
+            .values(latest=True)
+        )
+        return
+    data = read_config_bytes(db, replacement)
+    if data is not None:
+        db.execute(delete(ConfigSearchToken).where(ConfigSearchToken.config_id == replacement.id))
+        _insert_tokens(db, tokenize(data.decode("utf-8", errors="replace")), replacement.id, replacement.device_id)
+
+
+def rebuild_search_index(db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """清空并重建索引，按设备分批提交
+
+    Returns:
+        索引的备份数
+    """
+    db.execute(delete(ConfigSearchToken))
+    db.commit()
+    indexed = 0
+    last_device_id = 0
+    while True:
+        device_ids = db.execute(
+            select(Config.device_id).distinct()
+            .where(Config.device_id > last_device_id)
+            .order_by(Config.device_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not device_ids:
+            break
+        last_device_id = device_ids[-1]
+        for device_id in device_ids:
+            latest = get_latest_config_backup(db, device_id)
+            configs = [latest]
+            if CONFIG_SEARCH_HISTORY:
+                configs = db.execute(select(Config).where(Config.device_id == device_id)).scalars().all()
+            for config in configs:
+                data = read_config_bytes(db, config)
+                if data is None:
+                    continue
+                tokens = tokenize(data.decode("utf-8", errors="replace"))
+                _insert_tokens(db, tokens, config.id, device_id)
+                if config.id != latest.id:
+                    db.execute(
+                        update(ConfigSearchToken)
+                        .where(ConfigSearchToken.config_id == config.id)
+                        .values(latest=False)
+                    )
+                indexed += 1
+        db.commit()
+        # 释放本批加载的备份记录
+        db.expunge_all()
+    logger.info(f"重建配置搜索索引完成，共 {indexed} 个备份")
+    return indexed
+
+
+def _line_pattern(query: str) -> "re.Pattern":
+    """搜索内容对应的行匹配规则：忽略大小写，连续空白视为一个空白，两端按词的边界匹配（vlan 30 不匹配 vlan 300）"""
+    pattern = r"\s+".join(re.escape(part) for part in query.split())
+    if _TOKEN_PATTERN.match(query.strip()[0].lower()):
+        pattern = r"(?<![0-9a-z_\-])" + pattern
+    if re.match(r"[0-9a-z_\-]", query.strip()[-1].lower()):
+        pattern += r"(?![0-9a-z_\-])"
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def matching_lines(content: str, query: str, limit: int = CONFIG_SEARCH_MAX_LINES) -> List[Dict[str, Any]]:
+    """返回包含搜索内容的行，行号从1开始"""
+    pattern = _line_pattern(query)
+    lines = []
+    for number, line in enumerate(content.splitlines(), start=1):
+        if pattern.search(line):
+            lines.append({"line": number, "text": line})
+            if len(lines) >= limit:
+                break
+    return lines
+
+
+def search_configs(db: Session, query: str, limit: int = 50, after_id: Optional[int] = None,
+                   include_history: bool = False) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """搜索包含指定内容的配置备份
+
+    Args:
+        db: 数据库会话
+        query: 搜索内容，如 "vlan 300"
+        limit: 每页最多检查的备份数
+        after_id: 上一页最后一个备份ID，按备份ID分页
+        include_history: 是否包含历史备份（需要 CONFIG_SEARCH_HISTORY）
+
+    Returns:
+        (结果列表, 下一页的 after_id)，没有下一页时为None；每个结果包含设备、备份ID和匹配的行
+
+    Raises:
+        ValueError: 搜索内容中没有可以索引的词
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        raise ValueError(f"搜索内容至少需要包含一个不少于{_MIN_TOKEN_LENGTH}个字符的词")
+
+    candidates = (
+        select(ConfigSearchToken.config_id)
+        .where(ConfigSearchToken.token.in_(tokens))
+        .group_by(ConfigSearchToken.config_id)
+        .having(func.count() == len(tokens))
+    )
+    if not include_history:
+        candidates = candidates.where(ConfigSearchToken.latest.is_(True))
+    if after_id is not None:
+        candidates = candidates.where(ConfigSearchToken.config_id > after_id)
+    config_ids = db.execute(candidates.order_by(ConfigSearchToken.config_id).limit(limit + 1)).scalars().all()
+    next_after = None
+    if len(config_ids) > limit:
+        config_ids = config_ids[:limit]
+        next_after = config_ids[-1]
+    if not config_ids:
+        return [], None
+
+    rows = db.execute(
+        select(Config, Device.name, Device.management_ip)
+        .join(Device, Config.device_id == Device.id)
+        .where(Config.id.in_(config_ids))
+        .order_by(Config.id)
+    ).all()
+    results = []
+    for config, device_name, management_ip in rows:
+        data = read_config_bytes(db, config)
+        if data is None:
+            continue
+        # 索引只保证包含全部的词，按行确认整个搜索内容
+        lines = matching_lines(data.decode("utf-8", errors="replace"), query)
+        if not lines:
+            continue
+        results.append({
+            "device_id": config.device_id,
+            "device_name": device_name,
+            "management_ip": management_ip,
+            "config_id": config.id,
+            "created_at": config.created_at,
+            "lines": lines
+        })
+    return results, next_after
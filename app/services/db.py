@@ -1,9 +1,24 @@
+import itertools
 import logging
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
-from app.services.config import DATABASE_URL, DEBUG
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from app.services.config import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    DATABASE_REPLICA_URLS,
+    REPLICA_MAX_LAG,
+    REPLICA_CHECK_INTERVAL,
+    DEBUG
+)
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -31,6 +46,185 @@ SessionLocal = sessionmaker(
     autoflush=False
 )
 
+# 同步驱动到异步驱动的映射
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """将同步连接字符串转换为对应异步驱动的连接字符串
+
+    已经是异步驱动或无法识别的驱动原样返回
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if not driver:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# 创建异步数据库引擎，供纯数据库读取的 async 接口使用，不占用线程池
+try:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL or to_async_url(DATABASE_URL),
+        pool_pre_ping=True,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=3600,
+        echo=DEBUG
+    )
+    logger.info("Async database engine created successfully")
+except Exception as e:
+    logger.error(f"Failed to create async database engine: {str(e)}")
+    raise
+
+# 创建异步数据库会话工厂
+# 提交后不使对象过期，避免在接口返回后序列化时触发隐式的延迟加载
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# 查询复制延迟的语句，MySQL 8.0.22 之前只支持 SHOW SLAVE STATUS
+REPLICA_STATUS_QUERIES = ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS")
+
+
+def _lag_from_status(rows) -> Optional[float]:
+    """从复制状态中取出复制延迟（秒）
+
+    没有复制状态说明连接的不是副本（例如直接指向主库），视为没有延迟；
+    延迟为NULL说明复制线程未运行，返回None
+    """
+    if not rows:
+        return 0
+    status = rows[0]
+    for key in ("Seconds_Behind_Source", "Seconds_Behind_Master"):
+        if key in status:
+            return status[key]
+    return None
+
+
+class ReplicaRouter:
+    """只读副本路由
+
+    轮流选择复制延迟不超过 REPLICA_MAX_LAG 的副本，所有副本都不可用时返回None，由调用方回退到主库。
+    每个副本的延迟检查结果缓存 REPLICA_CHECK_INTERVAL 秒，同步和异步会话共用检查结果
+    """
+
+    def __init__(self, urls: List[str], max_lag: float, check_interval: float):
+        self.urls = urls
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engines = [
+            create_engine(url, pool_pre_ping=True, pool_size=10, max_overflow=20,
+                          pool_timeout=30, pool_recycle=3600, echo=DEBUG)
+            for url in urls
+        ]
+        self.async_engines = [
+            create_async_engine(to_async_url(url), pool_pre_ping=True, pool_size=10, max_overflow=20,
+                                pool_timeout=30, pool_recycle=3600, echo=DEBUG)
+            for url in urls
+        ]
+        self._healthy = [False] * len(urls)
+        self._checked_at = [float("-inf")] * len(urls)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _candidates(self) -> List[int]:
+        """本次选择的副本顺序，从轮询位置开始"""
+        first = next(self._counter) % len(self.urls)
+        return [(first + offset) % len(self.urls) for offset in range(len(self.urls))]
+
+    def _due(self, index: int) -> bool:
+        """副本是否需要重新检查；同一时间只让一个请求去检查"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at[index] < self.check_interval:
+                return False
+            self._checked_at[index] = now
+            return True
+
+    def _record(self, index: int, lag: Optional[float]) -> None:
+        """记录检查结果，状态变化时输出日志"""
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != self._healthy[index]:
+            if healthy:
+                logger.info(f"只读副本恢复使用: replica#{index}, 复制延迟 {lag} 秒")
+            else:
+                logger.warning(f"只读副本暂停使用，回退到主库: replica#{index}, 复制延迟 {lag} 秒")
+        self._healthy[index] = healthy
+
+    @staticmethod
+    def _status_rows(conn, query: str):
+        return [dict(row._mapping) for row in conn.execute(text(query))]
+
+    def _check(self, index: int) -> Optional[float]:
+        """查询副本的复制延迟，连接失败返回None"""
+        try:
+            with self.engines[index].connect() as conn:
+                if conn.dialect.name != "mysql":
+                    conn.execute(text("SELECT 1"))
+                    return 0
+                for query in REPLICA_STATUS_QUERIES:
+                    try:
+                        return _lag_from_status(self._status_rows(conn, query))
+                    except DBAPIError:
+                        continue
+                return None
+        except Exception as e:
+            logger.warning(f"检查只读副本失败: replica#{index}, 错误: {str(e)}")
+            return None
+
+    async def _check_async(self, index: int) -> Optional[float]:
+        """异步查询副本的复制延迟，连接失败返回None"""
+        try:
+            async with self.async_engines[index].connect() as conn:
+                if conn.dialect.name != "mysql":
+                    await conn.execute(text("SELECT 1"))
+                    return 0
+                for query in REPLICA_STATUS_QUERIES:
+                    try:
+                        return _lag_from_status(await conn.run_sync(self._status_rows, query))
+                    except DBAPIError:
+                        continue
+                return None
+        except Exception as e:
+            logger.warning(f"检查只读副本失败: replica#{index}, 错误: {str(e)}")
+            return None
+
+    def pick(self) -> Optional[int]:
+        """选择一个可用副本的序号，没有可用副本时返回None"""
+        for index in self._candidates():
+            if self._due(index):
+                self._record(index, self._check(index))
+            if self._healthy[index]:
+                return index
+        return None
+
+    async def pick_async(self) -> Optional[int]:
+        """pick 的异步版本"""
+        for index in self._candidates():
+            if self._due(index):
+                self._record(index, await self._check_async(index))
+            if self._healthy[index]:
+                return index
+        return None
+
+
+# 只读副本路由，未配置副本时为None
+replica_router = (
+    ReplicaRouter(DATABASE_REPLICA_URLS, REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL)
+    if DATABASE_REPLICA_URLS else None
+)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -62,3 +256,79 @@ def get_db():
             db.close()
             logger.debug("Database session closed")
 
+
+def read_session() -> Session:
+    """创建只读数据库会话，优先连接可用的只读副本，否则连接主库"""
+    index = replica_router.pick() if replica_router else None
+    if index is None:
+        return SessionLocal()
+    return SessionLocal(bind=replica_router.engines[index])
+
+
+def get_read_db():
+    """获取只读数据库会话的依赖项函数
+    用于只执行SELECT的接口：优先路由到只读副本，且不提交事务，省去一次提交往返
+    """
+    db = read_session()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {str(e)}")
+        raise
+    finally:
+        # 关闭会话时回滚只读事务
+        db.close()
+        logger.debug("Read-only database session closed")
+
+
+async def get_async_db():
+    """获取异步数据库会话的依赖项函数
+    仅用于只读接口：优先路由到只读副本，不提交事务，使用后回滚并关闭会话
+    """
+    index = await replica_router.pick_async() if replica_router else None
+    bind = async_engine if index is None else replica_router.async_engines[index]
+    async with AsyncSessionLocal(bind=bind) as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"Database error occurred: {str(e)}")
+            raise
+        finally:
+            await db.rollback()
+            logger.debug("Async database session closed")
+
+
+def ensure_indexes(*tables) -> None:
+    """为已存在的表补建模型中新增的索引
+
+    create_all 只创建缺失的表，不会给已存在的表添加索引
+    """
+    for table in tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                logger.error(f"Failed to create index {index.name}: {str(e)}")
+
+
+def ensure_columns(*tables) -> None:
+    """为已存在的表补建模型中新增的列
+
+    create_all 不会修改已存在的表；新增的列必须可为空或带有服务端默认值，
+    ALTER TABLE 只添加列，不修改已有列的类型和约束
+    """
+    inspector = inspect(engine)
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+            except SQLAlchemyError as e:
+                logger.error(f"Failed to add column {table.name}.{column.name}: {str(e)}")
@@ -0,0 +1,258 @@
+"""
+设备批量导入模块
+以流式方式解析CSV文件，预先一次性读取已存在的管理IP，校验通过的行按块批量插入。
+
+批量插入使用Core语句，不经过ORM的flush，设备汇总表和响应缓存不会被自动维护，
+导入提交后需要调用 finish_import() 重建汇总并使缓存失效。
+"""
+import codecs
+import csv
+import io
+import logging
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.services.config import DEVICE_IMPORT_CHUNK_SIZE
+from app.services.device_summary import rebuild_device_summary
+from app.services.models import Device
+from app.services.response_cache import DEVICES_NAMESPACE, invalidate
+from app.services.schemas import DeviceCreate
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 检测文件编码时读取的字节数
+_ENCODING_PROBE_SIZE = 64 * 1024
+
+# 指定编码无法解码时依次尝试的编码
+_FALLBACK_ENCODINGS = ("gbk", "latin-1")
+
+_device_table = Device.__table__
+
+
+def detect_encoding(head: bytes, encoding: str = "utf-8") -> str:
+    """根据文件开头的字节确定文件编码
+
+    优先识别BOM，其次使用指定的编码，失败后依次尝试GBK和latin-1
+
+    Args:
+        head: 文件开头的字节
+        encoding: 用户指定的编码
+
+    Returns:
+        可用于解码的编码名称
+
+    Raises:
+        ValueError: 无法解码文件内容
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    for candidate in (encoding,) + _FALLBACK_ENCODINGS:
+        try:
+            # 开头的字节可能截断在多字节字符中间，使用增量解码器且不作为结尾处理
+            codecs.getincrementaldecoder(candidate)().decode(head, final=False)
+            return candidate
+        except (UnicodeDecodeError, LookupError):
+            continue
+    raise ValueError("无法解码文件内容，请检查文件编码格式")
+
+
+def iter_csv_rows(file: BinaryIO, encoding: str = "utf-8") -> Iterator[Tuple[int, List[str]]]:
+    """逐行读取CSV文件，不将整个文件读入内存
+
+    Args:
+        file: 以二进制方式打开、可重新定位的文件对象
+        encoding: 文件编码
+
+    Yields:
+        (行号, 字段列表)，行号从1开始
+    """
+    head = file.read(_ENCODING_PROBE_SIZE)
+    file.seek(0)
+    text = io.TextIOWrapper(file, encoding=detect_encoding(head, encoding), newline="")
+    try:
+        for row_number, row in enumerate(csv.reader(text), start=1):
+            yield row_number, row
+    finally:
+        # 不随包装对象一起关闭底层文件
+        text.detach()
+
+
+def _optional(row: List[str], index: int) -> Optional[str]:
+    """可选列的值，缺失或为空时返回None"""
+    if len(row) > index:
+        return row[index].strip() or None
+    return None
+
+
+def parse_device_row(row: List[str]) -> Dict[str, Any]:
+    """将CSV行转换为设备数据并校验
+
+    CSV字段顺序：1.设备名称, 2.管理IP, 3.厂商, 4.用户名, 5.密码, 6.特权密码(可选), 7.端口(可选),
+    8.设备型号(可选), 9.软件版本(可选), 10.序列号(可选), 11.位置(可选), 12.设备类型(可选)
+
+    Raises:
+        ValueError: 缺少必需的字段或数据校验失败
+    """
+    if len(row) < 5:
+        raise ValueError("缺少必需的字段")
+
+    device_data = {
+        "name": row[0].strip() or None,
+        "management_ip": row[1].strip(),
+        "vendor": row[2].strip(),
+        "username": row[3].strip(),
+        "password": row[4].strip(),
+        "enable_password": _optional(row, 5),
+        "port": 22,  # 默认端口
+        "model": _optional(row, 7),
+        "os_version": _optional(row, 8),
+        "serial_number": _optional(row, 9),
+        "location": _optional(row, 10),
+        "device_type": _optional(row, 11)
+    }
+
+    # 如果有端口号数据，使用它
+    port = _optional(row, 6)
+    if port:
+        try:
+            device_data["port"] = int(port)
+        except ValueError:
+            pass
+
+    try:
+        return DeviceCreate(**device_data).dict()
+    except ValidationError as e:
+        raise ValueError(str(e))
+
+
+def load_existing_ips(db: Session) -> Set[str]:
+    """一次性读取所有已存在的管理IP"""
+    return set(db.execute(select(Device.management_ip)).scalars())
+
+
+class DeviceImporter:
+    """按块批量写入设备
+
+    调用方逐行调用 add_row()，每积累 chunk_size 行执行一次批量插入，最后调用 flush() 写入剩余的行。
+    所有写入都在调用方的事务中进行，由调用方决定何时提交。
+    某一块批量插入违反唯一约束时（例如导入期间其他请求新增了相同IP），该块逐行重试以定位失败的行
+    """
+
+    def __init__(self, db: Session, chunk_size: int = DEVICE_IMPORT_CHUNK_SIZE,
+                 existing_ips: Optional[Set[str]] = None):
+        self.db = db
+        self.chunk_size = chunk_size
+        # 已存在的IP和本次文件中已出现的IP
+        self.seen_ips = load_existing_ips(db) if existing_ips is None else existing_ips
+        self.total = 0
+        self.success = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+
+    def take_errors(self) -> List[Dict[str, Any]]:
+        """取出并清空已记录的行错误"""
+        errors, self.errors = self.errors, []
+        return errors
+
+    def _fail(self, row_number: int, error: str) -> None:
+        self.failed += 1
+        self.errors.append({"row": row_number, "error": error})
+        logger.debug(f"导入设备失败，行号: {row_number}, 错误: {error}")
+
+    def add_row(self, row_number: int, row: List[str]) -> None:
+        """校验一行数据，通过后加入待写入的块"""
+        self.total += 1
+        try:
+            device = parse_device_row(row)
+        except ValueError as e:
+            self._fail(row_number, str(e))
+            return
+
+        if device["management_ip"] in self.seen_ips:
+            self._fail(row_number, f"IP地址 {device['management_ip']} 已存在")
+            return
+        self.seen_ips.add(device["management_ip"])
+
+        self._pending.append((row_number, device))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """批量插入待写入的行"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            with self.db.begin_nested():
+                self.db.execute(_device_table.insert(), [device for _, device in pending])
+            self.success += len(pending)
+            return
+        except IntegrityError:
+            logger.warning(f"批量插入 {len(pending)} 台设备违反约束，改为逐行插入")
+
+        for row_number, device in pending:
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(_device_table.insert(), device)
+                self.success += 1
+            except IntegrityError as e:
+                self._fail(row_number, f"IP地址 {device['management_ip']} 已存在或数据违反约束: {e.orig}")
+
+    def result(self) -> Dict[str, Any]:
+        """导入结果，格式与原有的批量导入接口一致"""
+        return {
+            "total": self.total,
+            "success": self.success,
+            "failed": self.failed,
+            "failed_devices": self.errors
+        }
+
+
+def finish_import(db: Session) -> None:
+    """导入提交后重建设备汇总表并使设备相关缓存失效"""
+    rebuild_device_summary(db)
+    invalidate(DEVICES_NAMESPACE)
+
+
+def import_devices_csv(db: Session, file: BinaryIO, encoding: str = "utf-8") -> Dict[str, Any]:
+    """在一个事务中从CSV文件导入设备
+
+    Args:
+        db: 数据库会话
+        file: 以二进制方式打开的CSV文件
+        encoding: 文件编码
+
+    Returns:
+        导入结果，包含总行数、成功数、失败数和失败行的错误信息
+
+    Raises:
+        ValueError: 文件为空或无法解码
+    """
+    importer = DeviceImporter(db)
+    try:
+        for row_number, row in iter_csv_rows(file, encoding):
+            importer.add_row(row_number, row)
+        importer.flush()
+    except UnicodeDecodeError:
+        db.rollback()
+        raise ValueError("无法解码文件内容，请检查文件编码格式")
+    except Exception:
+        db.rollback()
+        raise
+
+    if importer.total == 0:
+        raise ValueError("CSV文件为空")
+
+    db.commit()
+    if importer.success:
+        finish_import(db)
+    logger.info(f"批量导入设备完成，总计: {importer.total}, 成功: {importer.success}, 失败: {importer.failed}")
+    return importer.result()
@@ -0,0 +1,250 @@
+"""
+设备后台导入任务模块
+上传的CSV文件先落盘，由后台线程按块导入，每块在一个事务中写入设备、行错误和进度计数，
+客户端通过任务ID轮询进度，行错误保存在 device_import_errors 表中分页读取。
+
+任务状态保存在数据库中，多个进程的后台线程通过条件更新认领任务；
+处理中的进程退出后，任务超过 DEVICE_IMPORT_STALE_SECONDS 没有进度会被其他线程接管，
+并从已提交的行号之后继续导入。
+"""
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.services.config import (
+    DEVICE_IMPORT_CHUNK_SIZE,
+    DEVICE_IMPORT_POLL_INTERVAL,
+    DEVICE_IMPORT_SPOOL_DIR,
+    DEVICE_IMPORT_STALE_SECONDS
+)
+from app.services.db import SessionLocal
+from app.services.device_import import DeviceImporter, finish_import, iter_csv_rows
+from app.services.models import DeviceImportError, DeviceImportJob
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 确保落盘目录存在
+os.makedirs(DEVICE_IMPORT_SPOOL_DIR, exist_ok=True)
+
+# 行错误信息的最大长度，与 device_import_errors.error 列一致
+_MAX_ERROR_LENGTH = 500
+
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_worker_thread: Optional[threading.Thread] = None
+
+
+def create_import_job(
+    db: Session,
+    file: BinaryIO,
+    filename: str,
+    encoding: str = "utf-8",
+    created_by: Optional[str] = None
+) -> DeviceImportJob:
+    """将上传的文件落盘并创建导入任务
+
+    Args:
+        db: 数据库会话
+        file: 以二进制方式打开的上传文件
+        filename: 原始文件名
+        encoding: 文件编码
+        created_by: 创建任务的用户
+
+    Returns:
+        新建的导入任务
+    """
+    job = DeviceImportJob(filename=filename, spool_path="", encoding=encoding, status="pending")
+    db.add(job)
+    db.flush()
+
+    spool_path = os.path.join(DEVICE_IMPORT_SPOOL_DIR, f"device_import_{job.id}.csv")
+    with open(spool_path, "wb") as spool:
+        shutil.copyfileobj(file, spool, 1024 * 1024)
+
+    job.spool_path = spool_path
+    job.file_size = os.path.getsize(spool_path)
+    job.created_by = created_by
+    db.commit()
+    db.refresh(job)
+    _wake_event.set()
+    logger.info(f"创建设备导入任务成功，ID: {job.id}, 文件: {filename}, 大小: {job.file_size} 字节")
+    return job
+
+
+def import_job_progress(job: DeviceImportJob) -> Dict[str, Any]:
+    """导入任务的进度信息"""
+    progress = 100.0 if job.status == "completed" else (
+        round(job.bytes_processed * 100 / job.file_size, 1) if job.file_size else 0.0
+    )
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "progress": progress,
+        "processed_rows": job.processed_rows,
+        "success": job.success_count,
+        "failed": job.failed_count,
+        "error_message": job.error_message,
+        "created_by": job.created_by,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+
+def _claim_next_job(db: Session) -> Optional[int]:
+    """认领一个待处理或已失去心跳的任务
+
+    通过带状态条件的UPDATE认领，多个进程同时认领同一任务时只有一个会成功
+    """
+    stale_before = datetime.now() - timedelta(seconds=DEVICE_IMPORT_STALE_SECONDS)
+    claimable = or_(
+        DeviceImportJob.status == "pending",
+        and_(DeviceImportJob.status == "running", DeviceImportJob.heartbeat_at < stale_before)
+    )
+    candidates = db.execute(
+        select(DeviceImportJob.id, DeviceImportJob.status)
+        .where(claimable)
+        .order_by(DeviceImportJob.id)
+        .limit(10)
+    ).all()
+    for job_id, job_status in candidates:
+        now = datetime.now()
+        claimed = db.execute(
+            update(DeviceImportJob)
+            .where(DeviceImportJob.id == job_id, claimable)
+            .values(
+                status="running",
+                heartbeat_at=now,
+                started_at=DeviceImportJob.started_at if job_status == "running" else now
+            )
+        ).rowcount
+        db.commit()
+        if claimed:
+            if job_status == "running":
+                logger.warning(f"接管失去心跳的设备导入任务，ID: {job_id}")
+            return job_id
+    return None
+
+
+def _checkpoint(db: Session, job: DeviceImportJob, importer: DeviceImporter,
+                processed_rows: int, bytes_processed: int) -> None:
+    """写入当前块的设备和行错误，更新进度后提交"""
+    importer.flush()
+    errors = importer.take_errors()
+    if errors:
+        db.execute(DeviceImportError.__table__.insert(), [
+            {"job_id": job.id, "row_number": error["row"], "error": error["error"][:_MAX_ERROR_LENGTH]}
+            for error in errors
+        ])
+    job.processed_rows = processed_rows
+    job.bytes_processed = bytes_processed
+    job.success_count += importer.success
+    job.failed_count += importer.failed
+    job.heartbeat_at = datetime.now()
+    importer.success = importer.failed = 0
+    db.commit()
+
+
+def run_import_job(job_id: int) -> None:
+    """处理一个已认领的导入任务
+
+    每 DEVICE_IMPORT_CHUNK_SIZE 行提交一次，重新处理时跳过已提交的行
+    """
+    db = SessionLocal()
+    try:
+        job = db.get(DeviceImportJob, job_id)
+        if job is None:
+            return
+        resume_after = job.processed_rows
+        importer = DeviceImporter(db)
+        processed_rows = resume_after
+        rows_in_chunk = 0
+        try:
+            with open(job.spool_path, "rb") as file:
+                for row_number, row in iter_csv_rows(file, job.encoding):
+                    if row_number <= resume_after:
+                        continue
+                    importer.add_row(row_number, row)
+                    processed_rows = row_number
+                    rows_in_chunk += 1
+                    if rows_in_chunk >= DEVICE_IMPORT_CHUNK_SIZE:
+                        _checkpoint(db, job, importer, processed_rows, file.tell())
+                        rows_in_chunk = 0
+                        if _stop_event.is_set():
+                            # 服务停止时交还任务，下次启动后从已提交的位置继续
+                            job.status = "pending"
+                            db.commit()
+                            logger.info(f"设备导入任务暂停，ID: {job_id}, 已处理 {processed_rows} 行")
+                            finish_import(db)
+                            return
+                _checkpoint(db, job, importer, processed_rows, job.file_size)
+            if processed_rows == 0:
+                raise ValueError("CSV文件为空")
+        except Exception as e:
+            db.rollback()
+            message = "无法解码文件内容，请检查文件编码格式" if isinstance(e, UnicodeDecodeError) else str(e)
+            job = db.get(DeviceImportJob, job_id)
+            job.status = "failed"
+            job.error_message = message[:_MAX_ERROR_LENGTH]
+            job.finished_at = datetime.now()
+            db.commit()
+            logger.error(f"设备导入任务失败，ID: {job_id}, 已处理 {job.processed_rows} 行, 错误: {message}")
+        else:
+            job.status = "completed"
+            job.finished_at = datetime.now()
+            db.commit()
+            try:
+                os.remove(job.spool_path)
+            except OSError as e:
+                logger.warning(f"删除导入文件失败，路径: {job.spool_path}, 错误: {str(e)}")
+            logger.info(
+                f"设备导入任务完成，ID: {job_id}, 共 {job.processed_rows} 行, "
+                f"成功: {job.success_count}, 失败: {job.failed_count}"
+            )
+        # 已提交的设备不论任务是否成功都需要反映到汇总表和缓存
+        if job.success_count:
+            finish_import(db)
+    finally:
+        db.close()
+
+
+def _worker_loop(interval: int) -> None:
+    while not _stop_event.is_set():
+        try:
+            db = SessionLocal()
+            try:
+                job_id = _claim_next_job(db)
+            finally:
+                db.close()
+            if job_id is not None:
+                run_import_job(job_id)
+                continue
+        except Exception as e:
+            logger.error(f"设备导入线程出错: {str(e)}")
+        _wake_event.wait(interval)
+        _wake_event.clear()
+
+
+def start_import_worker(interval: int = DEVICE_IMPORT_POLL_INTERVAL) -> None:
+    """启动后台设备导入线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, args=(interval,), name="device-import", daemon=True)
+    _worker_thread.start()
+    logger.info("设备导入线程已启动")
+
+
+def stop_import_worker() -> None:
+    """停止后台设备导入线程，正在处理的任务在下一次启动后从最近提交的位置继续"""
+    _stop_event.set()
+    _wake_event.set()
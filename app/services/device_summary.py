@@ -0,0 +1,186 @@
+"""
+设备汇总统计模块
+维护 device_summary 表：按状态、厂商、设备类型、位置统计的设备数量，
+仪表板只需一次查询读取汇总结果，不再对 devices 表做多次全表 COUNT。
+
+汇总表通过会话的 after_flush 事件增量维护，设备的新增、删除以及状态、厂商、类型、位置的变更
+都会在同一事务内转换为计数的增减（UPDATE ... SET device_count = device_count + n），
+绕过ORM的批量写入需要调用 rebuild_device_summary() 重新统计。启动时只在汇总表为空时统计一次。
+"""
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, inspect, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.services.models import Device, DeviceSummary, InterfaceStatus
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 参与汇总的设备字段
+SUMMARY_DIMENSIONS = ("status", "vendor", "device_type", "location")
+TOTAL_DIMENSION = "total"
+
+_summary_table = DeviceSummary.__table__
+
+
+def _summary_keys(values: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """一台设备对应的汇总键"""
+    return [(TOTAL_DIMENSION, "")] + [
+        (dimension, values.get(dimension) or "") for dimension in SUMMARY_DIMENSIONS
+    ]
+
+
+def _current_values(device: Device) -> Dict[str, Any]:
+    """设备各汇总字段的当前值"""
+    return {dimension: getattr(device, dimension) for dimension in SUMMARY_DIMENSIONS}
+
+
+def _previous_values(device: Device) -> Dict[str, Any]:
+    """设备各汇总字段在本次修改之前的值"""
+    state = inspect(device)
+    values = {}
+    for dimension in SUMMARY_DIMENSIONS:
+        history = state.attrs[dimension].history
+        if history.deleted:
+            values[dimension] = history.deleted[0]
+        elif history.unchanged:
+            values[dimension] = history.unchanged[0]
+        else:
+            values[dimension] = getattr(device, dimension)
+    return values
+
+
+def _upsert_delta(connection, dimension: str, key: str, delta: int):
+    """插入汇总项，已存在时在原计数上增减；并发创建同一新汇总项（如首台新厂商设备）时不会主键冲突"""
+    values = {"dimension": dimension, "key": key, "device_count": delta}
+    increment = _summary_table.c.device_count + delta
+    if connection.dialect.name == "mysql":
+        return mysql_insert(_summary_table).values(**values).on_duplicate_key_update(device_count=increment)
+    if connection.dialect.name == "postgresql":
+        statement = postgresql_insert(_summary_table).values(**values)
+    else:
+        statement = sqlite_insert(_summary_table).values(**values)
+    return statement.on_conflict_do_update(
+        index_elements=[_summary_table.c.dimension, _summary_table.c.key],
+        set_={"device_count": increment}
+    )
+
+
+def _apply_deltas(connection, deltas: Dict[Tuple[str, str], int]) -> None:
+    """将计数增减写入汇总表"""
+    for (dimension, key), delta in deltas.items():
+        if delta:
+            connection.execute(_upsert_delta(connection, dimension, key, delta))
+
+
+def collect_device_deltas(new: Iterable[Any], dirty: Iterable[Any], deleted: Iterable[Any]) -> Counter:
+    """根据会话中新增、修改、删除的对象计算汇总计数的增减"""
+    deltas: Counter = Counter()
+    for obj in new:
+        if isinstance(obj, Device):
+            deltas.update(_summary_keys(_current_values(obj)))
+    for obj in deleted:
+        if isinstance(obj, Device):
+            deltas.subtract(_summary_keys(_previous_values(obj)))
+    for obj in dirty:
+        if isinstance(obj, Device):
+            before, after = _previous_values(obj), _current_values(obj)
+            if before != after:
+                deltas.subtract(_summary_keys(before))
+                deltas.update(_summary_keys(after))
+    return deltas
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    """汇总字段的 set 监听器，注册时开启 active_history，赋值前会先加载旧值供 _previous_values 使用"""
+    return value
+
+
+for _dimension in SUMMARY_DIMENSIONS:
+    event.listen(getattr(Device, _dimension), "set", _load_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_device_summary(session: Session, flush_context) -> None:
+    """在设备写入的同一事务内更新汇总计数"""
+    deltas = collect_device_deltas(session.new, session.dirty, session.deleted)
+    if any(deltas.values()):
+        _apply_deltas(session.connection(), deltas)
+
+
+def _lock_summary(db: Session) -> None:
+    """锁定汇总表直到事务结束：其他会话的计数增减等待重建提交后再写入，
+    已写入增减但未提交的会话先提交，其设备修改能被重建时的统计读到"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"LOCK TABLE {_summary_table.name} IN SHARE ROW EXCLUSIVE MODE"))
+    else:
+        # MySQL 全表 FOR UPDATE 同时锁定索引间隙，新汇总项的插入也会等待
+        db.execute(select(_summary_table.c.dimension).with_for_update()).all()
+
+
+def rebuild_device_summary(db: Session) -> None:
+    """以一次 GROUP BY 查询重新统计设备汇总表
+
+    用于初始化、修复计数偏差，以及绕过ORM的批量写入之后；重建期间锁定汇总表，
+    与其他会话同时进行的增量维护不会丢失或重复计数
+    """
+    _lock_summary(db)
+    columns = [getattr(Device, dimension) for dimension in SUMMARY_DIMENSIONS]
+    counts: Counter = Counter()
+    for row in db.execute(select(*columns, func.count(Device.id)).group_by(*columns)):
+        values = dict(zip(SUMMARY_DIMENSIONS, row[:-1]))
+        for summary_key in _summary_keys(values):
+            counts[summary_key] += row[-1]
+
+    db.execute(delete(_summary_table))
+    if counts:
+        db.execute(_summary_table.insert(), [
+            {"dimension": dimension, "key": key, "device_count": count}
+            for (dimension, key), count in counts.items()
+        ])
+    db.commit()
+    logger.info(f"设备汇总表已重建，共 {len(counts)} 项")
+
+
+def ensure_device_summary(db: Session) -> None:
+    """汇总表为空时（首次部署）重建一次；已有数据时不重建，修复偏差需手动执行 rebuild_device_summary.py"""
+    if db.execute(select(_summary_table.c.dimension).limit(1)).first() is None:
+        rebuild_device_summary(db)
+    else:
+        db.rollback()
+
+
+def get_device_summary(db: Session) -> Dict[str, Any]:
+    """读取设备汇总结果
+
+    Returns:
+        {"total": 设备总数, "status": {...}, "vendor": {...}, "device_type": {...}, "location": {...}}，
+        各分布中空值的键为None
+    """
+    summary: Dict[str, Any] = {"total": 0}
+    summary.update({dimension: {} for dimension in SUMMARY_DIMENSIONS})
+    rows = db.execute(
+        select(DeviceSummary.dimension, DeviceSummary.key, DeviceSummary.device_count)
+        .where(DeviceSummary.device_count > 0)
+    )
+    for dimension, key, count in rows:
+        if dimension == TOTAL_DIMENSION:
+            summary["total"] = count
+        elif dimension in summary:
+            summary[dimension][key or None] = count
+    return summary
+
+
+def get_interface_status_counts(db: Session) -> Dict[Optional[str], int]:
+    """以一次 GROUP BY 查询统计各运行状态的接口数量"""
+    rows = db.execute(
+        select(InterfaceStatus.operational_status, func.count(InterfaceStatus.id))
+        .group_by(InterfaceStatus.operational_status)
+    )
+    return {status: count for status, count in rows}
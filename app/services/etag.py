@@ -0,0 +1,116 @@
+"""
+ETag与条件请求模块
+只追加的列表（如配置备份）的ETag由 COUNT、MAX(id) 等廉价的聚合值和请求参数计算；可修改的设备列表
+由结果集中按ID排序的 (id, row_version) 摘要计算，只读取两个整数列。备份文件的ETag直接使用
+已保存的SHA-256哈希，请求头 If-None-Match 与之匹配时返回304，不再查询完整结果、序列化或传输响应体。
+备份文件创建后不会修改，同时以创建时间作为 Last-Modified，支持只带 If-Modified-Since 的客户端。
+
+没有廉价版本信息的接口（如仪表板统计）可以使用 ConditionalRoute：按响应体的哈希生成ETag，
+只节省传输，不节省计算，这类接口本身已有响应缓存。
+"""
+import calendar
+import hashlib
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+
+def make_etag(*parts: Any) -> str:
+    """由版本信息生成强ETag（带引号）"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def rows_digest(rows: Iterable[Iterable[Any]]) -> str:
+    """按顺序计算查询结果行的摘要，任一行的增删或取值变化都会改变摘要"""
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(("|".join(str(value) for value in row) + "\n").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def hash_etag(content_hash: str) -> str:
+    """由已保存的内容哈希（如 Config.hash）生成强ETag"""
+    return f'"{content_hash}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """请求头 If-None-Match 是否与ETag匹配
+
+    If-None-Match 使用弱比较，忽略 W/ 前缀；"*" 匹配任意ETag
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def http_date(value: datetime) -> str:
+    """把UTC时间格式化为HTTP日期（如 Last-Modified 的值）"""
+    return formatdate(calendar.timegm(value.utctimetuple()), usegmt=True)
+
+
+def not_modified_since(request: Request, last_modified: datetime) -> bool:
+    """资源自请求头 If-Modified-Since 的时间以来是否没有修改
+
+    按HTTP规范，请求带有 If-None-Match 时忽略 If-Modified-Since
+
+    Args:
+        request: 当前请求
+        last_modified: 资源的修改时间（UTC，不带时区）
+    """
+    header = request.headers.get("if-modified-since")
+    if not header or request.headers.get("if-none-match"):
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    # HTTP日期只精确到秒
+    return calendar.timegm(last_modified.utctimetuple()) <= calendar.timegm(since.utctimetuple())
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    """304响应，只带ETag等响应头"""
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+
+class ConditionalRoute(APIRoute):
+    """为GET请求的JSON响应自动添加基于响应体哈希的ETag，并处理 If-None-Match
+
+    接口自行设置了ETag的响应不做处理
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def conditional_handler(request: Request) -> Response:
+            response = await handler(request)
+            if (
+                request.method != "GET"
+                or response.status_code != 200
+                or "etag" in response.headers
+                or not isinstance(getattr(response, "body", None), bytes)
+            ):
+                return response
+            # 同一资源的JSON和MessagePack表示使用不同的ETag
+            etag = make_etag(response.media_type, hashlib.sha256(response.body).hexdigest())
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response.headers["ETag"] = etag
+            return response
+
+        return conditional_handler
@@ -0,0 +1,107 @@
+"""
+流式导出模块
+以服务端游标分批读取查询结果，逐批编码为CSV或NDJSON写入 StreamingResponse，
+内存占用与导出的行数无关，第一批数据读出后即开始发送。
+
+导出使用独立的只读会话，不依赖请求的数据库会话：响应体在接口函数返回之后才开始生成。
+"""
+import csv
+import io
+import logging
+from datetime import date, datetime
+from typing import Any, Iterator, List
+from urllib.parse import quote
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+from app.services.config import EXPORT_BATCH_SIZE
+from app.services.db import read_session
+from app.services.responses import json_default
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 支持的导出格式及其媒体类型
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+# 导出格式参数的校验规则
+EXPORT_FORMAT_PATTERN = "^(" + "|".join(EXPORT_FORMATS) + ")$"
+
+
+def _plain_value(value: Any) -> Any:
+    """将查询结果中的值转换为可直接编码的值"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(columns: List[str], rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if value is None else _plain_value(value) for value in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(columns: List[str], rows) -> bytes:
+    return b"".join(
+        orjson.dumps(dict(zip(columns, row)), default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+
+def stream_rows(statement, export_format: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """按批读取查询结果并编码
+
+    Args:
+        statement: select() 语句，列名即导出的字段名
+        export_format: csv 或 ndjson
+        batch_size: 每批从服务端游标读取的行数
+
+    Yields:
+        每批编码后的字节
+    """
+    db = read_session()
+    try:
+        # yield_per 启用服务端游标（stream_results），逐批取回结果
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        columns = list(result.keys())
+        exported = 0
+        if export_format == "csv":
+            # UTF-8 BOM 便于Excel识别编码，批量导入也能识别
+            yield b"\xef\xbb\xbf" + _encode_csv(columns, [], header=True)
+        for rows in result.partitions():
+            exported += len(rows)
+            if export_format == "csv":
+                yield _encode_csv(columns, rows, header=False)
+            else:
+                yield _encode_ndjson(columns, rows)
+        logger.info(f"导出完成，共 {exported} 行")
+    except Exception as e:
+        # 响应头已经发出，只能记录日志并中断响应
+        logger.error(f"导出失败: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+def export_response(statement, export_format: str, filename: str) -> StreamingResponse:
+    """创建流式导出响应
+
+    Args:
+        statement: select() 语句
+        export_format: csv 或 ndjson
+        filename: 下载文件名（不含扩展名）
+    """
+    full_name = f"{filename}.{export_format}"
+    return StreamingResponse(
+        stream_rows(statement, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(full_name)}"}
+    )
@@ -0,0 +1,298 @@
+"""
+指标分析模块
+将样本加载为NumPy数组，以向量化方式完成分桶、速率计算、百分位和跨设备汇总。
+
+序列键将 (device_id, interface_id) 编码为一个 int64：device_id << 32 | interface_id，
+分组时只需对整数数组排序。所有汇总结果以 SeriesBuckets 表示，每个字段是等长的数组，
+一行对应一条序列的一个时间桶。
+"""
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from app.services.config import METRICS_COLLECT_INTERVAL
+from app.services.metrics_store import COUNTER_METRICS, metric_id, raw_samples
+
+# 序列键中接口键所占的位数
+_INTERFACE_BITS = 32
+
+
+class SeriesBuckets(NamedTuple):
+    """按 (序列, 时间桶) 分组的汇总结果，按序列键和时间桶起点排序"""
+    series: np.ndarray  # 序列键，int64
+    bucket: np.ndarray  # 时间桶起点，int64
+    count: np.ndarray
+    sum: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    avg: np.ndarray
+    last: np.ndarray
+    p95: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.bucket)
+
+
+def encode_series(device_ids, interface_ids) -> np.ndarray:
+    """将设备键和接口键编码为序列键"""
+    return (np.asarray(device_ids, dtype=np.int64) << _INTERFACE_BITS) | np.asarray(interface_ids, dtype=np.int64)
+
+
+def decode_series(series: np.ndarray):
+    """将序列键解码为 (device_ids, interface_ids)"""
+    return series >> _INTERFACE_BITS, series & ((1 << _INTERFACE_BITS) - 1)
+
+
+def empty_buckets() -> SeriesBuckets:
+    """空的汇总结果"""
+    ints = np.empty(0, dtype=np.int64)
+    floats = np.empty(0, dtype=np.float64)
+    return SeriesBuckets(ints, ints, floats, floats, floats, floats, floats, floats, floats)
+
+
+def concat_buckets(parts: List[SeriesBuckets]) -> SeriesBuckets:
+    """拼接多个汇总结果"""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return empty_buckets()
+    return SeriesBuckets(*(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def _reduce(
+    series: np.ndarray,
+    bucket: np.ndarray,
+    ts: np.ndarray,
+    value: np.ndarray,
+    total: np.ndarray,
+    low: np.ndarray,
+    high: np.ndarray,
+    last: np.ndarray,
+    weight: np.ndarray,
+    p95: Optional[np.ndarray] = None,
+    last_mode: str = "last"
+) -> SeriesBuckets:
+    """按 (序列, 时间桶) 分组归约
+
+    Args:
+        value: 参与平均值（按 weight 加权）和95百分位计算的值
+        total: 求和的值
+        low/high: 求最小值/最大值的值
+        last: 取组内最后一个（last_mode="last"）、求和（"sum"）或求平均（"mean"）的值
+        weight: 权重，同时作为组内的样本数
+        p95: 已有的95百分位，组内只有一个元素时直接沿用
+
+    Returns:
+        汇总结果
+    """
+    if len(bucket) == 0:
+        return empty_buckets()
+
+    order = np.lexsort((ts, bucket, series))
+    series, bucket = series[order], bucket[order]
+    value, total, low, high, last, weight = (
+        value[order], total[order], low[order], high[order], last[order], weight[order]
+    )
+
+    change = (series[1:] != series[:-1]) | (bucket[1:] != bucket[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    ends = np.append(starts[1:], len(bucket))
+    lengths = ends - starts
+
+    count = np.add.reduceat(weight, starts)
+    weighted = np.add.reduceat(value * weight, starts)
+    avg = np.divide(weighted, count, out=np.zeros(len(starts)), where=count > 0)
+
+    if last_mode == "sum":
+        last_values = np.add.reduceat(last, starts)
+    elif last_mode == "mean":
+        last_values = np.add.reduceat(last, starts) / lengths
+    else:
+        last_values = last[ends - 1]
+
+    # 最近秩法：组内按值排序后取第 ceil(0.95*n) 个
+    group = np.repeat(np.arange(len(starts)), lengths)
+    ranked = value[np.lexsort((value, group))]
+    p95_values = ranked[starts + np.ceil(0.95 * lengths).astype(np.int64) - 1]
+    if p95 is not None:
+        p95_values = np.where(lengths == 1, p95[order][starts], p95_values)
+
+    return SeriesBuckets(
+        series=series[starts],
+        bucket=bucket[starts],
+        count=count,
+        sum=np.add.reduceat(total, starts),
+        min=np.minimum.reduceat(low, starts),
+        max=np.maximum.reduceat(high, starts),
+        avg=avg,
+        last=last_values,
+        p95=p95_values
+    )
+
+
+def derive_rates(series: np.ndarray, ts: np.ndarray, values: np.ndarray):
+    """由计数器样本计算每秒速率
+
+    相邻两个样本之间的差值归属于后一个样本的时间点，计数器回绕或设备重启导致的负差值会被丢弃
+
+    Returns:
+        (series, ts, rates, deltas)
+    """
+    order = np.lexsort((ts, series))
+    series, ts, values = series[order], ts[order], values[order]
+    dt = np.diff(ts)
+    dv = np.diff(values)
+    valid = (series[1:] == series[:-1]) & (dt > 0) & (dv >= 0)
+    return series[1:][valid], ts[1:][valid], dv[valid] / dt[valid], dv[valid]
+
+
+def bucket_samples(
+    series: np.ndarray,
+    ts: np.ndarray,
+    values: np.ndarray,
+    is_counter: bool,
+    bucket_seconds: int,
+    start_ts: int,
+    end_ts: int
+) -> SeriesBuckets:
+    """将原始样本汇总到时间桶
+
+    量值型指标直接汇总样本值；计数器型指标汇总每秒速率，sum 为时间桶内的计数器增量。
+    计数器型指标的输入应包含窗口起点之前的样本，用于求出窗口内的第一个速率
+
+    Args:
+        series: 序列键
+        ts: 样本时间
+        values: 样本值
+        is_counter: 是否为计数器型指标
+        bucket_seconds: 时间桶宽度（秒）
+        start_ts: 窗口起点（含）
+        end_ts: 窗口终点（不含）
+
+    Returns:
+        汇总结果
+    """
+    if is_counter:
+        series, ts, values, totals = derive_rates(series, ts, values)
+    else:
+        totals = values
+    window = (ts >= start_ts) & (ts < end_ts)
+    series, ts, values, totals = series[window], ts[window], values[window], totals[window]
+    return _reduce(
+        series, ts - ts % bucket_seconds, ts,
+        value=values, total=totals, low=values, high=values, last=values,
+        weight=np.ones(len(values))
+    )
+
+
+def merge_buckets(buckets: SeriesBuckets, bucket_seconds: int) -> SeriesBuckets:
+    """将细粒度时间桶合并为 bucket_seconds 宽度的粗粒度时间桶
+
+    avg 按样本数加权；p95 取各子时间桶平均值的95百分位（即常用的“5分钟均值95计费值”），
+    只有一个子时间桶时沿用其原有的p95
+    """
+    return _reduce(
+        buckets.series, buckets.bucket - buckets.bucket % bucket_seconds, buckets.bucket,
+        value=buckets.avg, total=buckets.sum, low=buckets.min, high=buckets.max, last=buckets.last,
+        weight=buckets.count, p95=buckets.p95
+    )
+
+
+def fleet_buckets(buckets: SeriesBuckets, is_counter: bool, fleet_series: int = 0) -> SeriesBuckets:
+    """将同一时间桶内所有序列的汇总结果合并为全网汇总
+
+    count 为序列数，sum 为各序列之和（计数器型即全网总字节数），avg/p95 为各序列平均值的均值和95百分位，
+    last 对计数器型为全网当前总速率，对量值型为各序列最新值的均值
+    """
+    return _reduce(
+        np.full(len(buckets), fleet_series, dtype=np.int64), buckets.bucket, buckets.series,
+        value=buckets.avg, total=buckets.sum, low=buckets.min, high=buckets.max, last=buckets.last,
+        weight=np.ones(len(buckets)), last_mode="sum" if is_counter else "mean"
+    )
+
+
+def load_raw_samples(conn, metric: str, start_ts: int, end_ts: int, device_ids: Optional[List[int]] = None):
+    """读取原始样本为数组（走 (metric, ts) 索引）
+
+    计数器型指标会额外读取窗口起点之前两个采集周期的样本
+
+    Returns:
+        (series, ts, values)
+    """
+    code = metric_id(metric)
+    lookback = 2 * METRICS_COLLECT_INTERVAL if metric in COUNTER_METRICS else 0
+    chunks = []
+    for table in raw_samples.for_range(start_ts - lookback, end_ts):
+        query = select(table.c.device_id, table.c.interface_id, table.c.ts, table.c.value).where(
+            table.c.metric == code,
+            table.c.ts >= start_ts - lookback,
+            table.c.ts < end_ts
+        )
+        if device_ids is not None:
+            query = query.where(table.c.device_id.in_(device_ids))
+        rows = conn.execute(query).all()
+        if rows:
+            chunks.append(np.array(rows, dtype=np.float64))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    data = np.concatenate(chunks)
+    ids = data[:, :3].astype(np.int64)
+    return encode_series(ids[:, 0], ids[:, 1]), ids[:, 2], data[:, 3]
+
+
+def raw_buckets(
+    conn,
+    metric: str,
+    start_ts: int,
+    end_ts: int,
+    bucket_seconds: int,
+    device_ids: Optional[List[int]] = None
+) -> SeriesBuckets:
+    """直接由原始样本计算逐条序列的时间桶汇总"""
+    series, ts, values = load_raw_samples(conn, metric, start_ts, end_ts, device_ids)
+    return bucket_samples(series, ts, values, metric in COUNTER_METRICS, bucket_seconds, start_ts, end_ts)
+
+
+def latest_average(conn, metric: str, start_ts: int, end_ts: int) -> Optional[float]:
+    """计算时间范围内各序列最新样本值的平均值，例如全网当前CPU使用率
+
+    Returns:
+        平均值，时间范围内没有样本时返回None
+    """
+    series, ts, values = load_raw_samples(conn, metric, start_ts, end_ts)
+    if len(series) == 0:
+        return None
+    order = np.lexsort((ts, series))
+    series, values = series[order], values[order]
+    is_last = np.append(series[1:] != series[:-1], True)
+    return float(values[is_last].mean())
+
+
+def fill_series(
+    buckets: SeriesBuckets,
+    field: str,
+    start_ts: int,
+    end_ts: int,
+    bucket_seconds: int,
+    scale: float = 1
+) -> List[float]:
+    """将单条序列的汇总结果展开为连续的时间桶取值，缺失的时间桶补0
+
+    Args:
+        buckets: 单条序列（如全网汇总序列）的汇总结果
+        field: 取值字段，如 avg、sum、p95
+        start_ts: 起始时间，应与 bucket_seconds 对齐
+        end_ts: 结束时间
+        bucket_seconds: 时间桶宽度
+        scale: 取值除以的换算系数
+
+    Returns:
+        与 bucket_starts(start_ts, end_ts, bucket_seconds) 一一对应、保留两位小数的取值列表
+    """
+    first = start_ts - start_ts % bucket_seconds
+    size = len(range(first, end_ts, bucket_seconds))
+    filled = np.zeros(size)
+    index = (buckets.bucket - first) // bucket_seconds
+    valid = (index >= 0) & (index < size)
+    filled[index[valid]] = getattr(buckets, field)[valid] / scale
+    return np.round(filled, 2).tolist()
@@ -0,0 +1,253 @@
+"""
+指标采集模块
+周期性地通过SNMP批量读取所有在线设备的接口计数器，并轮询设备的CPU和内存使用率，写入指标时序存储
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.adapters.snmp import SNMPAdapter
+from app.services.adapter_manager import AdapterManager
+from app.services.config import (
+    HEALTH_POLL_INTERVAL,
+    HEALTH_POLL_WORKERS,
+    METRICS_COLLECT_INTERVAL,
+    SNMP_COMMUNITY
+)
+from app.services.db import SessionLocal
+from app.services.metrics_store import DEVICE_LEVEL_INTERFACE_ID, metric_writer, resolve_interface_ids
+from app.services.models import Device
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+_collector_thread: Optional[threading.Thread] = None
+_health_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+# 每台设备上次成功采集CPU/内存的方式：snmp 或 cli，下次直接使用，避免重复探测
+_health_methods: Dict[int, str] = {}
+
+
+def collect_interface_counters(db: Session, device: Device) -> int:
+    """采集单台设备的接口计数器
+
+    Args:
+        db: 数据库会话
+        device: 设备对象
+
+    Returns:
+        写入缓冲区的样本数量
+    """
+    adapter = SNMPAdapter({
+        'management_ip': device.management_ip,
+        'vendor': 'snmp',
+        'snmp_community': SNMP_COMMUNITY
+    })
+    try:
+        counters = adapter.get_interface_counters()
+    finally:
+        adapter.disconnect()
+
+    if not counters:
+        return 0
+
+    ts = int(time.time())
+    interface_ids = resolve_interface_ids(db, device.id, counters.keys())
+    count = 0
+    for interface_name, values in counters.items():
+        for metric, value in values.items():
+            metric_writer.add(device.id, interface_ids[interface_name], metric, value, ts)
+            count += 1
+    return count
+
+
+def collect_all_interface_counters() -> int:
+    """采集所有在线设备的接口计数器
+
+    Returns:
+        本轮采集的样本总数
+    """
+    db = SessionLocal()
+    total = 0
+    try:
+        devices = db.query(Device).filter(Device.status == "online").all()
+        for device in devices:
+            try:
+                total += collect_interface_counters(db, device)
+            except Exception as e:
+                logger.warning(f"采集接口计数器失败，设备ID: {device.id}, 错误: {str(e)}")
+        db.commit()
+        metric_writer.flush()
+        logger.info(f"接口计数器采集完成，设备数: {len(devices)}, 样本数: {total}")
+        return total
+    except Exception as e:
+        db.rollback()
+        logger.error(f"接口计数器采集失败: {str(e)}")
+        return total
+    finally:
+        db.close()
+
+
+def record_device_health(device_id: int, health: Dict[str, Any], ts: Optional[int] = None) -> int:
+    """将CPU/内存使用率写入指标缓冲区
+
+    Args:
+        device_id: 设备ID
+        health: 包含 cpu_usage 和/或 memory_usage 的字典
+        ts: UTC纪元秒，默认为当前时间
+
+    Returns:
+        写入缓冲区的样本数量
+    """
+    count = 0
+    for metric in ("cpu_usage", "memory_usage"):
+        value = health.get(metric)
+        if value is not None:
+            metric_writer.add(device_id, DEVICE_LEVEL_INTERFACE_ID, metric, value, ts)
+            count += 1
+    return count
+
+
+def _poll_health_snmp(device_info: Dict[str, Any]) -> Dict[str, float]:
+    """通过SNMP HOST-RESOURCES-MIB读取CPU和内存使用率"""
+    adapter = SNMPAdapter({
+        'management_ip': device_info['management_ip'],
+        'vendor': 'snmp',
+        'snmp_community': SNMP_COMMUNITY
+    })
+    try:
+        return adapter.get_health()
+    finally:
+        adapter.disconnect()
+
+
+def _poll_health_cli(device_info: Dict[str, Any]) -> Dict[str, float]:
+    """登录设备执行CPU和内存查看命令读取使用率"""
+    adapter = AdapterManager.get_adapter(device_info)
+    try:
+        return adapter.get_health()
+    finally:
+        adapter.disconnect()
+
+
+def poll_device_health(device_info: Dict[str, Any]) -> Dict[str, float]:
+    """采集单台设备的CPU和内存使用率
+
+    优先使用无需登录的SNMP，设备不支持HOST-RESOURCES-MIB时再通过CLI采集，
+    成功的方式会被记住，之后的轮询直接使用
+
+    Args:
+        device_info: 设备连接信息，包含 id、management_ip、vendor、username、password 等
+
+    Returns:
+        包含 cpu_usage 和/或 memory_usage 的字典
+    """
+    device_id = device_info['id']
+    method = _health_methods.get(device_id)
+
+    if method != "cli":
+        try:
+            health = _poll_health_snmp(device_info)
+            if health:
+                _health_methods[device_id] = "snmp"
+                return health
+        except Exception as e:
+            logger.debug(f"SNMP采集CPU/内存失败，设备ID: {device_id}, 错误: {str(e)}")
+
+    if not AdapterManager.is_vendor_supported(device_info['vendor']):
+        return {}
+    health = _poll_health_cli(device_info)
+    if health:
+        _health_methods[device_id] = "cli"
+    return health
+
+
+def collect_all_device_health() -> int:
+    """并发采集所有在线设备的CPU和内存使用率
+
+    Returns:
+        本轮采集的样本总数
+    """
+    db = SessionLocal()
+    try:
+        devices: List[Dict[str, Any]] = [
+            {
+                'id': device.id,
+                'management_ip': device.management_ip,
+                'vendor': device.vendor,
+                'username': device.username,
+                'password': device.password,
+                'enable_password': device.enable_password,
+                'port': device.port
+            }
+            for device in db.query(Device).filter(Device.status == "online").all()
+        ]
+    finally:
+        db.close()
+
+    def poll(device_info: Dict[str, Any]) -> int:
+        try:
+            return record_device_health(device_info['id'], poll_device_health(device_info), int(time.time()))
+        except Exception as e:
+            logger.warning(f"采集CPU/内存失败，设备ID: {device_info['id']}, 错误: {str(e)}")
+            return 0
+
+    total = 0
+    if devices:
+        with ThreadPoolExecutor(max_workers=min(HEALTH_POLL_WORKERS, len(devices))) as executor:
+            total = sum(executor.map(poll, devices))
+    metric_writer.flush()
+    logger.info(f"CPU/内存采集完成，设备数: {len(devices)}, 样本数: {total}")
+    return total
+
+
+def _collector_loop(interval: int) -> None:
+    """后台接口计数器采集循环"""
+    while not _stop_event.is_set():
+        started = time.monotonic()
+        collect_all_interface_counters()
+        _stop_event.wait(max(0, interval - (time.monotonic() - started)))
+
+
+def _health_loop(interval: int) -> None:
+    """后台CPU/内存采集循环"""
+    while not _stop_event.is_set():
+        started = time.monotonic()
+        try:
+            collect_all_device_health()
+        except Exception as e:
+            logger.error(f"CPU/内存采集失败: {str(e)}")
+        _stop_event.wait(max(0, interval - (time.monotonic() - started)))
+
+
+def start_interface_collector(interval: int = METRICS_COLLECT_INTERVAL) -> None:
+    """启动后台接口计数器采集线程"""
+    global _collector_thread
+    if _collector_thread and _collector_thread.is_alive():
+        return
+    _stop_event.clear()
+    _collector_thread = threading.Thread(target=_collector_loop, args=(interval,), name="interface-collector", daemon=True)
+    _collector_thread.start()
+    logger.info(f"接口计数器采集线程已启动，采集周期: {interval} 秒")
+
+
+def start_health_poller(interval: int = HEALTH_POLL_INTERVAL) -> None:
+    """启动后台CPU/内存采集线程"""
+    global _health_thread
+    if _health_thread and _health_thread.is_alive():
+        return
+    _stop_event.clear()
+    _health_thread = threading.Thread(target=_health_loop, args=(interval,), name="health-poller", daemon=True)
+    _health_thread.start()
+    logger.info(f"CPU/内存采集线程已启动，采集周期: {interval} 秒")
+
+
+def stop_interface_collector() -> None:
+    """停止后台采集线程，并写出缓冲区中剩余的样本"""
+    _stop_event.set()
+    metric_writer.flush()
@@ -0,0 +1,435 @@
+"""
+指标汇总与保留模块
+将原始样本增量汇总为5分钟、1小时、1天三种精度，按精度分别保留，并为查询自动选择合适的精度。
+
+汇总链路：原始样本 -> 5m（按天分区）-> 1h（按月分区）-> 1d（按年分区）。
+每种精度记录一个水位线（metric_rollup_state），每次只汇总水位线之后已经完整的时间桶。
+每个时间桶保存 count/sum/min/max/avg/last/p95：
+- 量值型指标（CPU、内存）直接汇总样本值；
+- 计数器型指标（接口字节数）先由相邻样本求出每秒速率再汇总，sum 为时间桶内的计数器增量。
+除逐条序列外，还会为每个指标维护一条全网汇总序列（device_id=0, interface_id=0），
+仪表板上的全网曲线只需读取这一条序列，24小时的5分钟精度曲线只有288行。
+分桶、速率和百分位计算由 metrics_analytics 以NumPy数组完成。
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import Column, Float, Index, Integer, SmallInteger, func, select
+from sqlalchemy.orm import Session
+
+from app.services.config import (
+    METRICS_1D_RETENTION_DAYS,
+    METRICS_1H_RETENTION_DAYS,
+    METRICS_5M_RETENTION_DAYS,
+    METRICS_BATCH_SIZE,
+    METRICS_COLLECT_INTERVAL,
+    METRICS_MAX_POINTS,
+    METRICS_RAW_RETENTION_DAYS,
+    METRICS_ROLLUP_GRACE,
+    METRICS_ROLLUP_INTERVAL
+)
+from app.services.db import engine
+from app.services.metrics_analytics import (
+    SeriesBuckets,
+    concat_buckets,
+    decode_series,
+    encode_series,
+    fleet_buckets,
+    merge_buckets,
+    raw_buckets
+)
+from app.services.metrics_store import (
+    COUNTER_METRICS,
+    METRIC_IDS,
+    PartitionedTable,
+    insert_ignore,
+    metric_id,
+    raw_samples
+)
+from app.services.models import MetricRollupState
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 全网汇总序列使用的设备键和接口键
+FLEET_DEVICE_ID = 0
+FLEET_INTERFACE_ID = 0
+
+# 各汇总精度：时间桶宽度、数据来源、保留天数、每次汇总处理的时间桶数量
+ROLLUP_RESOLUTIONS = {
+    "5m": {"seconds": 300, "source": "raw", "retention_days": METRICS_5M_RETENTION_DAYS, "window": 12},
+    "1h": {"seconds": 3600, "source": "5m", "retention_days": METRICS_1H_RETENTION_DAYS, "window": 24},
+    "1d": {"seconds": 86400, "source": "1h", "retention_days": METRICS_1D_RETENTION_DAYS, "window": 31},
+}
+
+_worker_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+
+def _rollup_columns(name: str) -> List[Any]:
+    """汇总分区表的列定义"""
+    return [
+        Column("device_id", Integer, primary_key=True, autoincrement=False),
+        Column("interface_id", Integer, primary_key=True, autoincrement=False),
+        Column("metric", SmallInteger, primary_key=True, autoincrement=False),
+        Column("ts", Integer, primary_key=True, autoincrement=False),  # 时间桶起点
+        Column("sample_count", Integer, nullable=False),
+        Column("value_sum", Float(precision=53), nullable=False),
+        Column("value_min", Float(precision=53), nullable=False),
+        Column("value_max", Float(precision=53), nullable=False),
+        Column("value_avg", Float(precision=53), nullable=False),
+        Column("value_last", Float(precision=53), nullable=False),
+        Column("value_p95", Float(precision=53), nullable=False),
+        Index(f"ix_{name}_metric_ts", "metric", "ts"),
+    ]
+
+
+rollup_tables = {
+    "5m": PartitionedTable("metric_rollup_5m", "day", _rollup_columns),
+    "1h": PartitionedTable("metric_rollup_1h", "month", _rollup_columns),
+    "1d": PartitionedTable("metric_rollup_1d", "year", _rollup_columns),
+}
+
+
+def _source_tables(resolution: str) -> PartitionedTable:
+    """获取汇总精度的数据来源分区集合"""
+    source = ROLLUP_RESOLUTIONS[resolution]["source"]
+    return raw_samples if source == "raw" else rollup_tables[source]
+
+
+# ===== 汇总行转换 =====
+
+def _to_rows(buckets: SeriesBuckets, metric: int) -> List[Dict[str, Any]]:
+    """汇总结果转换为汇总表的行"""
+    device_ids, interface_ids = decode_series(buckets.series)
+    columns = zip(
+        device_ids.tolist(), interface_ids.tolist(), buckets.bucket.tolist(), buckets.count.tolist(),
+        buckets.sum.tolist(), buckets.min.tolist(), buckets.max.tolist(), buckets.avg.tolist(),
+        buckets.last.tolist(), buckets.p95.tolist()
+    )
+    return [
+        {
+            "device_id": device_id,
+            "interface_id": interface_id,
+            "metric": metric,
+            "ts": ts,
+            "sample_count": int(count),
+            "value_sum": total,
+            "value_min": low,
+            "value_max": high,
+            "value_avg": avg,
+            "value_last": last,
+            "value_p95": p95,
+        }
+        for device_id, interface_id, ts, count, total, low, high, avg, last, p95 in columns
+    ]
+
+
+def _load_rollups(
+    conn,
+    tables: PartitionedTable,
+    metric: int,
+    start_ts: int,
+    end_ts: int,
+    fleet_only: bool = False
+) -> SeriesBuckets:
+    """读取汇总表中的行为数组，fleet_only 时只读取全网汇总序列（主键前缀范围扫描）"""
+    parts = []
+    for table in tables.for_range(start_ts, end_ts):
+        query = select(
+            table.c.device_id, table.c.interface_id, table.c.ts, table.c.sample_count, table.c.value_sum,
+            table.c.value_min, table.c.value_max, table.c.value_avg, table.c.value_last, table.c.value_p95
+        ).where(
+            table.c.metric == metric,
+            table.c.ts >= start_ts,
+            table.c.ts < end_ts
+        )
+        if fleet_only:
+            query = query.where(
+                table.c.device_id == FLEET_DEVICE_ID,
+                table.c.interface_id == FLEET_INTERFACE_ID
+            )
+        rows = conn.execute(query).all()
+        if not rows:
+            continue
+        data = np.array(rows, dtype=np.float64)
+        ids = data[:, :3].astype(np.int64)
+        parts.append(SeriesBuckets(encode_series(ids[:, 0], ids[:, 1]), ids[:, 2], *data[:, 3:].T))
+    return concat_buckets(parts)
+
+
+def get_watermark(conn, resolution: str) -> Optional[int]:
+    """获取汇总精度的水位线，尚未汇总过时返回None"""
+    return conn.execute(
+        select(MetricRollupState.watermark).where(MetricRollupState.resolution == resolution)
+    ).scalar()
+
+
+def _set_watermark(conn, resolution: str, watermark: int) -> None:
+    """更新汇总精度的水位线"""
+    state = MetricRollupState.__table__
+    result = conn.execute(
+        state.update().where(state.c.resolution == resolution).values(watermark=watermark, updated_at=func.now())
+    )
+    if result.rowcount == 0:
+        conn.execute(state.insert().values(resolution=resolution, watermark=watermark))
+
+
+# ===== 增量汇总 =====
+
+def _rollup_from_raw(conn, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+    """由原始样本生成5分钟精度的汇总行（含全网汇总序列）"""
+    bucket_seconds = ROLLUP_RESOLUTIONS["5m"]["seconds"]
+    rows = []
+    for metric, code in METRIC_IDS.items():
+        buckets = raw_buckets(conn, metric, start_ts, end_ts, bucket_seconds)
+        rows += _to_rows(buckets, code)
+        rows += _to_rows(fleet_buckets(buckets, metric in COUNTER_METRICS), code)
+    return rows
+
+
+def _rollup_from_child(conn, resolution: str, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+    """由更细一级的汇总生成当前精度的汇总行（全网汇总序列随之一并合并）"""
+    bucket_seconds = ROLLUP_RESOLUTIONS[resolution]["seconds"]
+    source = _source_tables(resolution)
+    rows = []
+    for code in METRIC_IDS.values():
+        children = _load_rollups(conn, source, code, start_ts, end_ts)
+        rows += _to_rows(merge_buckets(children, bucket_seconds), code)
+    return rows
+
+
+def _rollup_upper_bound(conn, resolution: str, now: int) -> Optional[int]:
+    """计算本次可以汇总到的时间上界（只汇总完整的时间桶）"""
+    seconds = ROLLUP_RESOLUTIONS[resolution]["seconds"]
+    source = ROLLUP_RESOLUTIONS[resolution]["source"]
+    if source == "raw":
+        limit = now - METRICS_ROLLUP_GRACE
+    else:
+        limit = get_watermark(conn, source)
+        if limit is None:
+            return None
+    return limit - limit % seconds
+
+
+def rollup_resolution(resolution: str, now: Optional[int] = None) -> int:
+    """将一种精度的汇总推进到最新的完整时间桶
+
+    Args:
+        resolution: 汇总精度，5m/1h/1d
+        now: 当前时间，默认为系统时间
+
+    Returns:
+        写入的汇总行数
+    """
+    now = int(now if now is not None else time.time())
+    spec = ROLLUP_RESOLUTIONS[resolution]
+    seconds = spec["seconds"]
+    tables = rollup_tables[resolution]
+
+    with engine.connect() as conn:
+        watermark = get_watermark(conn, resolution)
+        upper = _rollup_upper_bound(conn, resolution, now)
+    if watermark is None:
+        # 首次汇总从数据来源最早的分区开始
+        watermark = _source_tables(resolution).earliest_start()
+        if watermark is None:
+            return 0
+        watermark -= watermark % seconds
+    if upper is None or watermark >= upper:
+        return 0
+
+    written = 0
+    while watermark < upper:
+        window_end = min(watermark + spec["window"] * seconds, upper)
+
+        # 分区表需在写事务开始前创建
+        ts = tables.start_of(watermark)
+        while ts < window_end:
+            tables.ensure(ts)
+            ts = tables.next_start(ts)
+
+        # 读取、汇总、写入和推进水位线在同一事务内完成，中途失败不会重复或遗漏时间桶
+        with engine.begin() as conn:
+            if spec["source"] == "raw":
+                rows = _rollup_from_raw(conn, watermark, window_end)
+            else:
+                rows = _rollup_from_child(conn, resolution, watermark, window_end)
+            by_partition: Dict[int, List[Dict[str, Any]]] = {}
+            for row in rows:
+                by_partition.setdefault(tables.start_of(row["ts"]), []).append(row)
+            for partition, partition_rows in by_partition.items():
+                stmt = insert_ignore(tables.ensure(partition))
+                for i in range(0, len(partition_rows), METRICS_BATCH_SIZE):
+                    conn.execute(stmt, partition_rows[i:i + METRICS_BATCH_SIZE])
+            _set_watermark(conn, resolution, window_end)
+
+        written += len(rows)
+        watermark = window_end
+
+    logger.info(f"指标汇总完成，精度: {resolution}, 水位线: {watermark}, 写入 {written} 行")
+    return written
+
+
+def run_rollups(now: Optional[int] = None) -> Dict[str, int]:
+    """按 5m -> 1h -> 1d 的顺序推进所有精度的汇总
+
+    Returns:
+        各精度写入的汇总行数
+    """
+    return {resolution: rollup_resolution(resolution, now) for resolution in ROLLUP_RESOLUTIONS}
+
+
+def apply_retention(now: Optional[int] = None) -> List[str]:
+    """按各精度的保留天数删除过期分区
+
+    数据来源分区只有在下一级汇总的水位线越过之后才会被删除，避免汇总落后时丢失数据
+
+    Returns:
+        被删除的分区表名列表
+    """
+    now = int(now if now is not None else time.time())
+    with engine.connect() as conn:
+        watermarks = {resolution: get_watermark(conn, resolution) for resolution in ROLLUP_RESOLUTIONS}
+
+    dropped = []
+    raw_cutoff = now - METRICS_RAW_RETENTION_DAYS * 86400
+    dropped += raw_samples.drop_before(min(raw_cutoff, watermarks["5m"] or 0))
+
+    consumers = {"5m": "1h", "1h": "1d", "1d": None}
+    for resolution, spec in ROLLUP_RESOLUTIONS.items():
+        cutoff = now - spec["retention_days"] * 86400
+        consumer = consumers[resolution]
+        if consumer:
+            cutoff = min(cutoff, watermarks[consumer] or 0)
+        dropped += rollup_tables[resolution].drop_before(cutoff)
+    return dropped
+
+
+# ===== 查询 =====
+
+# 估算原始样本行数时统计的最近时间窗口（秒）
+_RAW_RATE_WINDOW = 300
+
+
+def estimate_raw_rows(db: Session, metric: str, start_ts: int, end_ts: int) -> int:
+    """按结束时间前 _RAW_RATE_WINDOW 秒内的样本数，估算时间范围内的原始样本行数（走 (metric, ts) 索引）"""
+    code = metric_id(metric)
+    window_start = end_ts - _RAW_RATE_WINDOW
+    count = 0
+    for table in raw_samples.for_range(window_start, end_ts):
+        count += db.execute(
+            select(func.count()).select_from(table).where(
+                table.c.metric == code,
+                table.c.ts >= window_start,
+                table.c.ts < end_ts
+            )
+        ).scalar() or 0
+    return int(count * (end_ts - start_ts) / _RAW_RATE_WINDOW)
+
+
+def select_resolution(start_ts: int, end_ts: int, max_points: int = METRICS_MAX_POINTS, now: Optional[int] = None,
+                      raw_rows: Optional[int] = None) -> str:
+    """为查询的时间范围自动选择精度
+
+    选择读取行数不超过 max_points 且保留期覆盖查询起点的最细精度，例如24小时选择5m（288行），
+    30天选择1h（720行），更长的范围选择1d。汇总精度读取一条全网汇总序列，行数即点数；
+    原始样本要读取全部序列，行数由 raw_rows 给出（见 estimate_raw_rows），未给出时按单条序列计算
+
+    Returns:
+        raw/5m/1h/1d
+    """
+    now = int(now if now is not None else time.time())
+    options = [("raw", METRICS_COLLECT_INTERVAL, METRICS_RAW_RETENTION_DAYS)] + [
+        (resolution, spec["seconds"], spec["retention_days"])
+        for resolution, spec in ROLLUP_RESOLUTIONS.items()
+    ]
+    for resolution, step, retention_days in options:
+        rows = (end_ts - start_ts) / step
+        if resolution == "raw" and raw_rows is not None:
+            rows = raw_rows
+        if rows <= max_points and start_ts >= now - retention_days * 86400:
+            return resolution
+    return "1d"
+
+
+def query_fleet_series(
+    db: Session,
+    metric: str,
+    start_ts: int,
+    end_ts: int,
+    bucket_seconds: int,
+    resolution: Optional[str] = None
+) -> SeriesBuckets:
+    """查询指标的全网汇总序列，并按 bucket_seconds 重新分桶
+
+    水位线之前的部分读取汇总表中的全网汇总序列（主键前缀范围扫描），
+    水位线之后尚未汇总的尾部直接由原始样本计算
+
+    Args:
+        db: 数据库会话
+        metric: 指标名称
+        start_ts: 起始时间（含）
+        end_ts: 结束时间（不含）
+        bucket_seconds: 输出时间桶宽度，应为所选精度的整数倍
+        resolution: 指定精度，None表示自动选择
+
+    Returns:
+        全网汇总序列的汇总结果
+    """
+    code = metric_id(metric)
+    # 按读取行数选择精度：序列较多时超过几分钟的范围就读取全网汇总序列，不再加载全部原始样本
+    resolution = resolution or select_resolution(
+        start_ts, end_ts, raw_rows=estimate_raw_rows(db, metric, start_ts, end_ts)
+    )
+
+    parts = []
+    tail_start = start_ts
+    if resolution == "raw":
+        step = bucket_seconds
+    else:
+        step = ROLLUP_RESOLUTIONS[resolution]["seconds"]
+        watermark = get_watermark(db, resolution)
+        tail_start = min(max(watermark or start_ts, start_ts), end_ts)
+        parts.append(_load_rollups(db, rollup_tables[resolution], code, start_ts, tail_start, fleet_only=True))
+
+    if tail_start < end_ts:
+        buckets = raw_buckets(db, metric, tail_start, end_ts, step)
+        parts.append(fleet_buckets(buckets, metric in COUNTER_METRICS))
+
+    return merge_buckets(concat_buckets(parts), bucket_seconds)
+
+
+# ===== 后台任务 =====
+
+def _worker_loop(interval: int) -> None:
+    """后台汇总循环：每个周期推进汇总，每小时执行一次过期分区清理"""
+    last_retention = 0.0
+    while not _stop_event.is_set():
+        try:
+            run_rollups()
+            if time.monotonic() - last_retention >= 3600:
+                apply_retention()
+                last_retention = time.monotonic()
+        except Exception as e:
+            logger.error(f"指标汇总任务失败: {str(e)}")
+        _stop_event.wait(interval)
+
+
+def start_rollup_worker(interval: int = METRICS_ROLLUP_INTERVAL) -> None:
+    """启动后台指标汇总线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, args=(interval,), name="metrics-rollup", daemon=True)
+    _worker_thread.start()
+    logger.info(f"指标汇总线程已启动，运行周期: {interval} 秒")
+
+
+def stop_rollup_worker() -> None:
+    """停止后台指标汇总线程"""
+    _stop_event.set()
@@ -0,0 +1,374 @@
+"""
+指标时序存储模块
+按天分区存储接口计数器和设备性能指标的历史样本。
+
+样本采用窄表结构：(device_id, interface_id, metric, ts, value)，全部为整数键和数值列，
+interface_id 对应 interface_status.id，设备级指标（CPU、内存）的 interface_id 固定为 0，
+ts 为UTC纪元秒。每天的数据写入独立的分区表 metric_samples_YYYYMMDD，
+范围查询只访问覆盖时间范围的分区，过期数据直接删除整张分区表（见 metrics_rollup）。
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, SmallInteger, Table, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.services.config import METRICS_BATCH_SIZE, METRICS_FLUSH_INTERVAL
+from app.services.db import engine
+from app.services.models import InterfaceStatus
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 指标名称与整数编码的映射，编码一经分配不可修改
+METRIC_IDS = {
+    "if_in_octets": 1,    # 接口入站字节计数器
+    "if_out_octets": 2,   # 接口出站字节计数器
+    "if_in_errors": 3,    # 接口入站错误计数器
+    "if_out_errors": 4,   # 接口出站错误计数器
+    "cpu_usage": 101,     # 设备CPU使用率（%）
+    "memory_usage": 102,  # 设备内存使用率（%）
+}
+
+# 单调递增的计数器型指标，查询时需要按差值计算
+COUNTER_METRICS = {"if_in_octets", "if_out_octets", "if_in_errors", "if_out_errors"}
+
+# 设备级指标使用的接口键
+DEVICE_LEVEL_INTERFACE_ID = 0
+
+# 分区表定义独立于 Base.metadata，避免 create_all 创建无数张分区表
+_partition_metadata = MetaData()
+
+# 接口键缓存：(device_id, interface_name) -> interface_status.id
+_interface_key_cache: Dict[Tuple[int, str], int] = {}
+
+
+def metric_id(metric: str) -> int:
+    """获取指标名称对应的整数编码
+
+    Args:
+        metric: 指标名称
+
+    Returns:
+        指标编码
+
+    Raises:
+        ValueError: 如果指标未注册
+    """
+    if metric not in METRIC_IDS:
+        raise ValueError(f"未知的指标: {metric}")
+    return METRIC_IDS[metric]
+
+
+class PartitionedTable:
+    """按时间分区的表集合，每个分区是一张独立的物理表，表名为 {prefix}_{时间后缀}
+
+    范围查询只访问覆盖时间范围的分区，过期数据通过删除整张分区表清理，
+    避免大表上的 DELETE 和索引碎片。
+    """
+
+    _SUFFIX_FORMATS = {"day": "%Y%m%d", "month": "%Y%m", "year": "%Y"}
+
+    def __init__(self, prefix: str, period: str, columns_factory: Callable[[str], List[Any]]):
+        """
+        Args:
+            prefix: 分区表名前缀
+            period: 分区跨度，day/month/year
+            columns_factory: 根据表名生成列和索引定义的函数
+        """
+        if period not in self._SUFFIX_FORMATS:
+            raise ValueError(f"不支持的分区跨度: {period}")
+        self.prefix = prefix
+        self.period = period
+        self._columns_factory = columns_factory
+        self._lock = threading.Lock()
+        self._known: set = set()
+        self._loaded_at = 0.0
+
+    def start_of(self, ts: int) -> int:
+        """获取时间戳所在分区的起始时间（UTC）"""
+        dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+        if self.period == "day":
+            dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        elif self.period == "month":
+            dt = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            dt = dt.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return int(dt.timestamp())
+
+    def next_start(self, ts: int) -> int:
+        """获取下一个分区的起始时间"""
+        dt = datetime.fromtimestamp(self.start_of(ts), tz=timezone.utc)
+        if self.period == "day":
+            return int(dt.timestamp()) + 86400
+        if self.period == "month":
+            dt = dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+        else:
+            dt = dt.replace(year=dt.year + 1)
+        return int(dt.timestamp())
+
+    def name_for(self, ts: int) -> str:
+        """获取时间戳所在分区的表名"""
+        dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+        return f"{self.prefix}_{dt.strftime(self._SUFFIX_FORMATS[self.period])}"
+
+    def _start_of_name(self, name: str) -> Optional[int]:
+        """从分区表名解析分区起始时间，不是本分区集合的表返回None"""
+        suffix = name[len(self.prefix) + 1:]
+        try:
+            dt = datetime.strptime(suffix, self._SUFFIX_FORMATS[self.period])
+        except ValueError:
+            return None
+        return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+    def table(self, name: str) -> Table:
+        """获取（必要时定义）分区表对象"""
+        table = _partition_metadata.tables.get(name)
+        if table is not None:
+            return table
+        return Table(name, _partition_metadata, *self._columns_factory(name))
+
+    def existing(self, force: bool = False) -> set:
+        """从数据库加载已存在的分区表名（结果缓存60秒）"""
+        with self._lock:
+            if force or time.monotonic() - self._loaded_at > 60:
+                names = inspect(engine).get_table_names()
+                self._known.clear()
+                self._known.update(
+                    n for n in names
+                    if n.startswith(self.prefix + "_") and self._start_of_name(n) is not None
+                )
+                self._loaded_at = time.monotonic()
+            return set(self._known)
+
+    def ensure(self, ts: int) -> Table:
+        """确保时间戳所在的分区表存在
+
+        Args:
+            ts: UTC纪元秒
+
+        Returns:
+            分区表对象
+        """
+        name = self.name_for(ts)
+        table = self.table(name)
+        if name not in self._known:
+            with self._lock:
+                if name not in self._known:
+                    table.create(bind=engine, checkfirst=True)
+                    self._known.add(name)
+                    logger.info(f"创建指标分区表: {name}")
+        return table
+
+    def for_range(self, start_ts: int, end_ts: int) -> List[Table]:
+        """获取覆盖时间范围且已存在的分区表
+
+        Args:
+            start_ts: 起始时间（含）
+            end_ts: 结束时间（不含）
+
+        Returns:
+            按时间顺序排列的分区表列表
+        """
+        existing = self.existing()
+        tables = []
+        ts = self.start_of(start_ts)
+        while ts < end_ts:
+            name = self.name_for(ts)
+            if name in existing:
+                tables.append(self.table(name))
+            ts = self.next_start(ts)
+        return tables
+
+    def earliest_start(self) -> Optional[int]:
+        """获取最早分区的起始时间，没有任何分区时返回None"""
+        starts = [self._start_of_name(name) for name in self.existing(force=True)]
+        return min(starts) if starts else None
+
+    def drop_before(self, cutoff_ts: int) -> List[str]:
+        """删除时间范围完全早于截止时间的分区表
+
+        Args:
+            cutoff_ts: 截止时间，分区的结束时间不晚于该时间时被删除
+
+        Returns:
+            被删除的分区表名列表
+        """
+        dropped = []
+        for name in sorted(self.existing(force=True)):
+            start = self._start_of_name(name)
+            if self.next_start(start) <= cutoff_ts:
+                self.table(name).drop(bind=engine, checkfirst=True)
+                dropped.append(name)
+                logger.info(f"删除过期指标分区表: {name}")
+        if dropped:
+            with self._lock:
+                self._known.difference_update(dropped)
+        return dropped
+
+
+def _sample_columns(name: str) -> List[Any]:
+    """原始样本分区表的列定义"""
+    return [
+        Column("device_id", Integer, primary_key=True, autoincrement=False),
+        Column("interface_id", Integer, primary_key=True, autoincrement=False),
+        Column("metric", SmallInteger, primary_key=True, autoincrement=False),
+        Column("ts", Integer, primary_key=True, autoincrement=False),
+        Column("value", Float(precision=53), nullable=False),
+        # 主键按序列聚簇，单序列范围查询为连续读；该索引服务于跨设备的聚合查询
+        Index(f"ix_{name}_metric_ts", "metric", "ts"),
+    ]
+
+
+# 原始样本按天分区
+raw_samples = PartitionedTable("metric_samples", "day", _sample_columns)
+
+
+def insert_ignore(table: Table):
+    """构造忽略重复主键的批量插入语句（重复写入同一时刻的样本时不报错）"""
+    return table.insert().prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+
+
+class MetricWriter:
+    """指标样本批量写入器
+
+    样本先进入内存缓冲区，缓冲区达到批量大小或超过刷新间隔时，
+    按分区分组后以 executemany 批量插入，避免逐行提交。
+    """
+
+    def __init__(self, batch_size: int = METRICS_BATCH_SIZE, flush_interval: int = METRICS_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, device_id: int, interface_id: int, metric: str, value: float, ts: Optional[int] = None) -> None:
+        """添加一个样本到缓冲区
+
+        Args:
+            device_id: 设备ID
+            interface_id: 接口键，设备级指标为0
+            metric: 指标名称
+            value: 样本值
+            ts: UTC纪元秒，默认为当前时间
+        """
+        row = {
+            "device_id": device_id,
+            "interface_id": interface_id,
+            "metric": metric_id(metric),
+            "ts": int(ts if ts is not None else time.time()),
+            "value": float(value),
+        }
+        with self._lock:
+            self._buffer.append(row)
+            should_flush = (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """将缓冲区中的样本批量写入数据库
+
+        写入失败时记录日志并丢弃本批样本，不向调用方抛出异常：
+        add() 在缓冲区满时会在调用方线程中刷新，指标写入失败不应影响设备查询等业务操作
+
+        Returns:
+            写入的样本数量，失败时为0
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+
+        by_partition: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_partition.setdefault(raw_samples.start_of(row["ts"]), []).append(row)
+
+        try:
+            # 分区表需在写事务开始前创建，DDL不能与批量插入共用一个事务
+            tables = {day: raw_samples.ensure(day) for day in by_partition}
+            with engine.begin() as conn:
+                for day, day_rows in by_partition.items():
+                    stmt = insert_ignore(tables[day])
+                    for i in range(0, len(day_rows), self.batch_size):
+                        conn.execute(stmt, day_rows[i:i + self.batch_size])
+            logger.debug(f"批量写入指标样本 {len(rows)} 条，涉及 {len(by_partition)} 个分区")
+            return len(rows)
+        except SQLAlchemyError as e:
+            logger.error(f"批量写入指标样本失败，丢弃 {len(rows)} 条样本: {str(e)}")
+            return 0
+
+
+# 全局写入器实例
+metric_writer = MetricWriter()
+
+
+def resolve_interface_ids(db: Session, device_id: int, interface_names: Iterable[str]) -> Dict[str, int]:
+    """将接口名称解析为整数接口键（interface_status.id），不存在的接口会自动创建
+
+    Args:
+        db: 数据库会话
+        device_id: 设备ID
+        interface_names: 接口名称列表
+
+    Returns:
+        接口名称到接口键的映射
+    """
+    result = {}
+    missing = []
+    for name in set(interface_names):
+        key = _interface_key_cache.get((device_id, name))
+        if key is None:
+            missing.append(name)
+        else:
+            result[name] = key
+
+    if missing:
+        rows = db.query(InterfaceStatus.interface_name, InterfaceStatus.id).filter(
+            InterfaceStatus.device_id == device_id,
+            InterfaceStatus.interface_name.in_(missing)
+        ).all()
+        found = {name: key for name, key in rows}
+        new_rows = [
+            InterfaceStatus(device_id=device_id, interface_name=name)
+            for name in missing if name not in found
+        ]
+        if new_rows:
+            db.add_all(new_rows)
+            db.flush()
+            found.update({row.interface_name: row.id for row in new_rows})
+        for name, key in found.items():
+            _interface_key_cache[(device_id, name)] = key
+        result.update(found)
+
+    return result
+
+
+def bucket_starts(start_ts: int, end_ts: int, bucket_seconds: int) -> List[int]:
+    """列出时间范围内所有时间桶的起点，用于补齐没有样本的时间点"""
+    first = start_ts - start_ts % bucket_seconds
+    return list(range(first, end_ts, bucket_seconds))
+
+
+def format_bucket_time(ts: int, fmt: str = "%Y-%m-%d %H:%M") -> str:
+    """将时间桶起点格式化为本地时间字符串"""
+    return datetime.fromtimestamp(ts).strftime(fmt)
+
+
+def recent_window(bucket_seconds: int, buckets: int) -> Tuple[int, int]:
+    """计算以当前时间桶结尾、包含指定数量时间桶的查询窗口
+
+    Returns:
+        (start_ts, end_ts)，start_ts 与时间桶对齐
+    """
+    now = int(time.time())
+    end_ts = now - now % bucket_seconds + bucket_seconds
+    return end_ts - buckets * bucket_seconds, end_ts
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, LargeBinary
+from sqlalchemy.sql import func, literal_column
 from app.services.db import Base
 
 class User(Base):
@@ -30,6 +30,18 @@ class Device(Base):
     status = Column(String(20), default="unknown")  # 设备状态：online, offline, unknown
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # 每次修改加一，用于生成ETag（updated_at 只精确到秒，同一秒内的多次修改无法区分）
+    row_version = Column(Integer, nullable=False, server_default="0", onupdate=literal_column("row_version") + 1)
+    
+    # 设备列表的过滤和排序索引，均以id结尾以支持键集分页
+    __table_args__ = (
+        Index("ix_devices_vendor_id", "vendor", "id"),
+        Index("ix_devices_status_id", "status", "id"),
+        Index("ix_devices_location_id", "location", "id"),
+        Index("ix_devices_device_type_id", "device_type", "id"),
+        Index("ix_devices_name_id", "name", "id"),
+        Index("ix_devices_updated_at_id", "updated_at", "id"),
+    )
 
 class Config(Base):
     __tablename__ = "configs"
@@ -42,6 +54,30 @@ class Config(Base):
     taken_by = Column(String(50), nullable=True)
     description = Column(String(255), nullable=True)  # 配置描述
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    blob_hash = Column(String(64), nullable=True, index=True)  # 内容所在的 config_blobs 记录，为空时内容在 filename 指向的文件中
+
+class ConfigBlob(Base):
+    __tablename__ = "config_blobs"
+    
+    # 按内容SHA-256寻址的配置内容，相同内容的多个备份共用一份
+    hash = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)  # 原始内容字节数
+    stored_size = Column(Integer, nullable=False)  # 保存的字节数
+    encoding = Column(String(10), nullable=True)  # 保存时使用的压缩算法，未压缩为空
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容的备份数，以及以该内容为基准的差量数
+    created_at = Column(DateTime, default=func.now())
+    dict_id = Column(Integer, nullable=True)  # 压缩使用的 config_dictionaries 记录
+    base_hash = Column(String(64), nullable=True)  # 差量保存时的基准内容，为空表示完整版本
+    chain_depth = Column(Integer, nullable=False, server_default="0")  # 距最近完整版本的差量层数
+
+class ConfigDictionary(Base):
+    __tablename__ = "config_dictionaries"
+    
+    # 由已有配置训练的zstd字典，使用过的字典不可删除
+    id = Column(Integer, primary_key=True)
+    data = Column(LargeBinary(length=16 * 1024 * 1024), nullable=False)
+    sample_count = Column(Integer, nullable=False)  # 训练使用的备份数
+    created_at = Column(DateTime, default=func.now())
 
 class InterfaceStatus(Base):
     __tablename__ = "interface_status"
@@ -61,8 +97,147 @@ class CommandLog(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 令牌对应的用户已被删除时为空
+    username = Column(String(50), nullable=True)  # 执行命令时的用户名，用户被删除后仍可追溯
     command = Column(Text, nullable=False)
-    output = Column(Text, nullable=True)
+    output = Column(Text, nullable=True)  # 较短的输出直接保存
+    output_gzip = Column(LargeBinary(length=16 * 1024 * 1024), nullable=True)  # 较长的输出以gzip压缩保存，此时 output 为空
+    output_digest = Column(String(64), nullable=True)  # 输出的SHA-256
+    output_size = Column(Integer, nullable=True)  # 输出的原始字节数
     success = Column(Boolean, default=False)
+    latency_ms = Column(Integer, nullable=True)  # 命令执行耗时（毫秒），包含连接设备的时间
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 按设备、用户查询时按时间倒序分页，均以id结尾以支持键集分页
+    __table_args__ = (
+        Index("ix_command_logs_device_created", "device_id", "created_at", "id"),
+        Index("ix_command_logs_username_created", "username", "created_at", "id"),
+        Index("ix_command_logs_created", "created_at", "id"),
+    )
+
+
+class MetricRollupState(Base):
+    __tablename__ = "metric_rollup_state"
+    
+    resolution = Column(String(10), primary_key=True)  # 汇总精度：5m, 1h, 1d
+    watermark = Column(Integer, nullable=False)  # 已完成汇总的时间上界（UTC纪元秒，不含）
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class DeviceSummary(Base):
+    __tablename__ = "device_summary"
+    
+    dimension = Column(String(20), primary_key=True)  # 统计维度：total, status, vendor, device_type, location
+    key = Column(String(255), primary_key=True)  # 维度取值，空值记为空字符串
+    device_count = Column(Integer, nullable=False, default=0)
+
+
+class DeviceImportJob(Base):
+    __tablename__ = "device_import_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)  # 上传的原始文件名
+    spool_path = Column(String(512), nullable=False)  # 落盘后的文件路径
+    encoding = Column(String(20), nullable=False, default="utf-8")
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    file_size = Column(Integer, nullable=False, default=0)  # 文件字节数
+    bytes_processed = Column(Integer, nullable=False, default=0)  # 已处理的字节数，用于估算进度
+    processed_rows = Column(Integer, nullable=False, default=0)  # 已处理的行数，也是中断后继续导入的位置
+    success_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    error_message = Column(String(500), nullable=True)  # 整个任务失败的原因
+    created_by = Column(String(50), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # 处理进程最近一次提交进度的时间
+    
+    __table_args__ = (
+        Index("ix_device_import_jobs_status_id", "status", "id"),
+    )
+
+
+class DeviceImportError(Base):
+    __tablename__ = "device_import_errors"
+    
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("device_import_jobs.id"), nullable=False)
+    row_number = Column(Integer, nullable=False)  # CSV行号，从1开始
+    error = Column(String(500), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_device_import_errors_job_row", "job_id", "row_number", "id"),
+    )
+
+
+class ConfigBackupRun(Base):
+    __tablename__ = "config_backup_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trigger = Column(String(20), nullable=False, default="manual")  # 触发方式：schedule（维护窗口自动创建）, manual
+    schedule_key = Column(String(32), unique=True, nullable=True)  # 自动任务所属维护窗口的开始时间，保证每个窗口只创建一次
+    filters = Column(Text, nullable=True)  # 设备筛选条件（JSON），为空时备份全部设备
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    deadline = Column(DateTime, nullable=True)  # 维护窗口结束时间，之后不再开始新的设备
+    total_devices = Column(Integer, nullable=False, default=0)
+    changed_count = Column(Integer, nullable=False, default=0)  # 配置有变化、创建了新备份的设备数
+    unchanged_count = Column(Integer, nullable=False, default=0)  # 配置与最新备份相同的设备数
+    not_pulled_count = Column(Integer, nullable=False, default=0, server_default="0")  # 变化指示值未变、没有拉取完整配置的设备数（包含在 unchanged_count 中）
+    failed_count = Column(Integer, nullable=False, default=0)  # 重试后仍失败的设备数
+    skipped_count = Column(Integer, nullable=False, default=0)  # 维护窗口结束时尚未开始的设备数
+    error_message = Column(String(500), nullable=True)  # 整个任务失败的原因
+    created_by = Column(String(50), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # 处理进程最近一次提交进度的时间
+    
+    __table_args__ = (
+        Index("ix_config_backup_runs_status_id", "status", "id"),
+    )
+
+
+class ConfigBackupRunResult(Base):
+    __tablename__ = "config_backup_run_results"
+    
+    # 批量备份任务中每台设备的结果；设备删除后结果仍保留，因此 device_id 不设外键
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("config_backup_runs.id"), nullable=False)
+    device_id = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)  # changed, unchanged, failed, skipped
+    attempts = Column(Integer, nullable=False, default=0)  # 连接设备的次数
+    pulled = Column(Boolean, nullable=True)  # 是否拉取了完整配置，变化指示值未变时为False
+    config_id = Column(Integer, nullable=True)  # 新建的配置备份ID
+    error = Column(String(500), nullable=True)  # 最后一次失败的原因
+    duration_ms = Column(Integer, nullable=True)  # 各次尝试的总耗时（毫秒）
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ux_config_backup_run_results_run_device", "run_id", "device_id", unique=True),
+        Index("ix_config_backup_run_results_run_status_id", "run_id", "status", "id"),
+    )
+
+
+class DeviceConfigState(Base):
+    __tablename__ = "device_config_states"
+    
+    # 每台设备最近一次完整拉取配置时记录的变化指示值，下次备份前与设备上的当前值比较
+    device_id = Column(Integer, primary_key=True)
+    change_indicator = Column(String(255), nullable=True)  # 带读取方式前缀，如 snmp:123456、cli:2026-01-01 10:00:00
+    config_hash = Column(String(64), nullable=True)  # 拉取时设备配置对应的备份内容哈希
+    pulled_at = Column(DateTime, nullable=True)  # 最近一次完整拉取配置的时间
+
+
+class ConfigSearchToken(Base):
+    __tablename__ = "config_search_tokens"
+    
+    # 配置备份的倒排索引：每个备份包含的每个词一行
+    token = Column(String(64), primary_key=True)
+    config_id = Column(Integer, primary_key=True)
+    device_id = Column(Integer, nullable=False)
+    latest = Column(Boolean, nullable=False, default=True)  # 是否为该设备的最新备份
+    
+    __table_args__ = (
+        Index("ix_config_search_tokens_token_latest", "token", "latest", "config_id"),
+        Index("ix_config_search_tokens_config", "config_id"),
+    )
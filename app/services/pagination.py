@@ -0,0 +1,70 @@
+"""
+键集分页工具
+按 (排序列, 主键) 排序，游标记录上一页最后一行的这两个值，下一页从游标之后继续读取，
+翻页代价与页码无关，不会像 OFFSET 那样扫描并丢弃前面的所有行。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    """将上一页最后一行的排序值和主键编码为游标"""
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    payload = json.dumps([value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """解码游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if isinstance(value, dict) and "dt" in value:
+            value = datetime.fromisoformat(value["dt"])
+        return value, int(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def keyset_condition(sort_column, id_column, value: Any, row_id: int, descending: bool = False):
+    """生成“位于游标之后”的过滤条件
+
+    MySQL 和 SQLite 都把 NULL 视为最小值：升序时 NULL 在最前，降序时在最后，
+    这里按同样的规则处理排序列为空的行，保证可空列也能正确翻页。
+    """
+    if not descending:
+        if value is None:
+            return or_(and_(sort_column.is_(None), id_column > row_id), sort_column.isnot(None))
+        return or_(sort_column > value, and_(sort_column == value, id_column > row_id))
+    if value is None:
+        return and_(sort_column.is_(None), id_column < row_id)
+    return or_(sort_column < value, and_(sort_column == value, id_column < row_id), sort_column.is_(None))
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """解析排序参数，'-name' 表示按 name 降序
+
+    Returns:
+        (字段名, 是否降序)
+    """
+    sort = (sort or "id").strip()
+    if sort.startswith("-"):
+        return sort[1:], True
+    return sort.lstrip("+"), False
+
+
+def split_values(value: Optional[str]) -> Optional[list]:
+    """将逗号分隔的查询参数拆分为列表"""
+    if value is None:
+        return None
+    values = [item.strip() for item in value.split(",") if item.strip()]
+    return values or None
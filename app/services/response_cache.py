@@ -0,0 +1,425 @@
+"""
+响应缓存模块
+两级缓存：进程内LRU在前，Redis在后，用于仪表板和设备统计等被频繁轮询的只读接口。
+
+- 每个缓存项有新鲜期（ttl）和过期可用期（stale_ttl）：新鲜期内直接返回；
+  过期可用期内先返回旧值，再由后台线程重新计算（stale-while-revalidate）；
+  超过过期可用期视为未命中。
+- 同一个键的并发未命中只计算一次：进程内通过 Future 合并，进程间通过 Redis SET NX 锁合并，
+  未拿到锁的进程短暂等待持锁方写回结果。
+- 缓存键包含命名空间的版本号，invalidate() 递增版本号即可让整个命名空间失效；
+  其他进程最多在 CACHE_GENERATION_CHECK 秒后从 Redis 读到新版本号。
+  注册过的模型（如 Device）在事务提交后会自动失效对应的命名空间。
+- Redis 不可用时自动降级为仅进程内缓存，并在 CACHE_REDIS_RETRY 秒后重试。
+"""
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.services.config import (
+    CACHE_ENABLED,
+    CACHE_GENERATION_CHECK,
+    CACHE_LOCAL_MAX_ENTRIES,
+    CACHE_LOCK_WAIT,
+    CACHE_REDIS_ENABLED,
+    CACHE_REDIS_PREFIX,
+    CACHE_REDIS_RETRY,
+    REDIS_URL
+)
+from app.services.db import read_session
+from app.services.models import Device, InterfaceStatus
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 设备及接口相关统计所在的命名空间
+DEVICES_NAMESPACE = "devices"
+
+# Redis不可用时 _redis_call 的返回值
+_UNAVAILABLE = object()
+
+
+class _CacheEntry:
+    """缓存项：值以及新鲜期、过期可用期的截止时间（UTC纪元秒）"""
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+    def to_json(self) -> str:
+        return json.dumps({"v": self.value, "f": self.fresh_until, "s": self.stale_until}, default=str)
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "_CacheEntry":
+        data = json.loads(raw)
+        return cls(data["v"], data["f"], data["s"])
+
+
+class LocalLRU:
+    """线程安全的进程内LRU缓存"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: _CacheEntry) -> None:
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class ResponseCache:
+    """两级响应缓存"""
+
+    def __init__(self, max_entries: int = CACHE_LOCAL_MAX_ENTRIES, redis_url: Optional[str] = REDIS_URL):
+        self.local = LocalLRU(max_entries)
+        self._redis_url = redis_url if CACHE_REDIS_ENABLED else None
+        self._redis: Optional[redis.Redis] = None
+        self._redis_down_until = 0.0
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    # ===== Redis =====
+
+    def _client(self) -> Optional[redis.Redis]:
+        """获取Redis客户端，Redis暂时不可用时返回None"""
+        if not self._redis_url or time.time() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self._redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        return self._redis
+
+    def _redis_call(self, method: str, *args, **kwargs) -> Any:
+        """调用Redis命令，Redis未启用或调用失败时返回 _UNAVAILABLE，失败后暂停使用Redis一段时间"""
+        client = self._client()
+        if client is None:
+            return _UNAVAILABLE
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            self._redis_down_until = time.time() + CACHE_REDIS_RETRY
+            logger.warning(f"Redis缓存不可用，{CACHE_REDIS_RETRY} 秒内仅使用进程内缓存: {str(e)}")
+            return _UNAVAILABLE
+
+    # ===== 命名空间版本 =====
+
+    def _generation(self, namespace: str) -> int:
+        """获取命名空间的当前版本号，本地值最多缓存 CACHE_GENERATION_CHECK 秒"""
+        now = time.monotonic()
+        cached = self._generations.get(namespace)
+        if cached and now - cached[1] < CACHE_GENERATION_CHECK:
+            return cached[0]
+        remote = self._redis_call("get", f"{CACHE_REDIS_PREFIX}gen:{namespace}")
+        generation = int(remote) if remote not in (None, _UNAVAILABLE) else (cached[0] if cached else 0)
+        if cached and cached[0] > generation:
+            generation = cached[0]
+        self._generations[namespace] = (generation, now)
+        return generation
+
+    def invalidate(self, *namespaces: str) -> None:
+        """使命名空间下的所有缓存项失效"""
+        for namespace in namespaces:
+            local = self._generations.get(namespace, (0, 0.0))[0] + 1
+            remote = self._redis_call("incr", f"{CACHE_REDIS_PREFIX}gen:{namespace}")
+            if remote is not _UNAVAILABLE:
+                local = max(local, int(remote))
+            self._generations[namespace] = (local, time.monotonic())
+        logger.debug(f"缓存已失效: {', '.join(namespaces)}")
+
+    # ===== 读写 =====
+
+    def _full_key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{self._generation(namespace)}:{key}"
+
+    def _read_remote(self, full_key: str) -> Optional[_CacheEntry]:
+        raw = self._redis_call("get", CACHE_REDIS_PREFIX + full_key)
+        if raw is None or raw is _UNAVAILABLE:
+            return None
+        entry = _CacheEntry.from_json(raw)
+        self.local.set(full_key, entry)
+        return entry
+
+    def _read(self, full_key: str) -> Optional[_CacheEntry]:
+        entry = self.local.get(full_key)
+        if entry is not None:
+            return entry
+        return self._read_remote(full_key)
+
+    def _write(self, full_key: str, value: Any, ttl: int, stale_ttl: int) -> None:
+        now = time.time()
+        entry = _CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+        self.local.set(full_key, entry)
+        self._redis_call("set", CACHE_REDIS_PREFIX + full_key, entry.to_json(), ex=ttl + stale_ttl)
+
+    def _load(self, full_key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int) -> Any:
+        """计算并写回缓存，进程内和进程间的并发未命中只计算一次"""
+        with self._lock:
+            future = self._inflight.get(full_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[full_key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            # 本进程的缓存项可能已过期，而其他进程已经写入了更新的结果
+            remote = self._read_remote(full_key)
+            if remote is not None and remote.fresh_until > time.time():
+                future.set_result(remote.value)
+                return remote.value
+
+            lock_key = f"{CACHE_REDIS_PREFIX}lock:{full_key}"
+            # SET NX 成功返回True，锁已被占用返回None
+            locked = self._redis_call("set", lock_key, "1", nx=True, px=int(CACHE_LOCK_WAIT * 1000))
+            if locked is None:
+                # 其他进程正在计算，等待其写回结果
+                deadline = time.monotonic() + CACHE_LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = self._read_remote(full_key)
+                    if entry is not None and entry.fresh_until > time.time():
+                        future.set_result(entry.value)
+                        return entry.value
+            try:
+                value = loader()
+                self._write(full_key, value, ttl, stale_ttl)
+            finally:
+                if locked is True:
+                    self._redis_call("delete", lock_key)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+
+    def _refresh_in_background(self, full_key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int) -> None:
+        """后台重新计算过期的缓存项，同一个键同时只有一个刷新线程"""
+        with self._lock:
+            if full_key in self._refreshing:
+                return
+            self._refreshing.add(full_key)
+
+        def refresh():
+            try:
+                self._load(full_key, loader, ttl, stale_ttl)
+            except Exception as e:
+                logger.warning(f"后台刷新缓存失败，键: {full_key}, 错误: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(full_key)
+
+        threading.Thread(target=refresh, name="cache-refresh", daemon=True).start()
+
+    def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: int,
+        stale_ttl: int = 0,
+        background_loader: Optional[Callable[[], Any]] = None
+    ) -> Any:
+        """读取缓存，未命中时调用 loader 计算
+
+        Args:
+            namespace: 命名空间，用于整体失效
+            key: 命名空间内的键
+            loader: 未命中时在当前线程调用的计算函数
+            ttl: 新鲜期（秒）
+            stale_ttl: 新鲜期之后仍可返回旧值的时间（秒）
+            background_loader: 后台刷新时使用的计算函数，默认与 loader 相同
+
+        Returns:
+            缓存值或新计算的值
+        """
+        full_key = self._full_key(namespace, key)
+        entry = self._read(full_key)
+        now = time.time()
+        if entry is not None:
+            if now < entry.fresh_until:
+                return entry.value
+            if now < entry.stale_until:
+                self._refresh_in_background(full_key, background_loader or loader, ttl, stale_ttl)
+                return entry.value
+        return self._load(full_key, loader, ttl, stale_ttl)
+
+    def clear_local(self) -> None:
+        """清空进程内缓存"""
+        self.local.clear()
+
+
+# 全局缓存实例
+response_cache = ResponseCache()
+
+
+class _Uncached:
+    """不写入缓存的返回值，见 uncached()"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class _UncachedResult(Exception):
+    """在缓存加载过程中传递不写入缓存的返回值，等待同一个键的并发请求也会收到"""
+
+    def __init__(self, value: Any):
+        super().__init__("uncached result")
+        self.value = value
+
+
+def uncached(value: Any) -> _Uncached:
+    """包装被缓存的接口函数出错时返回的默认数据：本次照常返回，但不写入缓存；
+    后台刷新时出错则继续使用旧值"""
+    return _Uncached(value)
+
+
+def cached_endpoint(namespace: str, ttl: int, stale_ttl: int = 0):
+    """缓存同步接口函数的返回值
+
+    缓存键由除数据库会话以外的参数组成。后台刷新时被装饰函数使用独立的只读数据库会话，
+    因为请求的会话在响应返回后就会关闭。被装饰函数返回 uncached(...) 时结果不写入缓存。
+
+    Args:
+        namespace: 命名空间，invalidate(namespace) 会使其失效
+        ttl: 新鲜期（秒）
+        stale_ttl: 过期后仍可返回旧值并后台刷新的时间（秒）
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        session_params = [
+            name for name, param in signature.parameters.items()
+            if param.annotation is Session
+        ]
+
+        def call(**arguments):
+            result = func(**arguments)
+            if isinstance(result, _Uncached):
+                raise _UncachedResult(result.value)
+            return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                result = func(*args, **kwargs)
+                return result.value if isinstance(result, _Uncached) else result
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_parts = {name: value for name, value in bound.arguments.items() if name not in session_params}
+            key = f"{func.__module__}.{func.__name__}:{json.dumps(key_parts, sort_keys=True, default=str)}"
+
+            def background_loader():
+                db = read_session()
+                try:
+                    arguments = dict(bound.arguments)
+                    arguments.update({name: db for name in session_params})
+                    return call(**arguments)
+                finally:
+                    db.close()
+
+            try:
+                return response_cache.get_or_load(
+                    namespace, key, lambda: call(**bound.arguments), ttl, stale_ttl, background_loader
+                )
+            except _UncachedResult as e:
+                return e.value
+
+        return wrapper
+    return decorator
+
+
+def invalidate(*namespaces: str) -> None:
+    """使命名空间下的所有缓存项失效"""
+    response_cache.invalidate(*namespaces)
+
+
+# 模型类 -> 写入后需要失效的命名空间
+_model_namespaces: Dict[type, Tuple[str, ...]] = {}
+# 模型类 -> 修改时只有这些字段变化才失效，未登记的模型任何修改都失效
+_model_attributes: Dict[type, Tuple[str, ...]] = {}
+
+
+def invalidate_on_commit(model: type, *namespaces: str, attributes: Tuple[str, ...] = ()) -> None:
+    """注册模型的失效钩子：会话中该模型有新增、删除或修改时，在事务提交后失效对应命名空间
+
+    Args:
+        model: 模型类
+        namespaces: 需要失效的命名空间
+        attributes: 指定时只有这些字段的值发生变化的修改才失效（新增和删除总是失效）
+    """
+    _model_namespaces[model] = _model_namespaces.get(model, ()) + namespaces
+    if attributes:
+        _model_attributes[model] = attributes
+
+
+def _changes_cached_fields(obj: Any) -> bool:
+    """被修改的对象是否改变了缓存结果所依赖的字段"""
+    attributes = _model_attributes.get(type(obj))
+    if not attributes:
+        return True
+    state = sa_inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidations(session: Session, flush_context) -> None:
+    """记录本次事务写入的模型所对应的命名空间"""
+    if not _model_namespaces:
+        return
+    pending = session.info.setdefault("cache_invalidations", set())
+    for obj in list(session.new) + list(session.deleted):
+        pending.update(_model_namespaces.get(type(obj), ()))
+    for obj in session.dirty:
+        if type(obj) in _model_namespaces and _changes_cached_fields(obj):
+            pending.update(_model_namespaces[type(obj)])
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session: Session) -> None:
+    """事务提交后失效缓存"""
+    pending = session.info.pop("cache_invalidations", None)
+    if pending:
+        invalidate(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    """事务回滚时丢弃待失效的命名空间"""
+    session.info.pop("cache_invalidations", None)
+
+
+# 设备的任何写入都会使设备统计缓存失效；接口只有增删和运行状态（up/down）变化时才失效，
+# 其他字段的更新不影响统计结果，由缓存的有效期兜底
+invalidate_on_commit(Device, DEVICES_NAMESPACE)
+invalidate_on_commit(InterfaceStatus, DEVICES_NAMESPACE, attributes=("operational_status",))
@@ -0,0 +1,130 @@
+"""
+响应序列化模块
+默认响应类使用 orjson 编码JSON，原生支持 datetime、UUID 和非ASCII字符；
+请求头 Accept 声明接受 MessagePack（application/x-msgpack）时改用 MessagePack 编码，供内部服务调用。
+
+大列表接口可以直接返回 fast_response(rows)：FastAPI 遇到 Response 实例时不再执行
+response_model 校验和 jsonable_encoder，查询结果中的字典直接交给 orjson 编码。
+"""
+import contextvars
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:  # MessagePack 为可选依赖，未安装时只返回JSON
+    msgpack = None
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json; charset=utf-8"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_ACCEPT_TYPES = {"application/x-msgpack", "application/msgpack", "application/vnd.msgpack"}
+
+# 当前请求是否要求 MessagePack 编码，由 ContentNegotiationMiddleware 设置
+_wants_msgpack: contextvars.ContextVar[bool] = contextvars.ContextVar("wants_msgpack", default=False)
+
+
+def json_default(value: Any) -> Any:
+    """orjson 和 MessagePack 无法直接编码的类型"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """请求头 Accept 是否接受 MessagePack（q=0 表示不接受）"""
+    if not accept or msgpack is None:
+        return False
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() not in MSGPACK_ACCEPT_TYPES:
+            continue
+        quality = params.replace(" ", "")
+        if quality.startswith("q=") and quality[2:] in ("0", "0.0", "0.00", "0.000"):
+            return False
+        return True
+    return False
+
+
+def negotiated_media_type() -> str:
+    """当前请求协商出的响应媒体类型，用于区分同一资源不同表示的ETag"""
+    return MSGPACK_MEDIA_TYPE if _wants_msgpack.get() else JSON_MEDIA_TYPE
+
+
+class NegotiatedResponse(JSONResponse):
+    """默认响应类：使用 orjson 编码JSON，请求要求时使用 MessagePack 编码"""
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        if _wants_msgpack.get():
+            # render 在生成响应头之前调用，这里修改的 media_type 会写入 Content-Type
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return msgpack.packb(content, default=json_default, use_bin_type=True)
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_response(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> NegotiatedResponse:
+    """直接编码查询结果，跳过 response_model 校验和 jsonable_encoder
+
+    注意：直接返回响应时，接口参数中注入的 Response 上设置的响应头不会生效，需要通过 headers 传入
+    """
+    return NegotiatedResponse(content, status_code=status_code, headers=headers)
+
+
+class ContentNegotiationMiddleware:
+    """根据请求头 Accept 选择响应编码，并为响应添加 Vary: Accept
+
+    使用纯ASGI中间件，保证设置的上下文变量在接口函数和响应类中可见
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+        token = _wants_msgpack.set(accepts_msgpack(accept))
+
+        async def send_with_vary(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                content_type = next((value for name, value in headers if name.lower() == b"content-type"), b"")
+                if content_type.startswith(b"application/json") or content_type.startswith(b"application/x-msgpack"):
+                    for index, (name, value) in enumerate(headers):
+                        if name.lower() == b"vary":
+                            if b"accept" not in value.lower():
+                                headers[index] = (name, value + b", Accept")
+                            break
+                    else:
+                        headers.append((b"vary", b"Accept"))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            _wants_msgpack.reset(token)
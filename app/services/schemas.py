@@ -88,6 +88,23 @@ class ConfigOut(ConfigBase):
     class Config:
         from_attributes = True
 
+class BackupRunCreate(BaseModel):
+    """批量备份任务的设备筛选条件，多个条件同时满足，全部为空时备份全部设备"""
+    device_ids: Optional[List[int]] = None
+    vendors: Optional[List[str]] = None
+    locations: Optional[List[str]] = None  # 设备位置（站点）
+    device_types: Optional[List[str]] = None
+
+class BackupArchiveRequest(BaseModel):
+    """打包下载配置备份的筛选条件，多个条件同时满足，全部为空时打包全部备份"""
+    config_ids: Optional[List[int]] = None  # 备份ID
+    device_ids: Optional[List[int]] = None
+    vendors: Optional[List[str]] = None
+    locations: Optional[List[str]] = None  # 设备位置（站点）
+    device_types: Optional[List[str]] = None
+    start_time: Optional[datetime] = None  # 备份创建时间不早于该时间
+    end_time: Optional[datetime] = None  # 备份创建时间早于该时间
+
 # 接口状态模型
 class InterfaceStatusBase(BaseModel):
     interface_name: str = Field(..., max_length=100)
@@ -0,0 +1,132 @@
+"""
+配置备份存储格式基准测试
+生成若干设备的多版本配置（每个版本只修改少量行），分别以完整版本和差量链保存，
+输出存储占用与原始大小的比例，以及不同差量层数下还原单个版本的耗时（p50/p99）。
+
+使用临时SQLite数据库和临时目录，不影响现有数据：
+    python benchmark_backup_store.py [设备数] [每台设备的版本数]
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="backup_store_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ["CONFIG_BACKUP_DIR"] = os.path.join(WORK_DIR, "config_backups")
+os.environ.setdefault("DEBUG", "False")
+
+from app.services.db import Base, SessionLocal, engine
+from app.services.backup_store import content_cache, read_content, store_blob, train_dictionary
+from app.services.config import CONFIG_BACKUP_CODEC, CONFIG_BACKUP_KEYFRAME_INTERVAL
+from app.services.models import Config, ConfigBlob
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+VERSIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+
+def make_config(rng: random.Random, device: int) -> list:
+    """生成一份类似交换机 running-config 的配置"""
+    lines = [f"hostname SW-{device:04d}", "!", f"!Time: {time.ctime()}", "!"]
+    for vlan in range(1, 60):
+        lines += [f"vlan {vlan}", f" name VLAN_{vlan}_{rng.choice(['USER', 'VOICE', 'MGMT', 'IOT'])}", "!"]
+    for port in range(1, 49):
+        lines += [
+            f"interface GigabitEthernet0/{port}",
+            f" description link-to-{rng.choice(['ap', 'pc', 'phone', 'printer'])}-{rng.randint(1, 999)}",
+            " switchport mode access",
+            f" switchport access vlan {rng.randint(1, 59)}",
+            " spanning-tree portfast",
+            "!",
+        ]
+    lines += [f"ip route 10.{device % 256}.{n}.0 255.255.255.0 192.168.0.1" for n in range(30)]
+    lines += ["snmp-server community public RO", "ntp server 192.168.0.10", "end"]
+    return lines
+
+
+def mutate(rng: random.Random, lines: list) -> list:
+    """修改少量行，模拟两次备份之间的配置变化"""
+    lines = list(lines)
+    lines[2] = f"!Time: {time.ctime()} {rng.random()}"
+    for _ in range(rng.randint(1, 4)):
+        index = rng.randrange(4, len(lines) - 1)
+        if lines[index].startswith(" description"):
+            lines[index] = f" description changed-{rng.randint(1, 99999)}"
+        elif lines[index].startswith(" switchport access vlan"):
+            lines[index] = f" switchport access vlan {rng.randint(1, 59)}"
+    return lines
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    print("\n===== 配置备份存储格式基准测试 =====")
+    print(f"设备数: {DEVICES}, 每台设备版本数: {VERSIONS}, 压缩格式: {CONFIG_BACKUP_CODEC}, "
+          f"完整版本间隔: {CONFIG_BACKUP_KEYFRAME_INTERVAL}")
+    print(f"临时目录: {WORK_DIR}\n")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(42)
+    raw_size = 0
+    hashes = []
+    history = {device: make_config(rng, device) for device in range(DEVICES)}
+
+    start = time.perf_counter()
+    for version in range(VERSIONS):
+        for device in range(DEVICES):
+            if version:
+                history[device] = mutate(rng, history[device])
+            data = "\n".join(history[device]).encode("utf-8")
+            content_hash = hashlib.sha256(data).hexdigest()
+            base_hash = hashes[-DEVICES] if version else None
+            store_blob(db, content_hash, data, base_hash)
+            # 字典训练从 configs 表选取样本，这里补上对应的备份记录
+            db.add(Config(device_id=device + 1, filename=content_hash, file_size=len(data),
+                          hash=content_hash, blob_hash=content_hash, taken_by="bench"))
+            db.commit()
+            hashes.append(content_hash)
+            raw_size += len(data)
+        if version == min(4, VERSIONS - 1) and CONFIG_BACKUP_CODEC == "zstd":
+            # 积累一批样本后训练字典，之后的完整版本使用字典压缩
+            try:
+                dictionary = train_dictionary(db)
+                print(f"训练字典完成，样本数: {dictionary.sample_count}, 大小: {len(dictionary.data)} 字节")
+            except ValueError as e:
+                print(f"训练字典失败: {e}")
+    elapsed = time.perf_counter() - start
+
+    blobs = db.query(ConfigBlob).all()
+    stored_size = sum(blob.stored_size for blob in blobs)
+    keyframes = sum(1 for blob in blobs if blob.base_hash is None)
+    print(f"\n保存 {len(hashes)} 个版本耗时: {elapsed:.2f} 秒（平均 {elapsed / len(hashes) * 1000:.2f} 毫秒/版本）")
+    print(f"原始大小: {raw_size / 1024:.1f} KB, 占用: {stored_size / 1024:.1f} KB, "
+          f"比例: {stored_size / raw_size:.2%}, 完整版本: {keyframes}, 差量版本: {len(blobs) - keyframes}")
+
+    # 清空缓存后逐个读取，统计各差量层数的还原耗时
+    depths = {blob.hash: blob.chain_depth for blob in blobs}
+    latencies = {}
+    for content_hash in hashes:
+        content_cache.clear()
+        start = time.perf_counter()
+        data = read_content(db, content_hash)
+        latencies.setdefault(depths[content_hash], []).append((time.perf_counter() - start) * 1000)
+        assert hashlib.sha256(data).hexdigest() == content_hash, "还原的内容与哈希不一致"
+
+    print("\n差量层数    版本数    p50(毫秒)    p99(毫秒)")
+    for depth in sorted(latencies):
+        values = latencies[depth]
+        print(f"{depth:>8}    {len(values):>6}    {percentile(values, 50):>9.3f}    {percentile(values, 99):>9.3f}")
+    every = [value for values in latencies.values() for value in values]
+    print(f"{'全部':>6}    {len(every):>6}    {percentile(every, 50):>9.3f}    {percentile(every, 99):>9.3f}")
+    print("\n全部版本还原后的哈希校验通过")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
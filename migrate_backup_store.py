@@ -0,0 +1,57 @@
+"""
+配置备份存储迁移工具
+可以在服务运行时执行，中断后重新执行会从未完成的部分继续。
+
+把平铺保存的旧备份文件迁移到内容存储（按哈希分目录、相邻版本保存为差量）：
+    python migrate_backup_store.py legacy [--keep-files] [--batch-size 100]
+
+从本地目录切换到S3兼容存储：先设置 CONFIG_BACKUP_S3_* 并复制已有内容，
+再设置 CONFIG_BACKUP_STORAGE=s3 重启服务，最后再复制一次切换期间新增的内容：
+    python migrate_backup_store.py copy --from local --to s3
+"""
+import argparse
+import logging
+import sys
+
+from app.services.backup_migration import copy_store, migrate_legacy_backups
+from app.services.backup_storage import create_storage
+from app.services.db import SessionLocal
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('migrate_backup_store')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="配置备份存储迁移工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    legacy = commands.add_parser("legacy", help="把平铺保存的备份文件迁移到内容存储")
+    legacy.add_argument("--batch-size", type=int, default=100, help="每批处理的备份数")
+    legacy.add_argument("--keep-files", action="store_true", help="迁移后保留原文件")
+
+    copy = commands.add_parser("copy", help="在存储后端之间复制备份内容")
+    copy.add_argument("--from", dest="source", choices=["local", "s3"], required=True)
+    copy.add_argument("--to", dest="target", choices=["local", "s3"], required=True)
+    copy.add_argument("--overwrite", action="store_true", help="覆盖目标中已存在的内容")
+
+    args = parser.parse_args()
+
+    if args.command == "legacy":
+        db = SessionLocal()
+        try:
+            counts = migrate_legacy_backups(db, batch_size=args.batch_size, keep_files=args.keep_files)
+        finally:
+            db.close()
+        logger.info(f"迁移完成: {counts}")
+        return 1 if counts["failed"] else 0
+
+    if args.source == args.target:
+        parser.error("--from 和 --to 不能相同")
+    counts = copy_store(create_storage(args.source), create_storage(args.target), overwrite=args.overwrite)
+    logger.info(f"复制完成: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
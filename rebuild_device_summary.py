@@ -0,0 +1,24 @@
+"""
+重建设备汇总表（device_summary）
+汇总表由设备写入时增量维护，直接修改 devices 表等绕过ORM的操作之后，可以执行本脚本重新统计：
+    python rebuild_device_summary.py
+重建期间锁定汇总表，可以在服务运行时执行。
+"""
+from app.services.db import SessionLocal
+from app.services.device_summary import get_device_summary, rebuild_device_summary
+
+
+def main():
+    db = SessionLocal()
+    try:
+        rebuild_device_summary(db)
+        print(f"✅ 设备汇总表已重建，设备总数: {get_device_summary(db)['total']}")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 重建设备汇总表失败: {str(e)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+配置备份存储后端测试
+对本地目录后端执行读写、重命名、列出和删除的检查；设置了 CONFIG_BACKUP_S3_ENDPOINT 时
+对S3兼容存储执行同样的检查，可以使用 docker-compose 中的 MinIO 作为本地替代：
+
+    docker compose --profile s3 up -d minio
+    CONFIG_BACKUP_S3_ENDPOINT=http://localhost:9000 CONFIG_BACKUP_S3_BUCKET=config-backups \
+    CONFIG_BACKUP_S3_ACCESS_KEY=minioadmin CONFIG_BACKUP_S3_SECRET_KEY=minioadmin \
+    python test_backup_storage.py
+"""
+import io
+import os
+import tempfile
+import uuid
+
+WORK_DIR = tempfile.mkdtemp(prefix="backup_storage_test_")
+os.environ["CONFIG_BACKUP_DIR"] = os.path.join(WORK_DIR, "config_backups")
+
+from app.services.backup_storage import LocalStorage, S3Storage, StorageBackend
+from app.services.config import (
+    CONFIG_BACKUP_S3_ACCESS_KEY,
+    CONFIG_BACKUP_S3_BUCKET,
+    CONFIG_BACKUP_S3_ENDPOINT,
+    CONFIG_BACKUP_S3_REGION,
+    CONFIG_BACKUP_S3_SECRET_KEY
+)
+
+
+def check_backend(name: str, storage: StorageBackend) -> bool:
+    """执行一轮读写检查，返回是否全部通过"""
+    print(f"\n===== {name} =====")
+    key = f"blobs/ab/{uuid.uuid4().hex}.zst"
+    data = os.urandom(200 * 1024)
+    results = []
+
+    def check(description: str, passed: bool):
+        results.append(passed)
+        print(f"{'✅' if passed else '❌'} {description}")
+
+    check("不存在的键读取返回None", storage.read(key) is None and not storage.exists(key))
+    storage.write(key, data)
+    check("写入后可以读取", storage.exists(key) and storage.read(key) == data)
+
+    target = io.BytesIO()
+    check("分块读取内容一致", storage.read_into(key, target) and target.getvalue() == data)
+    check("列出键", key in set(storage.iter_keys("blobs/ab/")))
+
+    storage.write(key, b"replaced")
+    check("覆盖写入", storage.read(key) == b"replaced")
+
+    storage.rename(key, key + ".deleting")
+    check("重命名", not storage.exists(key) and storage.read(key + ".deleting") == b"replaced")
+
+    storage.delete(key + ".deleting")
+    storage.delete(key + ".deleting")
+    check("删除（重复删除不报错）", not storage.exists(key + ".deleting"))
+    check("读取不存在的键时分块读取返回False", not storage.read_into(key, io.BytesIO()))
+    return all(results)
+
+
+def main():
+    passed = check_backend("本地目录", LocalStorage(os.environ["CONFIG_BACKUP_DIR"]))
+
+    if CONFIG_BACKUP_S3_ENDPOINT:
+        storage = S3Storage(
+            CONFIG_BACKUP_S3_BUCKET or "config-backups",
+            prefix=f"test-{uuid.uuid4().hex[:8]}",
+            endpoint_url=CONFIG_BACKUP_S3_ENDPOINT,
+            region=CONFIG_BACKUP_S3_REGION,
+            access_key=CONFIG_BACKUP_S3_ACCESS_KEY,
+            secret_key=CONFIG_BACKUP_S3_SECRET_KEY
+        )
+        try:
+            storage.client.create_bucket(Bucket=storage.bucket)
+        except Exception:
+            # 存储桶已存在
+            pass
+        passed = check_backend(f"S3兼容存储 {CONFIG_BACKUP_S3_ENDPOINT}", storage) and passed
+    else:
+        print("\n未设置 CONFIG_BACKUP_S3_ENDPOINT，跳过S3兼容存储")
+
+    print(f"\n测试{'全部通过' if passed else '存在失败'}，临时目录: {WORK_DIR}")
+
+
+if __name__ == "__main__":
+    main()
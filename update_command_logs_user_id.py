@@ -0,0 +1,40 @@
+"""
+将 command_logs.user_id 改为可为空
+令牌对应的用户被删除后，命令审计日志的 user_id 写为空、只保留用户名；
+早期部署中该列为 NOT NULL，这类审计记录会写入失败。启动时只补建新增的列，不修改已有列，
+需要在升级后手动执行一次：
+    python update_command_logs_user_id.py
+"""
+from sqlalchemy import inspect, text
+
+from app.services.db import engine
+
+
+def make_user_id_nullable():
+    try:
+        columns = {column["name"]: column for column in inspect(engine).get_columns("command_logs")}
+        if "user_id" not in columns:
+            print("❌ command_logs 表中不存在 user_id 列")
+            return
+        if columns["user_id"]["nullable"]:
+            print("✅ command_logs.user_id 已可为空，无需修改")
+            return
+
+        if engine.dialect.name == "mysql":
+            sql = "ALTER TABLE command_logs MODIFY user_id INT NULL"
+        elif engine.dialect.name == "postgresql":
+            sql = "ALTER TABLE command_logs ALTER COLUMN user_id DROP NOT NULL"
+        else:
+            print(f"❌ {engine.dialect.name} 不支持修改列约束，请手动重建 command_logs 表")
+            return
+
+        print(f"执行: {sql}")
+        with engine.begin() as conn:
+            conn.execute(text(sql))
+        print("✅ command_logs.user_id 已改为可为空")
+    except Exception as e:
+        print(f"❌ 执行失败: {str(e)}")
+
+
+if __name__ == "__main__":
+    make_user_id_nullable()